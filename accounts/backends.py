@@ -0,0 +1,24 @@
+# accounts/backends.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+# Reverse one-to-one names of the role profiles (hospital.Doctor, Patient, ...)
+ROLE_PROFILE_RELATIONS = ('doctor', 'patient', 'labworker', 'pharmacist')
+
+
+class RoleProfileBackend(ModelBackend):
+    """
+    ModelBackend that loads the user together with their role profile.
+
+    AuthenticationMiddleware calls get_user() once per request and keeps the
+    result on the request, so `request.user.doctor` / `.patient` / `.labworker`
+    / `.pharmacist` no longer cost a query of their own.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related(*ROLE_PROFILE_RELATIONS).get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
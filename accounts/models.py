@@ -19,4 +19,10 @@ class User(AbstractUser):
     # phone_number = models.CharField(max_length=15, blank=True, null=True)
 
     def __str__(self):
-        return f"{self.username} ({self.get_role_display()})"
\ No newline at end of file
+        return f"{self.username} ({self.get_role_display()})"
+
+    class Meta(AbstractUser.Meta):
+        # Doctor and patient lists are ordered by name
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='user_name_idx'),
+        ]
\ No newline at end of file
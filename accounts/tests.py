@@ -1,3 +1,97 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from hospital.counters import invalidate_doctor_counts
+from hospital.models import Appointment, Doctor, Patient
+from .backends import RoleProfileBackend
+
+User = get_user_model()
+
+
+class RoleProfileBackendTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('drwho', 'who@example.com', 'pw', role='DOCTOR')
+        Doctor.objects.create(user=self.user, specialty='General', is_approved=True)
+
+    def test_get_user_loads_the_role_profile_in_the_same_query(self):
+        with self.assertNumQueries(1):
+            user = RoleProfileBackend().get_user(self.user.pk)
+            self.assertEqual(user.doctor.specialty, 'General')
+
+    def test_users_without_a_profile_still_load(self):
+        admin = User.objects.create_user('admin1', 'admin@example.com', 'pw', role='ADMIN')
+        with self.assertNumQueries(1):
+            user = RoleProfileBackend().get_user(admin.pk)
+            self.assertFalse(hasattr(user, 'doctor'))
+
+
+class SessionQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('pat', 'pat@example.com', 'pw', role='PATIENT')
+        Patient.objects.create(user=self.user)
+
+    def test_login(self):
+        # The user by username, the new session (existence check, insert, data save,
+        # each insert/save in a savepoint) and last_login
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('login'), {'username': 'pat', 'password': 'pw'})
+        self.assertRedirects(response, reverse('patient_dashboard'), fetch_redirect_response=False)
+
+    def test_authenticated_request(self):
+        # The session comes from the cache; the user and their profile are one query,
+        # plus the navbar's cart lookup
+        self.client.post(reverse('login'), {'username': 'pat', 'password': 'pw'})
+        with self.assertNumQueries(2):
+            self.client.get(reverse('profile'))
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_authenticated_request_with_database_sessions(self):
+        # The same request reads the session row as well
+        self.client.post(reverse('login'), {'username': 'pat', 'password': 'pw'})
+        with self.assertNumQueries(3):
+            self.client.get(reverse('profile'))
+
+
+class DoctorDashboardQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        doctor_user = User.objects.create_user('doc', 'doc@example.com', 'pw', role='DOCTOR')
+        self.doctor = Doctor.objects.create(user=doctor_user, specialty='General', is_approved=True)
+        self.patient = Patient.objects.create(user=User.objects.create_user('pat', 'pat@example.com', 'pw', role='PATIENT'))
+        self.client.post(reverse('login'), {'username': 'doc', 'password': 'pw'})
+        self.booked = 0
+
+    def book(self, count):
+        # Sixteen half-hour slots a day from tomorrow, alternately pending and approved
+        start = timezone.localdate() + datetime.timedelta(days=1)
+        Appointment.objects.bulk_create([
+            Appointment(
+                patient=self.patient, doctor=self.doctor, status=('Pending', 'Approved')[i % 2],
+                appointment_date=start + datetime.timedelta(days=i // 16),
+                appointment_time=datetime.time(9 + i % 16 // 2, 30 * (i % 2)),
+            )
+            for i in range(self.booked, self.booked + count)
+        ])
+        self.booked += count
+
+    def test_query_count_does_not_grow_with_appointments(self):
+        # The user and profile, the unread total, a page of each queue and the
+        # status counts; the counts come from the cache on the next visit
+        self.book(10)
+        with self.assertNumQueries(5):
+            self.client.get(reverse('doctor_dashboard'))
+        with self.assertNumQueries(4):
+            self.client.get(reverse('doctor_dashboard'))
+
+        # bulk_create skips the signals that drop the cached counts
+        self.book(500)
+        invalidate_doctor_counts(self.doctor.pk)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('doctor_dashboard'))
+        self.assertEqual(len(response.context['pending_appointments']), 20)
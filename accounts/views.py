@@ -6,6 +6,8 @@ from django.contrib.auth import authenticate, login, logout, update_session_auth
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm 
+from django.utils import timezone
+from django.db.models import Count, Max
 
 # --- Date/Time Import ---
 import datetime 
@@ -13,9 +15,13 @@ import datetime
 # --- Model Imports ---
 from .models import User
 # Make sure ALL relevant profile models are imported
-from hospital.models import Patient, Doctor, Appointment, LabWorker, Pharmacist # <-- ADDED Pharmacist
+from hospital.models import Patient, Doctor, Appointment, LabWorker, Pharmacist, ExpiryAlert, ReorderAlert # <-- ADDED Pharmacist
+from hospital.conditional import conditional_page, doctor_details
+from hospital.counters import doctor_appointment_counts
+from hospital.pagination import paginate
 from pharmacy.models import Order 
-from chat.models import Conversation, Message 
+from chat.models import Conversation
+from chat.unread import unread_total
 
 # ==========================================================
 # VIEWS START HERE
@@ -176,30 +182,46 @@ def doctor_dashboard_view(request):
         messages.error(request, 'You are not authorized to view this page.')
         return redirect('home')
 
-    # Chat Count Logic
-    doctor_conversations = Conversation.objects.filter(participants=request.user)
-    unread_message_count = Message.objects.filter(
-        conversation__in=doctor_conversations
-    ).exclude(sender=request.user).count() 
+    # Chat Count Logic: unread counts are kept per conversation, so this just adds them up
+    unread_message_count = unread_total(request.user)
 
-    # Appointment Logic
-    pending_appointments = Appointment.objects.filter(
-        doctor=doctor, status='Pending'
-    ).order_by('appointment_date', 'appointment_time')
-    
-    approved_appointments = Appointment.objects.filter(
-        doctor=doctor, status='Approved'
-    ).order_by('appointment_date', 'appointment_time')
+    # Appointment Logic: upcoming appointments only, one page per queue
+    today = timezone.localdate()
+    upcoming = Appointment.objects.filter(
+        doctor=doctor, appointment_date__gte=today
+    ).select_related('patient__user')
+    ordering = ('appointment_date', 'appointment_time')
+
+    pending_appointments = paginate(request, upcoming.filter(status='Pending'), ordering, param='pending')
+    approved_appointments = paginate(request, upcoming.filter(status='Approved'), ordering, param='approved')
+
+    # Status counts come from one grouped query, cached per doctor
+    appointment_counts = doctor_appointment_counts(doctor.pk)
 
     context = {
         'pending_appointments': pending_appointments,
         'approved_appointments': approved_appointments,
-        'pending_count': pending_appointments.count(),
+        'pending_count': appointment_counts['Pending'],
+        'approved_count': appointment_counts['Approved'],
         'unread_message_count': unread_message_count, 
     }
     return render(request, 'doctor_dashboard.html', context)
 
+def _patient_dashboard_state(request):
+    if request.user.role != 'PATIENT':
+        return None
+    appointments = Appointment.objects.filter(patient__user=request.user)
+    appointment_stats = appointments.aggregate(changed=Max('updated_at'), total=Count('pk'))
+    orders = Order.objects.filter(user=request.user).aggregate(changed=Max('updated_at'), total=Count('pk'))
+    # "Upcoming" depends on the date, the greeting on the user's name, and each
+    # appointment shows its doctor
+    return (
+        appointment_stats['changed'], appointment_stats['total'], orders['changed'], orders['total'],
+        timezone.localdate(), request.user.first_name, doctor_details(appointments),
+    )
+
 @login_required(login_url='login')
+@conditional_page(_patient_dashboard_state)
 def patient_dashboard_view(request):
     """Displays the patient dashboard with appointments and orders."""
     if request.user.role != 'PATIENT':
@@ -215,7 +237,7 @@ def patient_dashboard_view(request):
     except Patient.DoesNotExist:
         patient = Patient.objects.create(user=request.user) 
 
-    today = datetime.date.today() 
+    today = timezone.localdate()
 
     upcoming_appointments = Appointment.objects.filter(
         patient=patient,
@@ -332,5 +354,16 @@ def pharmacist_dashboard_view(request):
         if request.user.role == 'LABWORKER': return redirect('labworker_dashboard') # Added LabWorker redirect
         return redirect('home') 
 
-    context = {}
+    # Precomputed daily by refresh_expiry_alerts, soonest expiry first
+    expiry_alerts = paginate(
+        request, ExpiryAlert.objects.select_related('medicine'), ('expiry_date',), param='expiry'
+    )
+
+    # Reorder worklist, precomputed by refresh_reorder_alerts; lowest stock first
+    reorder_alerts = paginate(request, ReorderAlert.objects.all(), ('on_hand',), param='reorder')
+
+    context = {
+        'expiry_alerts': expiry_alerts,
+        'reorder_alerts': reorder_alerts,
+    }
     return render(request, 'pharmacist_dashboard.html', context)
\ No newline at end of file
@@ -0,0 +1,10 @@
+"""
+Benchmarks for the performance-sensitive paths (sweeps, rollups, exports, ...).
+
+They are scripts, not tests: each builds its own data set in a throwaway
+SQLite database and prints timings. Run them from the project root, e.g.
+
+    python -m benchmarks.reservations --carts 100000
+
+Numbers depend on the machine; compare runs on the same one.
+"""
@@ -0,0 +1,37 @@
+# benchmarks/_scratch.py
+"""
+Setup shared by the benchmark scripts: Django pointed at a scratch SQLite
+file in a temporary directory (never the project's db.sqlite3), migrated
+and ready to fill. The directory is removed when the script exits.
+"""
+import atexit
+import contextlib
+import os
+import shutil
+import tempfile
+import time
+
+
+def setup():
+    """Configures Django on a fresh scratch database and returns the file's path."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    from django.conf import settings
+
+    directory = tempfile.mkdtemp(prefix='healthstack-bench-')
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    path = os.path.join(directory, 'bench.sqlite3')
+    settings.DATABASES['default']['NAME'] = path
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return path
+
+
+@contextlib.contextmanager
+def timed(label):
+    """Prints how long the block took."""
+    start = time.perf_counter()
+    yield
+    print(f'{label}: {time.perf_counter() - start:.2f}s')
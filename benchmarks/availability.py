@@ -0,0 +1,130 @@
+# benchmarks/availability.py
+"""
+Slot checks at scale: D doctors with two months of bookings ahead and a
+growing history behind, most slots taken. Times validate_slot() and a 31-day
+free_slots() against the scan they replaced, which read the doctor's
+appointments for the day (or range) and compared times one by one, once for
+each --history-days value: the index lookups should stay flat as history grows.
+
+    python -m benchmarks.availability --doctors 50 --history-days 30 365 1095
+"""
+import argparse
+import datetime
+import io
+import random
+import statistics
+import time
+
+from benchmarks._scratch import setup, timed
+
+
+def per_call(label, calls, fn):
+    """Runs fn(*args) for each args tuple in `calls` and prints the median time."""
+    times = []
+    for args in calls:
+        started = time.perf_counter()
+        fn(*args)
+        times.append((time.perf_counter() - started) * 1e6)
+    print(f'{label:38} median {statistics.median(times):7.0f} us, max {max(times):7.0f} us')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--history-days', type=int, nargs='+', default=[30, 365, 1095])
+    parser.add_argument('--ahead-days', type=int, default=60)
+    parser.add_argument('--calls', type=int, default=2000)
+    args = parser.parse_args()
+    setup()
+
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    from accounts.models import User
+    from hospital import availability
+    from hospital.models import Appointment, Doctor, Patient
+
+    # The default schedule: Mon-Sat, 09:00-17:00, 30 minute slots
+    slot_times = [datetime.time(9 + i // 2, 30 * (i % 2)) for i in range(16)]
+    today = timezone.localdate()
+    rng = random.Random(1)
+
+    def working_days(first, last):
+        days = [today + datetime.timedelta(days=n) for n in range(first, last)]
+        return [day for day in days if day.weekday() in availability.DEFAULT_WEEKDAYS]
+
+    def book(doctors, days):
+        Appointment.objects.bulk_create([
+            Appointment(patient=patient, doctor_id=doctor_id, appointment_date=day, appointment_time=t, status='Approved')
+            for doctor_id in doctors for day in days for t in rng.sample(slot_times, 12)
+        ], batch_size=5000)
+
+    with timed('setup'):
+        User.objects.bulk_create(
+            [User(username=f'doc{i}', password='!', role='DOCTOR') for i in range(args.doctors)]
+        )
+        Doctor.objects.bulk_create([
+            Doctor(user_id=pk, specialty='General', is_approved=True)
+            for pk in User.objects.filter(role='DOCTOR').values_list('pk', flat=True)
+        ])
+        doctors = list(Doctor.objects.values_list('pk', flat=True))
+        patient = Patient.objects.create(user=User.objects.create_user('pat', role='PATIENT'))
+        upcoming = working_days(1, args.ahead_days)
+        book(doctors, working_days(0, args.ahead_days))
+
+    def scan_validate(doctor_id, day, t):
+        # Before the occupancy index: read the day's bookings and look for the time
+        taken = Appointment.objects.filter(doctor_id=doctor_id, appointment_date=day).exclude(
+            status='Cancelled'
+        ).values_list('appointment_time', flat=True)
+        return t not in set(taken)
+
+    def scan_free_slots(doctor_id, start, end):
+        booked = {}
+        for day, t in Appointment.objects.filter(
+            doctor_id=doctor_id, appointment_date__range=(start, end)
+        ).exclude(status='Cancelled').values_list('appointment_date', 'appointment_time'):
+            booked.setdefault(day, set()).add(t)
+        result, day = {}, start
+        while day <= end:
+            if day.weekday() in availability.DEFAULT_WEEKDAYS:
+                result[day] = [t for t in slot_times if t not in booked.get(day, ())]
+            day += datetime.timedelta(days=1)
+        return result
+
+    def validate(doctor_id, day, t):
+        try:
+            availability.validate_slot(doctor_id, day, t)
+        except availability.SlotUnavailable:
+            pass
+
+    checks = [(rng.choice(doctors), rng.choice(upcoming), rng.choice(slot_times)) for _ in range(args.calls)]
+    ranges = [(rng.choice(doctors), today, today + datetime.timedelta(days=availability.MAX_RANGE_DAYS - 1))
+              for _ in range(args.calls // 10)]
+
+    booked_back = 0
+    for history_days in sorted(args.history_days):
+        # Each round adds the older days on top of what the last one booked
+        with timed(f'booking {history_days} days of history'):
+            book(doctors, working_days(-history_days, -booked_back))
+            call_command('rebuild_occupancy', '--all', stdout=io.StringIO())
+        booked_back = history_days
+        print(f'{Appointment.objects.count()} appointments, {args.doctors} doctors, {history_days} days of history')
+
+        # Both answers must agree before their times mean anything
+        for doctor_id, day, t in checks[:200]:
+            try:
+                availability.validate_slot(doctor_id, day, t)
+                free = True
+            except availability.SlotUnavailable:
+                free = False
+            assert free == scan_validate(doctor_id, day, t), (doctor_id, day, t)
+
+        per_call('validate_slot (occupancy index)', checks, validate)
+        per_call('validate_slot (appointment scan)', checks, scan_validate)
+        per_call('31-day free slots (occupancy index)', ranges, availability.free_slots)
+        per_call('31-day free slots (appointment scan)', ranges, scan_free_slots)
+
+
+if __name__ == '__main__':
+    main()
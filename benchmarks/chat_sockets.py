@@ -0,0 +1,130 @@
+# benchmarks/chat_sockets.py
+"""
+Chat websockets under load: N two-person conversations with both participants
+connected through config/asgi.py. Times the connections, a round in which one
+participant of every conversation sends a message that both must receive,
+and a flood from one socket that the writer's per-socket limit has to turn
+back.
+
+    python -m benchmarks.chat_sockets --conversations 1000
+"""
+import argparse
+import asyncio
+import json
+import resource
+import time
+
+from benchmarks._scratch import setup, timed
+
+
+class Connection:
+    """One websocket driven straight through the ASGI application."""
+
+    def __init__(self, application, path, cookie):
+        self.application = application
+        self.scope = {
+            'type': 'websocket', 'path': path,
+            'headers': [(b'host', b'testserver'), (b'origin', b'http://testserver'), (b'cookie', cookie.encode())],
+        }
+        self.inbox = asyncio.Queue()
+        self.frames = []
+        self.accepted = asyncio.Event()
+        self.task = None
+
+    async def _receive(self):
+        return await self.inbox.get()
+
+    async def _send(self, event):
+        if event['type'] == 'websocket.accept':
+            self.accepted.set()
+        elif event['type'] == 'websocket.send':
+            self.frames.append(json.loads(event['text']))
+
+    def open(self):
+        self.inbox.put_nowait({'type': 'websocket.connect'})
+        self.task = asyncio.ensure_future(self.application(self.scope, self._receive, self._send))
+
+    def say(self, body):
+        self.inbox.put_nowait({'type': 'websocket.receive', 'text': json.dumps({'body': body})})
+
+    async def close(self):
+        self.inbox.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+        await self.task
+
+
+async def wait_until(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--conversations', type=int, default=1000)
+    args = parser.parse_args()
+    setup()
+
+    from django.conf import settings
+    from django.test import Client
+
+    from accounts.models import User
+    from chat import realtime
+    from chat.broadcast import get_broadcast
+    from chat.models import Conversation, Message
+    from config.asgi import application
+
+    with timed(f'setup ({args.conversations} conversations)'):
+        User.objects.bulk_create(
+            [User(username=f'u{i}', password='!', role='PATIENT') for i in range(2 * args.conversations)]
+        )
+        users = list(User.objects.order_by('pk'))
+        Conversation.objects.bulk_create([Conversation() for _ in range(args.conversations)])
+        conversations = list(Conversation.objects.order_by('pk'))
+        Participant = Conversation.participants.through
+        Participant.objects.bulk_create([
+            Participant(conversation_id=conversation.pk, user_id=users[2 * i + side].pk)
+            for i, conversation in enumerate(conversations) for side in (0, 1)
+        ])
+        cookies = {}
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            cookies[user.pk] = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    async def run():
+        sockets = [
+            Connection(application, f'/ws/chat/{conversation.pk}/', cookies[users[2 * i + side].pk])
+            for i, conversation in enumerate(conversations) for side in (0, 1)
+        ]
+        started = time.perf_counter()
+        for socket in sockets:
+            socket.open()
+        await asyncio.gather(*(socket.accepted.wait() for socket in sockets))
+        print(f'{len(sockets)} sockets connected in {time.perf_counter() - started:.2f}s; '
+              f'{get_broadcast().subscriber_count()} subscribers')
+
+        started = time.perf_counter()
+        for socket in sockets[::2]:
+            socket.say('hello')
+        await wait_until(lambda: all(socket.frames for socket in sockets))
+        print(f'{len(sockets) // 2} messages delivered to {len(sockets)} sockets in '
+              f'{time.perf_counter() - started:.2f}s')
+
+        # Every message in the flood comes back either saved or refused
+        flooder, flood = sockets[0], 10 * realtime.SOCKET_QUEUE_SIZE
+        before = len(flooder.frames)
+        for i in range(flood):
+            flooder.say(f'flood {i}')
+        await wait_until(lambda: len(flooder.frames) - before == flood)
+        refused = sum(1 for frame in flooder.frames[before:] if 'error' in frame)
+        print(f'flood of {flood} from one socket: {flood - refused} saved, {refused} told to slow down')
+
+        await asyncio.gather(*(socket.close() for socket in sockets))
+        print(f'{get_broadcast().subscriber_count()} subscribers after closing')
+
+    asyncio.run(run())
+    print(f'{Message.objects.count()} messages stored; '
+          f'peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
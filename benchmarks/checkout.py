@@ -0,0 +1,88 @@
+# benchmarks/checkout.py
+"""
+Concurrent checkouts: N shoppers with a few lines each over a shared set of
+products, checked out by T threads at once. Reports orders per second for
+each thread count and checks that no product was oversold.
+
+    python -m benchmarks.checkout --shoppers 2000 --threads 1 4 16
+"""
+import argparse
+import random
+import threading
+import time
+
+from benchmarks._scratch import setup, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--shoppers', type=int, default=2000)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--lines', type=int, default=3, help='Cart lines per shopper.')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+    setup()
+
+    from django.db import connection
+    from django.db.models import F, Sum
+
+    from accounts.models import User
+    from pharmacy.checkout import OutOfStock, place_order
+    from pharmacy.models import Cart, CartItem, Order, OrderItem, Product
+
+    rng = random.Random(1)
+    total = args.shoppers * len(args.threads)
+    with timed(f'setup ({total} carts, {args.lines} lines each)'):
+        Product.objects.bulk_create([
+            Product(name=f'P{i}', description='', price=1) for i in range(args.products)
+        ])
+        products = list(Product.objects.values_list('pk', flat=True))
+        User.objects.bulk_create(
+            [User(username=f'u{i}', password='!', role='PATIENT') for i in range(total)], batch_size=5000
+        )
+        Cart.objects.bulk_create([Cart(user_id=pk) for pk in User.objects.values_list('pk', flat=True)], batch_size=5000)
+        carts = list(Cart.objects.select_related('user').order_by('pk'))
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=pk, quantity=rng.randint(1, 3))
+            for cart in carts for pk in rng.sample(products, args.lines)
+        ], batch_size=5000)
+
+    for threads in args.threads:
+        # Each round checks out its own carts, so the rounds don't share any
+        batch, carts = carts[:args.shoppers], carts[args.shoppers:]
+        placed, refused, errors = [], [], []
+        # Restocked to about what the round asks for (two units a line on average),
+        # so the last checkouts still race for the last units
+        Product.objects.update(stock=args.shoppers * args.lines * 2 // args.products)
+
+        def checkout(chunk):
+            try:
+                for cart in chunk:
+                    try:
+                        placed.append(place_order(cart, cart.user, 'Somewhere 1'))
+                    except OutOfStock:
+                        refused.append(cart)
+            except Exception as e:  # noqa: BLE001 -- reported below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=checkout, args=(batch[i::threads],)) for i in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        assert not errors, errors
+        print(f'{threads:3} threads: {len(placed)} orders, {len(refused)} refused in {elapsed:.2f}s, '
+              f'{len(placed) / elapsed:.0f} orders/s')
+
+    assert not Product.objects.filter(stock__lt=F('reserved')).exists(), 'stock oversold'
+    assert OrderItem.objects.aggregate(total=Sum('line_total'))['total'] == \
+        Order.objects.aggregate(total=Sum('total_price'))['total']
+
+
+if __name__ == '__main__':
+    main()
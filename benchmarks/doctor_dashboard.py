@@ -0,0 +1,111 @@
+# benchmarks/doctor_dashboard.py
+"""
+The doctor dashboard with a busy diary: N upcoming appointments for one
+doctor, half pending and half approved. Reports queries and latency for the
+first dashboard page (status counts cold and cached) and for a keyset page
+deep into the pending queue, whose query is also timed against the OFFSET
+query that page used to need.
+
+    python -m benchmarks.doctor_dashboard --appointments 100000
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from benchmarks._scratch import setup, timed
+
+
+def measure(repeat, fn):
+    """Median milliseconds and queries per call of fn()."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    times = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=100_000)
+    parser.add_argument('--depth', type=int, default=1000, help='Pending-queue page to compare with OFFSET.')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    from hospital.pagination import DEFAULT_PER_PAGE, encode_cursor, paginate  # no models, so fine before setup()
+
+    # Half the appointments are pending, and the page after `depth` full pages must exist
+    pending_pages = args.appointments // 2 // DEFAULT_PER_PAGE
+    if not 1 <= args.depth < pending_pages:
+        parser.error(f'--depth must be between 1 and {pending_pages - 1} for {args.appointments} appointments')
+    setup()
+
+    from django.test import Client, RequestFactory
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from django.utils import timezone
+
+    from accounts.models import User
+    from hospital.counters import invalidate_doctor_counts
+    from hospital.models import Appointment, Doctor, Patient
+
+    setup_test_environment()
+    with timed(f'setup ({args.appointments} appointments)'):
+        doctor = Doctor.objects.create(
+            user=User.objects.create_user('doc', password='pw', role='DOCTOR'), specialty='General', is_approved=True
+        )
+        patient = Patient.objects.create(user=User.objects.create_user('pat', role='PATIENT'))
+        start = timezone.localdate() + datetime.timedelta(days=1)
+        # Sixteen half-hour slots a day, alternately pending and approved
+        Appointment.objects.bulk_create([
+            Appointment(
+                patient=patient, doctor=doctor, status=('Pending', 'Approved')[i % 2],
+                appointment_date=start + datetime.timedelta(days=i // 16),
+                appointment_time=datetime.time(9 + i % 16 // 2, 30 * (i % 2)),
+            )
+            for i in range(args.appointments)
+        ], batch_size=5000)
+
+    client = Client()
+    client.force_login(doctor.user)
+    url = reverse('doctor_dashboard')
+
+    def cold():
+        invalidate_doctor_counts(doctor.pk)
+        client.get(url)
+
+    ms, queries = measure(args.repeat, cold)
+    print(f'dashboard, counts cold      {ms:7.1f} ms, {queries} queries')
+    ms, queries = measure(args.repeat, lambda: client.get(url))
+    print(f'dashboard, counts cached    {ms:7.1f} ms, {queries} queries')
+
+    pending = Appointment.objects.filter(doctor=doctor, status='Pending', appointment_date__gte=timezone.localdate())
+    ordering = ('appointment_date', 'appointment_time', 'pk')
+    offset = args.depth * DEFAULT_PER_PAGE
+    last = pending.order_by(*ordering)[offset - 1]
+    cursor = encode_cursor([last.appointment_date, last.appointment_time, last.pk], 'next')
+    deep_url = f'{url}?pending={cursor}'
+
+    page = client.get(deep_url).context['pending_appointments']
+    offset_page = list(pending.select_related('patient__user').order_by(*ordering)[offset:offset + DEFAULT_PER_PAGE])
+    assert [a.pk for a in page] == [a.pk for a in offset_page], 'keyset and OFFSET pages differ'
+
+    ms, queries = measure(args.repeat, lambda: client.get(deep_url))
+    print(f'dashboard, pending page {args.depth:<4}{ms:7.1f} ms, {queries} queries')
+    request = RequestFactory().get(deep_url)
+    ms, _ = measure(args.repeat, lambda: list(
+        paginate(request, pending.select_related('patient__user'), ordering[:2], param='pending')
+    ))
+    print(f'  keyset query alone        {ms:7.1f} ms')
+    ms, _ = measure(args.repeat, lambda: list(
+        pending.select_related('patient__user').order_by(*ordering)[offset:offset + DEFAULT_PER_PAGE]
+    ))
+    print(f'  OFFSET query alone        {ms:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
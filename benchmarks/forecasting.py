@@ -0,0 +1,66 @@
+# benchmarks/forecasting.py
+"""
+Demand forecasts over a long, dense history: P products that each sold
+something on every one of the last D days. Times the two passes over the
+daily sales rollup and two full forecast_demand() runs (the first inserts
+every forecast, the second updates them), with the Python heap's peak.
+
+    python -m benchmarks.forecasting --products 5000 --days 1095
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks._scratch import setup, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=1095)
+    args = parser.parse_args()
+    setup()
+
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from pharmacy import forecasting
+    from pharmacy.models import ProductDailySales
+
+    today = timezone.localdate()
+    with timed(f'setup ({args.products} products x {args.days} days)'), transaction.atomic():
+        with connection.cursor() as cursor:
+            # Straight SQL: tens of millions of ORM objects would take longer than the benchmark
+            cursor.execute(f"""
+                WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {args.products})
+                INSERT INTO pharmacy_product (name, description, price, stock, reserved, reorder_point, reorder_quantity, updated_at)
+                SELECT 'P' || i, '', 1, 100, 0, 10, 50, datetime('now') FROM n
+            """)
+            cursor.execute(f"""
+                WITH RECURSIVE d(k) AS (SELECT 1 UNION ALL SELECT k + 1 FROM d WHERE k < {args.days})
+                INSERT INTO pharmacy_productdailysales (product_id, day, units)
+                SELECT p.id, date(%s, '-' || d.k || ' days'), 1 + ((d.k * 7 + p.id * 13) %% 5)
+                FROM d CROSS JOIN pharmacy_product p ORDER BY d.k DESC
+            """, [today.isoformat()])
+    print(f'{ProductDailySales.objects.count()} daily sales rows')
+
+    started = time.perf_counter()
+    products = len(forecasting._history(today))
+    print(f'history pass: {products} products in {time.perf_counter() - started:.2f}s')
+    started = time.perf_counter()
+    rows = sum(1 for _ in forecasting._recent_days(today))
+    print(f'window pass: {rows} rows in {time.perf_counter() - started:.2f}s')
+
+    for run in ('first', 'second'):
+        tracemalloc.start()
+        started = time.perf_counter()
+        written, cleared = forecasting.forecast_demand(today)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{run} forecast_demand(): {written} written, {cleared} cleared in {elapsed:.2f}s, '
+              f'peak traced memory {peak / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
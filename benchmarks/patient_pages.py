@@ -0,0 +1,86 @@
+# benchmarks/patient_pages.py
+"""
+Conditional GETs on the patient pages: one patient with N appointments and
+prescriptions spread over many doctors. For the dashboard, the appointment
+list and the prescription list, compares a full render with a revalidation
+that ends in 304 Not Modified (time and queries per request).
+
+    python -m benchmarks.patient_pages --appointments 5000
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from benchmarks._scratch import setup
+
+
+def measure(client, url, repeat, **headers):
+    """Median milliseconds, queries and status of `repeat` GETs of `url`."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    times = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url, **headers)
+            times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), len(queries), response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=5000)
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    setup()
+
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from django.utils import timezone
+
+    from accounts.models import User
+    from hospital.models import Appointment, Doctor, Patient, Prescription
+
+    setup_test_environment()
+    User.objects.bulk_create([
+        User(username=f'doc{i}', password='!', role='DOCTOR', first_name='Doc', last_name=str(i))
+        for i in range(args.doctors)
+    ])
+    Doctor.objects.bulk_create([
+        Doctor(user_id=pk, specialty='General', is_approved=True)
+        for pk in User.objects.filter(role='DOCTOR').values_list('pk', flat=True)
+    ])
+    doctors = list(Doctor.objects.values_list('pk', flat=True))
+    user = User.objects.create_user('pat', 'pat@example.com', 'pw', role='PATIENT')
+    patient = Patient.objects.create(user=user)
+    today = timezone.localdate()
+    Appointment.objects.bulk_create([
+        Appointment(
+            patient=patient, doctor_id=doctors[i % len(doctors)], status='Approved',
+            appointment_date=today + datetime.timedelta(days=i % 365 - 180), appointment_time=datetime.time(9),
+        )
+        for i in range(args.appointments)
+    ], batch_size=2000)
+    Prescription.objects.bulk_create([
+        Prescription(patient=patient, doctor_id=doctors[i % len(doctors)], prescription_text='Rest and fluids')
+        for i in range(args.appointments)
+    ], batch_size=2000)
+
+    client = Client()
+    client.force_login(user)
+    print(f'{args.appointments} appointments and prescriptions over {args.doctors} doctors')
+    for name in ('patient_dashboard', 'my_appointments', 'my_prescriptions'):
+        url = reverse(name)
+        full_ms, full_queries, response = measure(client, url, args.repeat)
+        cached_ms, cached_queries, cached = measure(client, url, args.repeat, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert cached.status_code == 304, cached.status_code
+        print(f'{name:18} 200: {full_ms:6.1f} ms, {full_queries:2} queries   '
+              f'304: {cached_ms:6.1f} ms, {cached_queries:2} queries')
+
+
+if __name__ == '__main__':
+    main()
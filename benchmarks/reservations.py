@@ -0,0 +1,88 @@
+# benchmarks/reservations.py
+"""
+Sweeping cart holds at scale: N carts with two holds each, half of them
+expired and a tenth of the carts abandoned. Times sweep_expired() and
+purge_abandoned_carts(), the length of the single chunk transactions that
+block shoppers, and checks Product.reserved against the holds left.
+
+    python -m benchmarks.reservations --carts 100000
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from benchmarks._scratch import setup, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--carts', type=int, default=100_000)
+    parser.add_argument('--products', type=int, default=500)
+    args = parser.parse_args()
+    setup()
+
+    from django.db import connection
+    from django.db.models import Sum
+    from django.utils import timezone
+
+    from accounts.models import User
+    from pharmacy import reservations
+    from pharmacy.models import Cart, Product, StockReservation
+
+    with timed(f'setup ({args.carts} carts, {2 * args.carts} holds)'):
+        products = Product.objects.bulk_create(
+            [Product(name=f'P{i}', description='', price=1, stock=10**7) for i in range(args.products)]
+        )
+        User.objects.bulk_create(
+            [User(username=f'u{i}', password='!', role='PATIENT') for i in range(args.carts)], batch_size=5000
+        )
+        Cart.objects.bulk_create([Cart(user_id=pk) for pk in User.objects.values_list('pk', flat=True)], batch_size=5000)
+        cart_ids = list(Cart.objects.values_list('pk', flat=True))
+        now = timezone.now()
+        StockReservation.objects.bulk_create(
+            (
+                StockReservation(
+                    cart_id=cart_id, product_id=products[(i + k) % len(products)].pk, quantity=2,
+                    expires_at=now + datetime.timedelta(minutes=-5 if i % 2 else 10),
+                )
+                for i, cart_id in enumerate(cart_ids) for k in range(2)
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE pharmacy_product SET reserved = (SELECT COALESCE(SUM(quantity), 0) '
+                'FROM pharmacy_stockreservation r WHERE r.product_id = pharmacy_product.id)'
+            )
+        Cart.objects.filter(pk__in=cart_ids[::10]).update(updated_at=now - datetime.timedelta(days=40))
+
+    start = time.perf_counter()
+    released = reservations.sweep_expired()
+    elapsed = time.perf_counter() - start
+    print(f'sweep_expired: {released} holds in {elapsed:.2f}s ({released / elapsed:.0f} holds/s)')
+
+    with timed('purge_abandoned_carts'):
+        purged = reservations.purge_abandoned_carts()
+    print(f'  {purged} carts purged')
+
+    held = dict(StockReservation.objects.values('product').annotate(total=Sum('quantity')).values_list('product', 'total'))
+    drift = sum(1 for pk, reserved in Product.objects.values_list('pk', 'reserved') if reserved != held.get(pk, 0))
+    print(f'products whose reserved differs from their holds: {drift}')
+
+    # One chunk transaction is the longest a shopper can wait on the sweep
+    StockReservation.objects.update(expires_at=timezone.now() - datetime.timedelta(minutes=1))
+    latencies = []
+    while True:
+        ids = list(StockReservation.objects.values_list('pk', flat=True)[:reservations.SWEEP_CHUNK_SIZE])
+        if not ids:
+            break
+        start = time.perf_counter()
+        reservations.release(StockReservation.objects.filter(pk__in=ids))
+        latencies.append(time.perf_counter() - start)
+    print(f'chunk transaction: median {statistics.median(latencies) * 1000:.0f}ms, '
+          f'max {max(latencies) * 1000:.0f}ms over {len(latencies)} chunks')
+
+
+if __name__ == '__main__':
+    main()
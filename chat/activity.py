@@ -0,0 +1,27 @@
+# chat/activity.py
+"""
+Bookkeeping done for every newly saved message.
+
+Besides the unread counts (unread.py), each conversation keeps the time and
+the start of its latest message, and every participant's read cursor keeps
+the same time so the chat list can page through "my conversations, most
+recently active first" straight off an index.
+"""
+from .models import PREVIEW_LENGTH, Conversation, ReadCursor
+from . import unread
+
+
+def record_new(messages):
+    """Call with messages just saved (with ids), in the transaction that saved them."""
+    latest = {}
+    for message in messages:
+        if message.conversation_id not in latest or message.pk > latest[message.conversation_id].pk:
+            latest[message.conversation_id] = message
+
+    for conversation_id, message in latest.items():
+        Conversation.objects.filter(pk=conversation_id).update(
+            last_message_at=message.timestamp, last_message=message.body[:PREVIEW_LENGTH]
+        )
+        ReadCursor.objects.filter(conversation_id=conversation_id).update(last_message_at=message.timestamp)
+
+    unread.count_new(messages)
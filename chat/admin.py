@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Conversation, Message
+from .models import Conversation, Message, ReadCursor
 
 admin.site.register(Conversation)
-admin.site.register(Message)
\ No newline at end of file
+admin.site.register(Message)
+admin.site.register(ReadCursor)
\ No newline at end of file
@@ -0,0 +1,96 @@
+# chat/broadcast.py
+"""
+Fan-out of new chat messages to the websocket connections that want them.
+
+Connections subscribe to a group (one per conversation) and get a bounded
+asyncio queue; publishing puts the message on the queue of every subscriber
+in the group. The layer is picked with the CHAT_BROADCAST_BACKEND setting.
+
+InMemoryBroadcast only reaches connections served by this process, which is
+right for a single worker and for tests. Running several workers needs a
+backend with the same three methods on top of a shared bus (e.g. Redis
+pub/sub), so a message saved by one worker reaches sockets held by another.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# A connection this far behind is dropped rather than buffered without limit
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def conversation_group(conversation_id):
+    return f'conversation.{conversation_id}'
+
+
+class Subscriber:
+    def __init__(self, group):
+        self.group = group
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        # Set when messages had to be dropped; the connection should be closed
+        self.overflowed = False
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class InMemoryBroadcast:
+    """Delivers to subscribers in this process only."""
+
+    def __init__(self):
+        self._groups = defaultdict(set)
+        self._loop = None
+
+    def subscribe(self, group):
+        """Returns a Subscriber for `group`. Call from the event loop serving the sockets."""
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(group)
+        self._groups[group].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self._groups.get(subscriber.group)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._groups[subscriber.group]
+
+    def publish(self, group, message):
+        """Sends `message` (JSON text) to the group. Safe to call from any thread, e.g. a sync view."""
+        if self._loop is None or self._loop.is_closed():
+            return  # No socket has ever connected to this process
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._deliver(group, message)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, group, message)
+
+    def _deliver(self, group, message):
+        for subscriber in list(self._groups.get(group, ())):
+            subscriber.deliver(message)
+
+    def subscriber_count(self):
+        return sum(len(subscribers) for subscribers in self._groups.values())
+
+
+_broadcast = None
+_lock = threading.Lock()
+
+
+def get_broadcast():
+    """The process-wide broadcast layer named by CHAT_BROADCAST_BACKEND."""
+    global _broadcast
+    if _broadcast is None:
+        with _lock:
+            if _broadcast is None:
+                _broadcast = import_string(settings.CHAT_BROADCAST_BACKEND)()
+    return _broadcast
@@ -0,0 +1,35 @@
+# chat/history.py
+"""
+Reading a conversation's messages a page at a time.
+
+Messages are paged by id along the (conversation, id) index: the chat page
+shows the latest PAGE_SIZE, `before` walks back through older ones and
+`after` returns what arrived since the newest message a client has. Each is
+one indexed range read with the senders joined in, however long the
+conversation is.
+"""
+from .models import Message
+
+PAGE_SIZE = 50
+
+
+def _messages(conversation_id):
+    return Message.objects.filter(conversation_id=conversation_id).select_related('sender')
+
+
+def before(conversation_id, message_id=None, limit=PAGE_SIZE):
+    """
+    The `limit` messages before `message_id` (or the latest ones), oldest first,
+    and whether there are older ones still.
+    """
+    messages = _messages(conversation_id)
+    if message_id is not None:
+        messages = messages.filter(pk__lt=message_id)
+    page = list(messages.order_by('-pk')[:limit + 1])
+    return page[:limit][::-1], len(page) > limit
+
+
+def after(conversation_id, message_id, limit=PAGE_SIZE):
+    """The first `limit` messages after `message_id`, oldest first, and whether more follow."""
+    page = list(_messages(conversation_id).filter(pk__gt=message_id).order_by('pk')[:limit + 1])
+    return page[:limit], len(page) > limit
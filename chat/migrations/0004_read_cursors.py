@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# One cursor per participant. Nothing recorded what anyone had read, so a participant
+# counts as having read up to their own latest message, and everything the others
+# sent after it is unread.
+FILL_CURSORS_SQL = """
+INSERT INTO chat_readcursor (conversation_id, user_id, last_read_message_id, unread_count)
+SELECT p.conversation_id, p.user_id, p.last_read,
+       (SELECT COUNT(*) FROM chat_message m
+         WHERE m.conversation_id = p.conversation_id AND m.id > p.last_read AND m.sender_id <> p.user_id)
+FROM (
+    SELECT cp.conversation_id, cp.user_id,
+           COALESCE((SELECT MAX(m.id) FROM chat_message m
+                      WHERE m.conversation_id = cp.conversation_id AND m.sender_id = cp.user_id), 0) AS last_read
+    FROM chat_conversation_participants cp
+) p
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0003_message_conversation_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.PositiveBigIntegerField(default=0)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='chat.conversation')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='readcursor',
+            constraint=models.UniqueConstraint(fields=('user', 'conversation'), name='unique_read_cursor'),
+        ),
+        migrations.RunSQL(FILL_CURSORS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# Fill the new columns from each conversation's latest message (by id, along the
+# (conversation, id) index); conversations without messages keep their creation time
+FILL_ACTIVITY_SQL = [
+    """
+    UPDATE chat_conversation SET
+        last_message_at = COALESCE((SELECT m.timestamp FROM chat_message m WHERE m.conversation_id = chat_conversation.id
+                                    ORDER BY m.id DESC LIMIT 1), created_at),
+        last_message = COALESCE((SELECT substr(m.body, 1, 100) FROM chat_message m WHERE m.conversation_id = chat_conversation.id
+                                 ORDER BY m.id DESC LIMIT 1), '')
+    """,
+    """
+    UPDATE chat_readcursor SET
+        last_message_at = (SELECT c.last_message_at FROM chat_conversation c WHERE c.id = chat_readcursor.conversation_id)
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_read_cursors'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='conversation',
+            name='conversation_created_idx',
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='readcursor',
+            name='last_message_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunSQL(FILL_ACTIVITY_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='readcursor',
+            index=models.Index(fields=['user', '-last_message_at', '-id'], name='read_cursor_activity_idx'),
+        ),
+    ]
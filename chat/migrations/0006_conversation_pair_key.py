@@ -0,0 +1,89 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:39
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+BATCH_SIZE = 1000
+
+
+def _merge(apps, duplicate_id, canonical_id):
+    """Moves a duplicate chat's messages into the canonical one and deletes it."""
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    ReadCursor = apps.get_model('chat', 'ReadCursor')
+    Message.objects.filter(conversation_id=duplicate_id).update(conversation_id=canonical_id)
+    # Whatever someone had read in either chat stays read
+    for user_id, last_read in ReadCursor.objects.filter(conversation_id=duplicate_id).values_list('user_id', 'last_read_message_id'):
+        ReadCursor.objects.filter(
+            conversation_id=canonical_id, user_id=user_id, last_read_message_id__lt=last_read
+        ).update(last_read_message_id=last_read)
+    Conversation.objects.filter(pk=duplicate_id).delete()
+
+
+def _recount(apps, conversation_id):
+    """Redoes the activity fields and unread counts of a chat that took in messages."""
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    ReadCursor = apps.get_model('chat', 'ReadCursor')
+    latest = Message.objects.filter(conversation_id=conversation_id).order_by('-pk').first()
+    if latest is not None:
+        Conversation.objects.filter(pk=conversation_id).update(last_message_at=latest.timestamp, last_message=latest.body[:100])
+        ReadCursor.objects.filter(conversation_id=conversation_id).update(last_message_at=latest.timestamp)
+    for cursor in ReadCursor.objects.filter(conversation_id=conversation_id):
+        cursor.unread_count = Message.objects.filter(
+            conversation_id=conversation_id, pk__gt=cursor.last_read_message_id
+        ).exclude(sender_id=cursor.user_id).count()
+        cursor.save(update_fields=['unread_count'])
+
+
+def fill_pair_keys(apps, schema_editor):
+    """
+    Gives every two-person chat its pair key, a batch of chats at a time in id
+    order. When two people already have several chats, the oldest keeps the key
+    and the others are merged into it.
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    Through = Conversation.participants.through
+    pairs = (
+        Through.objects.order_by().values('conversation_id')
+        .annotate(people=Count('user_id'), low=Min('user_id'), high=Max('user_id'))
+        .filter(people=2)
+    )
+    merged = set()
+    last = 0
+    while True:
+        batch = list(pairs.filter(conversation_id__gt=last).order_by('conversation_id')[:BATCH_SIZE])
+        if not batch:
+            break
+        last = batch[-1]['conversation_id']
+        keys = {row['conversation_id']: f"{row['low']}:{row['high']}" for row in batch}
+        # Keys handed out by earlier batches
+        owners = dict(Conversation.objects.filter(pair_key__in=keys.values()).values_list('pair_key', 'pk'))
+        keyed = []
+        for conversation_id, key in keys.items():
+            if key in owners:
+                _merge(apps, conversation_id, owners[key])
+                merged.add(owners[key])
+            else:
+                owners[key] = conversation_id
+                keyed.append(Conversation(pk=conversation_id, pair_key=key))
+        Conversation.objects.bulk_update(keyed, ['pair_key'])
+
+    for conversation_id in merged:
+        _recount(apps, conversation_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_conversation_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='pair_key',
+            field=models.CharField(blank=True, max_length=41, null=True, unique=True),
+        ),
+        migrations.RunPython(fill_pair_keys, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,27 @@
 from django.db import models
+from django.utils import timezone
 from accounts.models import User # We need our custom User model
 
+# Characters of the latest message kept on the conversation for the chat list
+PREVIEW_LENGTH = 100
+
+
+def pair_key(user_id, other_id):
+    """Key of the direct conversation between two users, the same whichever way round."""
+    low, high = sorted((user_id, other_id))
+    return f'{low}:{high}'
+
 class Conversation(models.Model):
     # We use ManyToManyField so we can link two (or more) users to one chat
     participants = models.ManyToManyField(User, related_name='conversations')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Copied from the latest message as it is saved (see chat/activity.py), so the chat
+    # list needn't look at messages; until there is one, last_message_at is the creation time
+    last_message_at = models.DateTimeField(default=timezone.now)
+    last_message = models.CharField(max_length=PREVIEW_LENGTH, blank=True)
+    # pair_key() of the two participants for one-to-one chats, so that finding (or
+    # creating) the chat between two people is one probe of this unique index
+    pair_key = models.CharField(max_length=41, null=True, blank=True, unique=True)
 
     def __str__(self):
         # Get the first two participants for a clean title
@@ -13,9 +30,11 @@ class Conversation(models.Model):
             return f"Chat between {users[0].username} and {users[1].username}"
         return f"Conversation {self.id}"
 
+
 class Message(models.Model):
     # Link the message to a conversation
-    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
+    # (no index of its own: the (conversation, id) index below starts with it)
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages', db_index=False)
     # Link to the user who sent the message
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     # The actual text of the message
@@ -27,4 +46,33 @@ class Message(models.Model):
 
     class Meta:
         # Sort messages by timestamp, newest last
-        ordering = ['timestamp']
\ No newline at end of file
+        ordering = ['timestamp']
+        indexes = [
+            # A conversation's messages in id (= sending) order, for the latest page and
+            # the before/after paging in chat/history.py
+            models.Index(fields=['conversation', 'id'], name='message_conversation_id_idx'),
+        ]
+
+class ReadCursor(models.Model):
+    # How far one participant has read a conversation. unread_count is the number of
+    # messages from the others after last_read_message_id; chat/unread.py keeps it up
+    # to date as messages are saved, so showing it never means counting messages.
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_cursors')
+    # (no index of its own: the unique (user, conversation) constraint starts with it)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='read_cursors', db_index=False)
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+    # The conversation's last_message_at, repeated per participant so that the
+    # index below lists a user's conversations by recent activity
+    last_message_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user.username} in conversation {self.conversation_id}: {self.unread_count} unread"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'conversation'], name='unique_read_cursor'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-last_message_at', '-id'], name='read_cursor_activity_idx'),
+        ]
@@ -0,0 +1,148 @@
+# chat/realtime.py
+"""
+Pushing saved chat messages to the conversation's open websockets.
+
+publish_message() broadcasts a saved Message to its conversation group. The
+post_save signal calls it for messages posted through the chat page form, and
+MessageWriter calls it for messages that arrive over a websocket.
+
+MessageWriter keeps database writes off the event loop: incoming messages go
+on a queue, and one background task saves whatever has piled up with a
+single bulk_create (in the sync thread shared by all of Django's async
+views), then broadcasts the saved rows. Under load many messages share one
+write, and senders see their own message come back once it is stored.
+
+If a batch can't be saved it is retried one conversation at a time, so one
+bad conversation doesn't cost the others their messages; senders whose
+messages still fail get an error frame. The queue is bounded overall and per
+socket, and a socket that hits either limit is told to slow down.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import dateformat, timezone
+
+from . import activity
+from .broadcast import conversation_group, get_broadcast
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+# Most messages saved in one bulk_create
+WRITE_BATCH_SIZE = 200
+# Most messages waiting to be saved, from all sockets and from one socket
+QUEUE_SIZE = 2000
+SOCKET_QUEUE_SIZE = 20
+
+SAVE_FAILED = 'Your message could not be saved. Please send it again.'
+
+
+def message_data(message):
+    """One saved message as sent to sockets and the messages JSON endpoint."""
+    return {
+        'id': message.pk,
+        'conversation': message.conversation_id,
+        'sender_id': message.sender_id,
+        'sender': message.sender.username,
+        'body': message.body,
+        # Same format as the chat page template
+        'time': dateformat.format(timezone.localtime(message.timestamp), 'M d, H:i'),
+    }
+
+
+def publish_message(message):
+    get_broadcast().publish(conversation_group(message.conversation_id), json.dumps(message_data(message)))
+
+
+def _save(messages):
+    # bulk_create sends no post_save, so unread counts and activity are updated here
+    with transaction.atomic():
+        saved = Message.objects.bulk_create(messages)
+        activity.record_new(saved)
+    return saved
+
+
+async def _report_failure(reply):
+    try:
+        await reply({'type': 'websocket.send', 'text': json.dumps({'error': SAVE_FAILED})})
+    except Exception:
+        pass  # The socket has gone away since the message was sent
+
+
+class MessageWriter:
+    """Saves websocket messages in batches from a background task, then publishes them."""
+
+    def __init__(self):
+        self._loop = None
+        self._queue = None
+        self._task = None
+        # Submitted but not yet saved and published, in total and per socket
+        self._pending = 0
+        self._pending_by_socket = defaultdict(int)
+
+    def submit(self, conversation_id, sender, body, reply):
+        """
+        Queues a message for saving. Call from the event loop; returns at once.
+        `reply` is the sending socket's ASGI send, told if the message can't be
+        saved. Returns False, queueing nothing, when too many messages are waiting.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._queue = loop, asyncio.Queue(QUEUE_SIZE)
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        if self._queue.full() or self._pending_by_socket.get(reply, 0) >= SOCKET_QUEUE_SIZE:
+            return False
+        self._queue.put_nowait((Message(conversation_id=conversation_id, sender=sender, body=body), reply))
+        self._pending += 1
+        self._pending_by_socket[reply] += 1
+        return True
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._write(batch)
+            except Exception:
+                logger.exception('Could not publish %d chat messages', len(batch))
+            finally:
+                self._pending -= len(batch)
+                for _, reply in batch:
+                    self._pending_by_socket[reply] -= 1
+                    if not self._pending_by_socket[reply]:
+                        del self._pending_by_socket[reply]
+
+    async def _write(self, batch):
+        try:
+            saved = await sync_to_async(_save)([message for message, _ in batch])
+        except Exception:
+            logger.exception('Could not save %d chat messages; retrying them by conversation', len(batch))
+            by_conversation = defaultdict(list)
+            for message, reply in batch:
+                # The failed insert may have numbered them already
+                message.pk = None
+                by_conversation[message.conversation_id].append((message, reply))
+            saved = []
+            for conversation_id, items in by_conversation.items():
+                try:
+                    saved.extend(await sync_to_async(_save)([message for message, _ in items]))
+                except Exception:
+                    logger.exception('Could not save %d chat messages to conversation %s', len(items), conversation_id)
+                    for reply in {reply for _, reply in items}:
+                        await _report_failure(reply)
+        for message in saved:
+            publish_message(message)
+
+    async def drain(self):
+        """Waits until every submitted message has been saved and published. For shutdown and tests."""
+        while self._pending:
+            await asyncio.sleep(0.01)
+
+
+writer = MessageWriter()
@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from . import activity, realtime
+from .models import Conversation, Message, ReadCursor
+
+# --- Push messages posted through the chat page form to the open websockets ---
+# (Websocket messages are bulk created by realtime.MessageWriter, which publishes them itself.)
+
+@receiver(post_save, sender=Message)
+def publish_new_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: realtime.publish_message(instance))
+
+# --- Keep unread counts and conversation activity in step (MessageWriter does this for its batches) ---
+
+@receiver(post_save, sender=Message)
+def record_new_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        activity.record_new([instance])
+
+# --- One read cursor per participant; people who join start at the latest message ---
+# (and take over the conversation's activity time, so it lists in the right place)
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def sync_read_cursors(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        ReadCursor.objects.filter(**{'user' if reverse else 'conversation': instance}).delete()
+        return
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    # instance is the conversation, or the user when the change came from user.conversations
+    pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+    if action == 'post_remove':
+        for conversation_id, user_id in pairs:
+            ReadCursor.objects.filter(conversation_id=conversation_id, user_id=user_id).delete()
+        return
+    conversation_ids = {conversation_id for conversation_id, _ in pairs}
+    latest = dict(
+        Message.objects.filter(conversation_id__in=conversation_ids)
+        .order_by().values('conversation_id').annotate(latest=Max('pk')).values_list('conversation_id', 'latest')
+    )
+    active = dict(Conversation.objects.filter(pk__in=conversation_ids).values_list('pk', 'last_message_at'))
+    ReadCursor.objects.bulk_create(
+        [
+            ReadCursor(conversation_id=conversation_id, user_id=user_id,
+                       last_read_message_id=latest.get(conversation_id, 0),
+                       last_message_at=active[conversation_id])
+            for conversation_id, user_id in pairs
+        ],
+        ignore_conflicts=True,
+    )
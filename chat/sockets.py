@@ -0,0 +1,133 @@
+# chat/sockets.py
+"""
+The chat websocket, served straight from config/asgi.py at /ws/chat/<conversation id>/.
+
+The browser's session cookie is checked the same way Django checks it for a
+page, and only participants of the conversation are accepted; anyone else
+is refused before the handshake completes. Cross-site pages are refused by
+checking the Origin header against the Host (or CSRF_TRUSTED_ORIGINS).
+
+Clients send {"body": "..."}. Every connection to the conversation, the
+sender's included, receives each message once it is saved, as
+{"id", "conversation", "sender_id", "sender", "body", "time"}.
+
+Messages pushed to a connection count as read by its user (see unread.py).
+A message that can't be saved, or that arrives while too many from the
+connection are still waiting to be (see realtime.py), is answered with
+{"error": "..."} like a malformed frame.
+
+A connection costs one coroutine for reading, one task for writing and a
+bounded queue (see broadcast.py), so a worker holds thousands of them.
+"""
+import asyncio
+import json
+import re
+from importlib import import_module
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+
+from . import unread
+from .broadcast import conversation_group, get_broadcast
+from .models import Conversation
+from .realtime import writer
+
+PATH = re.compile(r'^/ws/chat/(?P<conversation_id>\d+)/$')
+MAX_MESSAGE_LENGTH = 4000
+# Close codes: refused before the handshake, and dropped for falling too far behind
+REFUSED = 4403
+TRY_AGAIN_LATER = 1013
+BUSY = 'Too many messages at once. Wait a moment and send it again.'
+
+
+def _headers(scope):
+    return {name.decode('latin1').lower(): value.decode('latin1') for name, value in scope.get('headers', [])}
+
+
+def _same_origin(headers):
+    origin = headers.get('origin')
+    if not origin:
+        return True  # Not a browser; without the session cookie it gets nowhere anyway
+    return urlparse(origin).netloc == headers.get('host') or origin in settings.CSRF_TRUSTED_ORIGINS
+
+
+@sync_to_async
+def _participant(headers, conversation_id):
+    """The logged-in user behind the session cookie, if they take part in the conversation."""
+    session_key = parse_cookie(headers.get('cookie', '')).get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    request = HttpRequest()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    user = get_user(request)
+    if not user.is_authenticated:
+        return None
+    if not Conversation.participants.through.objects.filter(conversation_id=conversation_id, user_id=user.pk).exists():
+        return None
+    return user
+
+
+def _message_body(event):
+    """Returns (message text, None) for a client frame, or (None, what was wrong with it)."""
+    try:
+        data = json.loads(event.get('text') or event.get('bytes') or '')
+        body = str(data.get('body', '')).strip()
+    except (ValueError, AttributeError):
+        return None, 'Send messages as {"body": "..."}.'
+    if len(body) > MAX_MESSAGE_LENGTH:
+        return None, f'Messages can be at most {MAX_MESSAGE_LENGTH} characters.'
+    return body, None
+
+
+async def _push(send, subscriber, conversation_id, user_id):
+    mark_read = sync_to_async(unread.mark_read)
+    while True:
+        text = await subscriber.queue.get()
+        if subscriber.overflowed:
+            await send({'type': 'websocket.close', 'code': TRY_AGAIN_LATER})
+            return
+        await send({'type': 'websocket.send', 'text': text})
+        # Move the read cursor once per burst rather than once per message
+        if subscriber.queue.empty():
+            await mark_read(conversation_id, user_id, json.loads(text)['id'])
+
+
+async def chat_socket(scope, receive, send):
+    """ASGI application for the chat websocket."""
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    headers = _headers(scope)
+    match = PATH.match(scope['path'])
+    user = None
+    if match and _same_origin(headers):
+        conversation_id = int(match['conversation_id'])
+        user = await _participant(headers, conversation_id)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': REFUSED})
+        return
+    await send({'type': 'websocket.accept'})
+
+    broadcast = get_broadcast()
+    subscriber = broadcast.subscribe(conversation_group(conversation_id))
+    pusher = asyncio.ensure_future(_push(send, subscriber, conversation_id, user.pk))
+    try:
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                break
+            if event['type'] != 'websocket.receive':
+                continue
+            body, error = _message_body(event)
+            if error:
+                await send({'type': 'websocket.send', 'text': json.dumps({'error': error})})
+            elif body and not writer.submit(conversation_id, user, body, send):
+                await send({'type': 'websocket.send', 'text': json.dumps({'error': BUSY})})
+    finally:
+        pusher.cancel()
+        broadcast.unsubscribe(subscriber)
@@ -1,3 +1,229 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from accounts.models import User
+from . import activity, history, realtime, unread
+from .models import Conversation, Message, ReadCursor
+
+
+def make_user(username):
+    return User.objects.create_user(username, f'{username}@example.com', 'pw', role='PATIENT')
+
+
+def make_conversation(*users):
+    conversation = Conversation.objects.create()
+    conversation.participants.add(*users)
+    return conversation
+
+
+class Socket:
+    """Stands in for a websocket's ASGI send, keeping the frames sent to it."""
+
+    def __init__(self):
+        self.frames = []
+
+    async def __call__(self, event):
+        self.frames.append(json.loads(event['text']))
+
+
+class MessageWriterTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = make_user('alice'), make_user('bob'), make_user('carol')
+        self.working = make_conversation(self.alice, self.bob)
+        self.broken = make_conversation(self.alice, self.carol)
+        self.writer = realtime.MessageWriter()
+
+    async def run_writer(self):
+        await self.writer.drain()
+        self.writer._task.cancel()
+
+    async def test_failed_batch_is_retried_by_conversation(self):
+        save = realtime._save
+
+        def failing_save(messages):
+            if any(message.conversation_id == self.broken.pk for message in messages):
+                raise DatabaseError('disk I/O error')
+            return save(messages)
+
+        working_socket, broken_socket = Socket(), Socket()
+        with mock.patch.object(realtime, '_save', failing_save), self.assertLogs('chat.realtime', 'ERROR'):
+            self.writer.submit(self.working.pk, self.alice, 'hello bob', working_socket)
+            self.writer.submit(self.broken.pk, self.alice, 'hello carol', broken_socket)
+            await self.run_writer()
+
+        bodies = await sync_to_async(list)(Message.objects.values_list('body', flat=True))
+        self.assertEqual(bodies, ['hello bob'])
+        self.assertEqual(working_socket.frames, [])
+        self.assertEqual(broken_socket.frames, [{'error': realtime.SAVE_FAILED}])
+
+    async def test_each_socket_can_only_queue_so_many(self):
+        flooding, quiet = Socket(), Socket()
+        accepted = [
+            self.writer.submit(self.working.pk, self.alice, f'message {i}', flooding)
+            for i in range(realtime.SOCKET_QUEUE_SIZE + 1)
+        ]
+        self.assertEqual(accepted.count(True), realtime.SOCKET_QUEUE_SIZE)
+        self.assertFalse(accepted[-1])
+        self.assertTrue(self.writer.submit(self.working.pk, self.bob, 'still here', quiet))
+        await self.run_writer()
+
+        self.assertEqual(await Message.objects.acount(), realtime.SOCKET_QUEUE_SIZE + 1)
+        # Once saved, the socket may send again
+        self.assertTrue(self.writer.submit(self.working.pk, self.alice, 'one more', flooding))
+        await self.run_writer()
+
+
+class HistoryTests(TestCase):
+    def setUp(self):
+        alice, bob = make_user('alice'), make_user('bob')
+        self.conversation = make_conversation(alice, bob)
+        other = make_conversation(alice, bob)
+        # Interleaved with another conversation's messages, so ids have gaps
+        Message.objects.bulk_create([
+            Message(conversation=(self.conversation, other)[i % 2], sender=(alice, bob)[i % 3 == 0], body=f'message {i}')
+            for i in range(250)
+        ])
+        self.ids = list(Message.objects.filter(conversation=self.conversation).order_by('pk').values_list('pk', flat=True))
+
+    def test_latest_page(self):
+        page, more = history.before(self.conversation.pk)
+        self.assertEqual([message.pk for message in page], self.ids[-history.PAGE_SIZE:])
+        self.assertTrue(more)
+
+    def test_walking_back_visits_every_message_once(self):
+        seen, cursor, more = [], None, True
+        while more:
+            page, more = history.before(self.conversation.pk, cursor, limit=40)
+            seen[:0] = [message.pk for message in page]
+            cursor = page[0].pk
+        self.assertEqual(seen, self.ids)
+
+    def test_after(self):
+        page, more = history.after(self.conversation.pk, self.ids[99], limit=20)
+        self.assertEqual([message.pk for message in page], self.ids[100:120])
+        self.assertTrue(more)
+        page, more = history.after(self.conversation.pk, self.ids[-3])
+        self.assertEqual(([message.pk for message in page], more), (self.ids[-2:], False))
+
+    def test_pages_load_senders_in_the_same_query(self):
+        with self.assertNumQueries(1):
+            page, _ = history.before(self.conversation.pk)
+            self.assertEqual({message.sender.username for message in page}, {'alice', 'bob'})
+
+
+class UnreadTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = make_user('alice'), make_user('bob'), make_user('carol')
+        self.conversation = make_conversation(self.alice, self.bob, self.carol)
+
+    def cursor(self, user):
+        cursor = ReadCursor.objects.get(conversation=self.conversation, user=user)
+        return cursor.last_read_message_id, cursor.unread_count
+
+    def send(self, sender, body='hi'):
+        return Message.objects.create(conversation=self.conversation, sender=sender, body=body)
+
+    def test_messages_count_for_everyone_but_the_sender(self):
+        self.send(self.bob)
+        second = self.send(self.bob)
+        self.assertEqual(self.cursor(self.alice), (0, 2))
+        self.assertEqual(self.cursor(self.bob), (second.pk, 0))
+        # Replying reads everything before the reply
+        reply = self.send(self.alice)
+        self.assertEqual(self.cursor(self.alice), (reply.pk, 0))
+        self.assertEqual(self.cursor(self.bob), (second.pk, 1))
+        self.assertEqual(unread.unread_total(self.carol), 3)
+
+    def test_batch_split_between_senders_and_others(self):
+        # One write with both senders interleaved, as the websocket writer saves them
+        saved = Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender=sender, body='hi')
+            for sender in (self.alice, self.bob, self.alice, self.bob, self.bob)
+        ])
+        activity.record_new(saved)
+        ids = [message.pk for message in saved]
+        self.assertEqual(self.cursor(self.carol), (0, 5))
+        # Alice has read up to her last message; Bob's two after it are new
+        self.assertEqual(self.cursor(self.alice), (ids[2], 2))
+        self.assertEqual(self.cursor(self.bob), (ids[4], 0))
+
+    def test_mark_read_recounts_and_never_moves_back(self):
+        messages = [self.send(sender) for sender in (self.bob, self.alice, self.bob, self.bob)]
+        unread.mark_read(self.conversation.pk, self.carol.pk, messages[1].pk)
+        # Left: the two from Bob after it
+        self.assertEqual(self.cursor(self.carol), (messages[1].pk, 2))
+        unread.mark_read(self.conversation.pk, self.carol.pk, messages[3].pk)
+        self.assertEqual(self.cursor(self.carol), (messages[3].pk, 0))
+        # A late delivery of an older page must not bring messages back
+        unread.mark_read(self.conversation.pk, self.carol.pk, messages[0].pk)
+        self.assertEqual(self.cursor(self.carol), (messages[3].pk, 0))
+
+    def test_mark_read_skips_the_readers_own_messages(self):
+        # Saved without the bookkeeping, so Carol's cursor is still behind her own messages
+        messages = Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender=sender, body='hi')
+            for sender in (self.bob, self.carol, self.bob, self.carol)
+        ])
+        unread.mark_read(self.conversation.pk, self.carol.pk, messages[0].pk)
+        self.assertEqual(self.cursor(self.carol), (messages[0].pk, 1))
+
+
+class PairKeyMigrationTests(TransactionTestCase):
+    """Migration 0006 keys two-person chats and merges a pair's duplicate chats into the oldest."""
+    before = [('chat', '0005_conversation_activity')]
+    after = [('chat', '0006_conversation_pair_key')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('accounts', 'User')
+        Conversation = apps.get_model('chat', 'Conversation')
+        OldMessage = apps.get_model('chat', 'Message')
+        OldReadCursor = apps.get_model('chat', 'ReadCursor')
+        alice, bob, carol = (User.objects.create(username=name, role='PATIENT') for name in ('alice', 'bob', 'carol'))
+
+        def chat(*people):
+            conversation = Conversation.objects.create()
+            conversation.participants.add(*people)
+            return conversation
+
+        def say(conversation, sender, body):
+            return OldMessage.objects.create(conversation=conversation, sender=sender, body=body).pk
+
+        original, duplicate, pair, group = chat(alice, bob), chat(bob, alice), chat(alice, carol), chat(alice, bob, carol)
+        first, second = say(original, alice, 'first'), say(original, bob, 'second')
+        third, fourth = say(duplicate, alice, 'third'), say(duplicate, bob, 'fourth')
+        for conversation, user, last_read in (
+            (original, alice, first), (original, bob, second), (duplicate, alice, third), (duplicate, bob, fourth),
+        ):
+            OldReadCursor.objects.create(conversation=conversation, user=user, last_read_message_id=last_read)
+
+        apps = self.migrate(self.after)
+        Conversation = apps.get_model('chat', 'Conversation')
+        self.assertFalse(Conversation.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(
+            dict(Conversation.objects.values_list('pk', 'pair_key')),
+            {original.pk: f'{alice.pk}:{bob.pk}', pair.pk: f'{alice.pk}:{carol.pk}', group.pk: None},
+        )
+        merged = Conversation.objects.get(pk=original.pk)
+        self.assertEqual(list(merged.messages.order_by('pk').values_list('pk', flat=True)), [first, second, third, fourth])
+        self.assertEqual(merged.last_message, 'fourth')
+        # Each keeps the furthest they had read in either chat; only Bob's last message is new to Alice
+        cursors = apps.get_model('chat', 'ReadCursor').objects.filter(conversation_id=original.pk)
+        self.assertEqual(
+            set(cursors.values_list('user_id', 'last_read_message_id', 'unread_count')),
+            {(alice.pk, third, 1), (bob.pk, fourth, 0)},
+        )
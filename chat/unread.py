@@ -0,0 +1,63 @@
+# chat/unread.py
+"""
+Read cursors and unread counts.
+
+Every participant has a ReadCursor per conversation: the id of the last
+message they have seen and how many messages from the others came after it.
+Counts are bumped as messages are saved (count_new, called by
+activity.record_new in the same transaction as the insert) and recounted
+when a cursor moves (mark_read), so dashboards and the conversation list
+read one stored number per conversation.
+
+A cursor moves when messages are delivered to its user: the chat page
+showing the latest messages, the JSON endpoint handing out new ones, or the
+websocket pushing them. Sending a message counts as having read everything
+before it.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Message, ReadCursor
+
+
+def count_new(messages):
+    """Updates the read cursors of the conversations `messages` (just saved, with ids) went to."""
+    by_conversation = defaultdict(list)
+    for message in messages:
+        by_conversation[message.conversation_id].append(message)
+
+    for conversation_id, new in by_conversation.items():
+        new.sort(key=lambda message: message.pk)
+        senders = {message.sender_id for message in new}
+        cursors = ReadCursor.objects.filter(conversation_id=conversation_id)
+        # Everyone who didn't write in this batch has all of it to read
+        cursors.exclude(user_id__in=senders).update(unread_count=F('unread_count') + len(new))
+        # Senders have read up to their own last message; only what others wrote after it is new
+        for sender_id in senders:
+            last = max(message.pk for message in new if message.sender_id == sender_id)
+            unread = sum(1 for message in new if message.pk > last and message.sender_id != sender_id)
+            cursors.filter(user_id=sender_id).update(last_read_message_id=last, unread_count=unread)
+
+
+def mark_read(conversation_id, user_id, message_id):
+    """Moves the user's cursor forward to `message_id` (never back) and recounts what is left."""
+    later = (
+        Message.objects.filter(conversation_id=OuterRef('conversation_id'), pk__gt=message_id)
+        .exclude(sender_id=user_id)
+        .order_by()
+        .values('conversation_id')
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    # One statement, so a message saved meanwhile is either counted here or by count_new
+    ReadCursor.objects.filter(
+        conversation_id=conversation_id, user_id=user_id, last_read_message_id__lt=message_id
+    ).update(last_read_message_id=message_id, unread_count=Coalesce(Subquery(later), 0))
+
+
+def unread_total(user):
+    """Unread messages across all of the user's conversations."""
+    return ReadCursor.objects.filter(user=user).aggregate(total=Sum('unread_count'))['total'] or 0
+
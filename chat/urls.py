@@ -4,5 +4,6 @@ from . import views
 urlpatterns = [
     path('start/', views.start_chat_view, name='start_chat'),
     path('<int:conversation_id>/', views.chat_page_view, name='chat_page'),
+    path('<int:conversation_id>/messages/', views.chat_messages_view, name='chat_messages'),
     path('list/', views.chat_list_view, name='chat_list'),
 ]
\ No newline at end of file
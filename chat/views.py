@@ -1,44 +1,53 @@
 # chat/views.py
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.db import transaction
 from django.contrib import messages
-from .models import Conversation, Message
+from django.http import Http404, JsonResponse
+from . import history, unread
+from .models import Conversation, Message, ReadCursor, pair_key
+from .realtime import message_data
 from accounts.models import User
+from hospital import directory
 from hospital.models import Doctor
+from hospital.pagination import paginate
 
 @login_required(login_url='login')
 def start_chat_view(request):
-    # Get all users who are doctors
-    doctors = User.objects.filter(role='DOCTOR')
+    # Approved doctors from the cached directory
+    specialty = request.GET.get('specialty', '')
+    doctors = directory.get_doctors(specialty)
 
     if request.method == 'POST':
-        doctor_id = request.POST.get('doctor_id')
-        doctor_user = get_object_or_404(User, pk=doctor_id)
+        doctor = directory.get_doctor(request.POST.get('doctor_id'))
+        if doctor is None:
+            raise Http404('Doctor not found.')
+        doctor_user = doctor.user
         
-        # Check if a conversation already exists between these two users
-        # Q objects are used for complex lookups (participant A AND participant B)
-        conversation = Conversation.objects.filter(
-            participants=request.user
-        ).filter(
-            participants=doctor_user
-        ).first() # Get the first one if it exists
-
-        if conversation:
-            # If it exists, redirect to the existing chat page (we'll build this next)
-            return redirect('chat_page', conversation_id=conversation.id)
-        else:
-            # If not, create a new conversation
-            new_conversation = Conversation.objects.create()
-            new_conversation.participants.add(request.user, doctor_user)
-            # Redirect to the new chat page
-            return redirect('chat_page', conversation_id=new_conversation.id)
+        # One chat per pair of people: the pair key is unique, so finding it is a single
+        # index lookup and two clicks at once can't create two chats
+        with transaction.atomic():
+            conversation, created = Conversation.objects.get_or_create(
+                pair_key=pair_key(request.user.pk, doctor_user.pk)
+            )
+            if created:
+                conversation.participants.add(request.user, doctor_user)
+        return redirect('chat_page', conversation_id=conversation.id)
 
     context = {
-        'doctors': doctors
+        'doctors': doctors,
+        'specialties': directory.get_specialties(),
+        'selected_specialty': specialty,
     }
     return render(request, 'start_chat.html', context)
 
+def _is_participant(conversation, user):
+    return conversation.participants.filter(pk=user.pk).exists()
+
+def _message_id(value):
+    # A ?before= / ?after= message id, or None if missing or not a number
+    return int(value) if value and value.isdigit() else None
+
 # --- ADD THIS NEW VIEW ---
 @login_required(login_url='login')
 def chat_page_view(request, conversation_id):
@@ -46,12 +55,13 @@ def chat_page_view(request, conversation_id):
     conversation = get_object_or_404(Conversation, id=conversation_id)
     
     # Security check: Ensure the user is a participant
-    if request.user not in conversation.participants.all():
+    if not _is_participant(conversation, request.user):
         messages.error(request, "You are not part of this conversation.")
         return redirect('start_chat') # Or wherever appropriate
 
-    # Get all messages for this conversation
-    messages_list = conversation.messages.all()
+    # Get one page of messages: the latest ones, or older ones with ?before=<message id>
+    before = _message_id(request.GET.get('before'))
+    messages_list, has_older = history.before(conversation.pk, before)
 
     # Handle sending a new message
     if request.method == 'POST':
@@ -67,27 +77,69 @@ def chat_page_view(request, conversation_id):
         else:
             messages.error(request, "Message body cannot be empty.")
 
+    # Showing the latest messages means they have been read
+    if before is None and messages_list:
+        unread.mark_read(conversation.pk, request.user.pk, messages_list[-1].pk)
+
     context = {
         'conversation': conversation,
-        'messages_list': messages_list
+        'messages_list': messages_list,
+        'has_older': has_older,
+        'is_latest': before is None,
     }
     return render(request, 'chat_page.html', context)
 
+@login_required(login_url='login')
+def chat_messages_view(request, conversation_id):
+    """
+    Messages of a conversation as JSON: ?before=<id> for the page of older ones,
+    ?after=<id> for the ones sent since (what polling clients ask for).
+    """
+    conversation = get_object_or_404(Conversation, id=conversation_id)
+    if not _is_participant(conversation, request.user):
+        return JsonResponse({'error': 'You are not part of this conversation.'}, status=403)
+
+    cursors = {key: _message_id(request.GET[key]) for key in ('before', 'after') if key in request.GET}
+    if len(cursors) > 1 or None in cursors.values():
+        return JsonResponse({'error': 'Pass at most one of before and after, as a message id.'}, status=400)
+    if 'after' in cursors:
+        page, has_more = history.after(conversation.pk, cursors['after'])
+        if page:
+            unread.mark_read(conversation.pk, request.user.pk, page[-1].pk)
+    else:
+        page, has_more = history.before(conversation.pk, cursors.get('before'))
+
+    return JsonResponse({
+        'messages': [message_data(message) for message in page],
+        'has_more': has_more,
+    })
+
 @login_required(login_url='login')
 def chat_list_view(request):
-    # Get all conversations where the current user is a participant
-    user_conversations = request.user.conversations.all().order_by('-created_at').prefetch_related('participants') # Optimize participant lookup
+    # Get one page of the current user's conversations, most recently active first.
+    # Their read cursors carry the activity time (and the unread count), and the
+    # (user, last_message_at) index hands them over already in order.
+    cursors = paginate(
+        request,
+        ReadCursor.objects.filter(user=request.user).select_related('conversation')
+        .prefetch_related('conversation__participants'),
+        ('-last_message_at',),
+    )
 
     # Prepare a list to pass to the template, including the other user
+    # (picked from the prefetched participants, so no query per conversation)
     conversation_list = []
-    for conv in user_conversations:
-        other_participant = conv.participants.exclude(id=request.user.id).first()
+    for cursor in cursors:
+        conv = cursor.conversation
+        other_participant = next((user for user in conv.participants.all() if user.pk != request.user.pk), None)
         conversation_list.append({
             'conversation': conv,
-            'other_user': other_participant
+            'other_user': other_participant,
+            'unread': cursor.unread_count,
         })
 
     context = {
-        'conversation_list': conversation_list # Pass the new list
+        'conversation_list': conversation_list, # Pass the new list
+        'conversations': cursors,
     }
     return render(request, 'chat_list.html', context)
\ No newline at end of file
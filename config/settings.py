@@ -66,6 +66,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'pharmacy.context_processors.cart_summary',
             ],
         },
     },
@@ -81,6 +82,21 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Tests use a file rather than SQLite's shared in-memory database, where
+        # concurrent writers fail at once instead of waiting for the lock (see the
+        # concurrent checkout test)
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'healthstack',
     }
 }
 
@@ -119,6 +135,11 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.1/howto/static-files/
 
+# Delivers new chat messages to the open chat websockets (see chat/broadcast.py).
+# The in-memory layer only reaches sockets held by the same process: fine for a
+# single ASGI worker, while several workers need a layer over a shared bus.
+CHAT_BROADCAST_BACKEND = 'chat.broadcast.InMemoryBroadcast'
+
 STATIC_URL = 'static/'
 
 # Default primary key field type
@@ -129,6 +150,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.User'
 
+# Loads the user and their role profile (Doctor, Patient, ...) in one query.
+# ModelBackend stays listed so sessions created before the switch keep working.
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.RoleProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Sessions are read from the cache and written through to the database.
+# Use 'django.contrib.sessions.backends.db' to go back to database-only sessions.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
 STATIC_URL = 'static/'
 
 # --- ADD THESE LINES ---
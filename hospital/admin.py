@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Doctor, Patient, Appointment, Prescription, LabWorker, Pharmacist, Medicine, LabTest, Invoice
+from .models import Doctor, Patient, Appointment, Prescription, LabWorker, Pharmacist, Medicine, MedicineBatch, LabTest, Invoice, WorkingHours
 
 # Register your models here.
 admin.site.register(Doctor)
@@ -8,6 +8,14 @@ admin.site.register(Appointment)
 admin.site.register(Prescription)
 admin.site.register(LabWorker)
 admin.site.register(Pharmacist)
-admin.site.register(Medicine) # <-- ADD THIS LINE
 admin.site.register(LabTest)
-admin.site.register(Invoice)
\ No newline at end of file
+admin.site.register(Invoice)
+admin.site.register(WorkingHours)
+admin.site.register(MedicineBatch)
+
+
+@admin.register(Medicine)
+class MedicineAdmin(admin.ModelAdmin):
+    list_display = ('name', 'manufacturer', 'unit_price', 'stock_quantity')
+    # The sum of the medicine's batches (see hospital/inventory.py); change the batches instead
+    readonly_fields = ('stock_quantity',)
\ No newline at end of file
@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class HospitalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'hospital'
+
+    def ready(self):
+        from . import signals  # connects the signal receivers
+        post_migrate.connect(signals.restore_search_triggers, sender=self)
@@ -0,0 +1,194 @@
+# hospital/availability.py
+"""
+Slot availability for doctors.
+
+Working hours come from WorkingHours (or the defaults below when a doctor has
+none). Booked time is kept in DayOccupancy: one row per doctor per day with a
+bitmap of 5-minute cells, so free slots for a date range are found from a
+single indexed read instead of scanning the Appointment history.
+"""
+import datetime
+import itertools
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Appointment, DayOccupancy, WorkingHours
+
+CELL_MINUTES = 5
+CELLS_PER_DAY = 24 * 60 // CELL_MINUTES
+BITMAP_BYTES = CELLS_PER_DAY // 8
+
+# Used for doctors who have not set up their working hours yet (Mon-Sat)
+DEFAULT_START_TIME = datetime.time(9, 0)
+DEFAULT_END_TIME = datetime.time(17, 0)
+DEFAULT_SLOT_MINUTES = 30
+DEFAULT_WEEKDAYS = range(0, 6)
+
+# Longest date range the free-slot lookup will answer in one call
+MAX_RANGE_DAYS = 31
+
+
+class SlotUnavailable(Exception):
+    """Raised when a requested appointment slot cannot be booked."""
+
+
+def _local_now():
+    return timezone.localtime().replace(tzinfo=None)
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def _cells(start_minute, length):
+    first = start_minute // CELL_MINUTES
+    last = -(-(start_minute + length) // CELL_MINUTES)  # round up
+    return range(first, min(last, CELLS_PER_DAY))
+
+
+def _is_free(bitmap, cells):
+    return not any(bitmap[c >> 3] & (1 << (c & 7)) for c in cells)
+
+
+def get_schedule(doctor_id, working_hours=WorkingHours):
+    """Returns {weekday: [(start_minute, end_minute, slot_minutes), ...]}."""
+    schedule = {}
+    rows = working_hours.objects.filter(doctor_id=doctor_id).values_list(
+        'weekday', 'start_time', 'end_time', 'slot_minutes'
+    )
+    for weekday, start, end, slot_minutes in rows:
+        schedule.setdefault(weekday, []).append((_minutes(start), _minutes(end), slot_minutes))
+
+    if not schedule:
+        default = [(_minutes(DEFAULT_START_TIME), _minutes(DEFAULT_END_TIME), DEFAULT_SLOT_MINUTES)]
+        schedule = {weekday: default for weekday in DEFAULT_WEEKDAYS}
+    return schedule
+
+
+def _slot_length(schedule, day, minute):
+    """Length of the slot starting at `minute` on `day`, or None if it isn't a slot start."""
+    for start, end, slot_minutes in schedule.get(day.weekday(), ()):
+        if start <= minute and minute + slot_minutes <= end and (minute - start) % slot_minutes == 0:
+            return slot_minutes
+    return None
+
+
+def build_bitmap(schedule, day, times):
+    """Builds the occupancy bitmap for `day` from the start times of its active appointments."""
+    bitmap = bytearray(BITMAP_BYTES)
+    for t in times:
+        minute = _minutes(t)
+        length = _slot_length(schedule, day, minute) or CELL_MINUTES
+        for c in _cells(minute, length):
+            bitmap[c >> 3] |= 1 << (c & 7)
+    return bytes(bitmap)
+
+
+def refresh_day(doctor_id, day, schedule=None):
+    """Recomputes the occupancy row for one doctor and day from its appointments."""
+    times = list(
+        Appointment.objects.filter(doctor_id=doctor_id, appointment_date=day)
+        .exclude(status='Cancelled')
+        .values_list('appointment_time', flat=True)
+    )
+    if not times:
+        DayOccupancy.objects.filter(doctor_id=doctor_id, date=day).delete()
+        return
+
+    if schedule is None:
+        schedule = get_schedule(doctor_id)
+    DayOccupancy.objects.update_or_create(
+        doctor_id=doctor_id, date=day,
+        defaults={'bitmap': build_bitmap(schedule, day, times)},
+    )
+
+
+def rebuild(start=None, appointments=Appointment, occupancy=DayOccupancy, working_hours=WorkingHours):
+    """
+    Rebuilds the occupancy rows dated `start` onwards (all of them when start is
+    None) from the active appointments and returns the number of rows written.
+    The migration that creates the table passes its historical models;
+    everything else uses the defaults.
+    """
+    active = appointments.objects.exclude(status='Cancelled')
+    stale = occupancy.objects.all()
+    if start is not None:
+        active = active.filter(appointment_date__gte=start)
+        stale = stale.filter(date__gte=start)
+    # Ordered by doctor and day, so each schedule is loaded once and each day's times arrive together
+    rows = active.order_by('doctor_id', 'appointment_date').values_list(
+        'doctor_id', 'appointment_date', 'appointment_time'
+    ).iterator(chunk_size=2000)
+
+    written, batch = 0, []
+    with transaction.atomic():
+        stale.delete()
+        for doctor_id, doctor_rows in itertools.groupby(rows, key=lambda row: row[0]):
+            schedule = get_schedule(doctor_id, working_hours)
+            for day, day_rows in itertools.groupby(doctor_rows, key=lambda row: row[1]):
+                bitmap = build_bitmap(schedule, day, [t for _, _, t in day_rows])
+                batch.append(occupancy(doctor_id=doctor_id, date=day, bitmap=bitmap))
+                if len(batch) == 2000:
+                    written += len(occupancy.objects.bulk_create(batch))
+                    batch = []
+        written += len(occupancy.objects.bulk_create(batch))
+    return written
+
+
+def free_slots(doctor_id, start_date, end_date, now=None):
+    """
+    Returns {date: [time, ...]} with every bookable slot between start_date and
+    end_date (inclusive). Past slots are never returned.
+    """
+    if now is None:
+        now = _local_now()
+    schedule = get_schedule(doctor_id)
+    occupancy = {
+        day: bytes(bitmap)
+        for day, bitmap in DayOccupancy.objects.filter(
+            doctor_id=doctor_id, date__range=(start_date, end_date)
+        ).values_list('date', 'bitmap')
+    }
+    empty = bytes(BITMAP_BYTES)
+
+    result = {}
+    day = max(start_date, now.date())
+    while day <= end_date:
+        bitmap = occupancy.get(day, empty)
+        earliest = _minutes(now.time()) + 1 if day == now.date() else 0
+        slots = []
+        for start, end, slot_minutes in schedule.get(day.weekday(), ()):
+            for minute in range(start, end - slot_minutes + 1, slot_minutes):
+                if minute >= earliest and _is_free(bitmap, _cells(minute, slot_minutes)):
+                    slots.append(datetime.time(minute // 60, minute % 60))
+        result[day] = sorted(slots)
+        day += datetime.timedelta(days=1)
+    return result
+
+
+def validate_slot(doctor_id, day, time, now=None):
+    """Raises SlotUnavailable unless `time` on `day` is a free slot for the doctor."""
+    if now is None:
+        now = _local_now()
+    if datetime.datetime.combine(day, time) <= now:
+        raise SlotUnavailable('Appointments can only be booked for a future date and time.')
+
+    minute = _minutes(time)
+    length = _slot_length(get_schedule(doctor_id), day, minute)
+    if length is None:
+        raise SlotUnavailable('The selected time is outside the doctor\'s working hours.')
+
+    bitmap = DayOccupancy.objects.filter(doctor_id=doctor_id, date=day).values_list('bitmap', flat=True).first()
+    if bitmap is not None and not _is_free(bytes(bitmap), _cells(minute, length)):
+        raise SlotUnavailable('This time slot is already taken.')
+
+
+def refresh_upcoming(doctor_id):
+    """Recomputes every upcoming occupancy row for a doctor, e.g. after their hours change."""
+    schedule = get_schedule(doctor_id)
+    days = DayOccupancy.objects.filter(
+        doctor_id=doctor_id, date__gte=_local_now().date()
+    ).values_list('date', flat=True)
+    for day in list(days):
+        refresh_day(doctor_id, day, schedule)
@@ -0,0 +1,84 @@
+# hospital/conditional.py
+"""
+Conditional GET (ETag / Last-Modified) for pages that only change with their data.
+
+A view opts in with @conditional_page(probe). The probe runs a cheap query
+(e.g. Max('updated_at') and Count('pk') over the patient's appointments) and
+returns a tuple of values; any datetimes in it also give the Last-Modified
+date. If the browser already has the page for the same values it gets a 304
+without the view running or the template rendering.
+
+Pages that show a doctor next to each row add doctor_details() to their
+state, since renaming a doctor changes the page but none of the rows.
+
+The ETag also covers the user, the full URL (so each page of a list has its
+own), the CSRF cookie (so a page from before a login is never reused) and
+the navbar cart badge. Requests with pending flash messages always render.
+"""
+import datetime
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from pharmacy.cart import get_summary
+
+
+def doctor_details(rows):
+    """The doctor name, specialty and approval behind `rows` (appointments or prescriptions), one tuple per doctor."""
+    return tuple(
+        rows.order_by('doctor_id').distinct().values_list(
+            'doctor_id', 'doctor__user__first_name', 'doctor__user__last_name', 'doctor__specialty', 'doctor__is_approved'
+        )
+    )
+
+
+def _etag(request, state):
+    cart = get_summary(request.user) if request.user.role == 'PATIENT' else None
+    key = repr((
+        request.user.pk,
+        request.get_full_path(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        cart,
+        state,
+    ))
+    return '"%s"' % hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def _last_modified(state):
+    times = [value for value in state if isinstance(value, datetime.datetime)]
+    return int(max(times).timestamp()) if times else None
+
+
+def conditional_page(probe):
+    """
+    Decorator for GET views. `probe(request, *args, **kwargs)` returns a tuple that
+    changes whenever the page would, or None to skip the check (e.g. wrong role).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+                return view(request, *args, **kwargs)
+            state = probe(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+
+            etag = _etag(request, state)
+            last_modified = _last_modified(state)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response.headers.setdefault('ETag', etag)
+            if last_modified is not None:
+                response.headers.setdefault('Last-Modified', http_date(last_modified))
+            # Personal pages: browsers may keep them but must ask before reusing them
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
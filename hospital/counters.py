@@ -0,0 +1,40 @@
+# hospital/counters.py
+"""Per-doctor appointment counters, cached and dropped whenever an appointment changes."""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Appointment
+
+COUNTS_TIMEOUT = 60 * 60
+
+
+def _counts_key(doctor_id, day):
+    # The date is part of the key because the counts only cover upcoming days
+    return f'hospital:doctor:{doctor_id}:appointment-counts:{day.isoformat()}'
+
+
+def doctor_appointment_counts(doctor_id):
+    """Returns {status: count} for the doctor's appointments from today onwards."""
+    today = timezone.localdate()
+    key = _counts_key(doctor_id, today)
+    counts = cache.get(key)
+    if counts is None:
+        rows = (
+            Appointment.objects.filter(doctor_id=doctor_id, appointment_date__gte=today)
+            .values('status')
+            .annotate(count=Count('pk'))
+            .order_by()
+        )
+        counts = {status: 0 for status, _ in Appointment.STATUS_CHOICES}
+        counts.update({row['status']: row['count'] for row in rows})
+        cache.set(key, counts, COUNTS_TIMEOUT)
+    return counts
+
+
+def invalidate_doctor_counts(doctor_id):
+    key = _counts_key(doctor_id, timezone.localdate())
+    # Drop it again after commit so a read in between can't cache stale numbers
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,73 @@
+# hospital/directory.py
+"""
+Cached directory of approved doctors.
+
+The whole directory (Doctor rows joined with their User) is read in one query
+and cached under a versioned key. Saving or deleting a Doctor or a doctor's
+User bumps the version, so the next read rebuilds it and stale copies are
+simply never asked for again.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Doctor
+
+DIRECTORY_TIMEOUT = 60 * 60
+_VERSION_KEY = 'hospital:doctor-directory:version'
+
+
+def _version():
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        # Start from the clock so a lost version key never reuses an old number
+        cache.add(_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(_VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Marks every cached copy of the directory as stale."""
+    def bump():
+        try:
+            cache.incr(_VERSION_KEY)
+        except ValueError:
+            cache.set(_VERSION_KEY, time.time_ns(), None)
+    bump()
+    # Bump again after commit so a read in between can't cache stale rows
+    transaction.on_commit(bump)
+
+
+def _load():
+    key = f'hospital:doctor-directory:{_version()}'
+    doctors = cache.get(key)
+    if doctors is None:
+        doctors = list(
+            Doctor.objects.filter(is_approved=True, user__is_active=True)
+            .select_related('user')
+            .order_by('user__last_name', 'user__first_name', 'pk')
+        )
+        cache.set(key, doctors, DIRECTORY_TIMEOUT)
+    return doctors
+
+
+def get_doctors(specialty=None):
+    """Approved doctors, sorted by last and first name, optionally for one specialty."""
+    doctors = _load()
+    if specialty:
+        doctors = [d for d in doctors if d.specialty == specialty]
+    return doctors
+
+
+def get_doctor(pk):
+    """The approved doctor whose user id is `pk`, or None."""
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    return next((d for d in _load() if d.pk == pk), None)
+
+
+def get_specialties():
+    return sorted({d.specialty for d in _load() if d.specialty})
@@ -0,0 +1,139 @@
+# hospital/exports.py
+"""
+Streaming data exports (CSV and NDJSON).
+
+Each dataset is a flat `values_list` over its joined columns, read with
+`iterator(chunk_size=...)` and written out one row at a time, so memory use
+stays the same whether the export has a hundred rows or a few million.
+"""
+import csv
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from pharmacy.models import Order, OrderItem
+from .models import Appointment, Invoice, Prescription
+
+CHUNK_SIZE = 2000
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+class Dataset:
+    def __init__(self, model, date_field, columns, timestamped=False):
+        self.model = model
+        self.date_field = date_field
+        # (header, lookup path) pairs
+        self.columns = columns
+        # date_field is a DateTimeField: filter on a range of local days rather than
+        # __date, which would convert every row's value and skip the index
+        self.timestamped = timestamped
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def rows(self, start_date=None, end_date=None):
+        """Yields one tuple per row, in primary-key order."""
+        queryset = self.model.objects.all()
+        if self.timestamped:
+            if start_date:
+                queryset = queryset.filter(**{f'{self.date_field}__gte': _start_of_day(start_date)})
+            if end_date:
+                end = _start_of_day(end_date + datetime.timedelta(days=1))
+                queryset = queryset.filter(**{f'{self.date_field}__lt': end})
+        else:
+            if start_date:
+                queryset = queryset.filter(**{f'{self.date_field}__gte': start_date})
+            if end_date:
+                queryset = queryset.filter(**{f'{self.date_field}__lte': end_date})
+        paths = [path for _, path in self.columns]
+        return queryset.order_by('pk').values_list(*paths).iterator(chunk_size=CHUNK_SIZE)
+
+
+DATASETS = {
+    'invoices': Dataset(Invoice, 'issue_date', [
+        ('id', 'id'),
+        ('issue_date', 'issue_date'),
+        ('due_date', 'due_date'),
+        ('status', 'status'),
+        ('total_amount', 'total_amount'),
+        ('patient_username', 'patient__user__username'),
+        ('patient_first_name', 'patient__user__first_name'),
+        ('patient_last_name', 'patient__user__last_name'),
+        ('notes', 'notes'),
+    ]),
+    'appointments': Dataset(Appointment, 'appointment_date', [
+        ('id', 'id'),
+        ('appointment_date', 'appointment_date'),
+        ('appointment_time', 'appointment_time'),
+        ('status', 'status'),
+        ('doctor_username', 'doctor__user__username'),
+        ('doctor_specialty', 'doctor__specialty'),
+        ('patient_username', 'patient__user__username'),
+        ('reason', 'reason'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+    'prescriptions': Dataset(Prescription, 'date_prescribed', [
+        ('id', 'id'),
+        ('date_prescribed', 'date_prescribed'),
+        ('doctor_username', 'doctor__user__username'),
+        ('patient_username', 'patient__user__username'),
+        ('appointment_id', 'appointment_id'),
+        ('prescription_text', 'prescription_text'),
+    ]),
+    'orders': Dataset(Order, 'created_at', [
+        ('id', 'id'),
+        ('created_at', 'created_at'),
+        ('status', 'status'),
+        ('total_price', 'total_price'),
+        ('username', 'user__username'),
+        ('shipping_address', 'shipping_address'),
+    ], timestamped=True),
+    'order_items': Dataset(OrderItem, 'order__created_at', [
+        ('id', 'id'),
+        ('order_id', 'order_id'),
+        ('order_created_at', 'order__created_at'),
+        ('product_id', 'product_id'),
+        ('product_name', 'product__name'),
+        ('quantity', 'quantity'),
+        ('price', 'price'),
+    ], timestamped=True),
+}
+
+
+class _Echo:
+    """File-like object for csv.writer that hands back each line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(dataset, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(dataset.headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(dataset, rows):
+    headers = dataset.headers
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def stream(dataset, export_format, start_date=None, end_date=None):
+    """Returns an iterator of text chunks for `dataset` in `export_format` ('csv' or 'ndjson')."""
+    rows = dataset.rows(start_date, end_date)
+    if export_format == 'ndjson':
+        return stream_ndjson(dataset, rows)
+    return stream_csv(dataset, rows)
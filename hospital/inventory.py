@@ -0,0 +1,114 @@
+# hospital/inventory.py
+"""
+Medicine stock by batch.
+
+Stock arrives as batches (receive_batch) and is handed out first-expiry-
+first-out (allocate): the batches of one medicine are walked in expiry order
+along the (medicine, expiry_date) index, skipping expired ones. Medicine.
+stock_quantity is kept equal to the sum of its batches by sync_stock, which
+is one UPDATE with a SUM subquery.
+
+Near-expiry stock across the whole catalog is one range scan over the
+partial index on batches that still hold stock. The refresh_expiry_alerts
+command runs it daily and stores the result in ExpiryAlert for the
+pharmacist dashboard.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ExpiryAlert, Medicine, MedicineBatch
+
+EXPIRY_WARNING_DAYS = 30
+
+
+class InsufficientStock(Exception):
+    def __init__(self, medicine, requested, available):
+        self.medicine = medicine
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Only {available} unexpired units of {medicine.name} in stock; {requested} requested.")
+
+
+def sync_stock(medicine_ids):
+    """Sets stock_quantity to the sum of the batches for the given medicines."""
+    batch_total = (
+        MedicineBatch.objects.filter(medicine=OuterRef('pk'))
+        .values('medicine')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    Medicine.objects.filter(pk__in=medicine_ids).update(stock_quantity=Coalesce(Subquery(batch_total), 0))
+
+
+def receive_batch(medicine, batch_number, quantity, expiry_date=None):
+    """Adds a delivery to the medicine's stock; a repeated batch number tops up that batch."""
+    with transaction.atomic():
+        batches = MedicineBatch.objects.filter(medicine=medicine, batch_number=batch_number)
+        if not batches.update(quantity=F('quantity') + quantity):
+            MedicineBatch.objects.create(
+                medicine=medicine, batch_number=batch_number, quantity=quantity, expiry_date=expiry_date
+            )
+        sync_stock([medicine.pk])
+
+
+def allocate(medicine, quantity, today=None):
+    """
+    Takes `quantity` units of `medicine`, earliest expiry first, and returns a list of
+    (batch, units taken). Expired batches are never used. Raises InsufficientStock.
+    """
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        # Write first: on SQLite this takes the write lock before the batches are read
+        Medicine.objects.filter(pk=medicine.pk).update(stock_quantity=F('stock_quantity'))
+        batches = list(
+            MedicineBatch.objects.select_for_update()
+            .filter(medicine=medicine, quantity__gt=0)
+            .exclude(expiry_date__lt=today)
+            .order_by(F('expiry_date').asc(nulls_last=True), 'pk')
+        )
+        available = sum(batch.quantity for batch in batches)
+        if available < quantity:
+            raise InsufficientStock(medicine, quantity, available)
+
+        taken, remaining = [], quantity
+        for batch in batches:
+            if not remaining:
+                break
+            units = min(batch.quantity, remaining)
+            batch.quantity -= units
+            remaining -= units
+            taken.append((batch, units))
+        MedicineBatch.objects.bulk_update([batch for batch, _ in taken], ['quantity'])
+        sync_stock([medicine.pk])
+    return taken
+
+
+def near_expiry(days=EXPIRY_WARNING_DAYS, today=None):
+    """Batches with stock left that expire within `days` (or already have), soonest first."""
+    today = today or timezone.localdate()
+    return (
+        MedicineBatch.objects.filter(quantity__gt=0, expiry_date__lte=today + datetime.timedelta(days=days))
+        .select_related('medicine')
+        .order_by('expiry_date', 'pk')
+    )
+
+
+def refresh_expiry_alerts(days=EXPIRY_WARNING_DAYS, today=None):
+    """Replaces the ExpiryAlert table with the current near-expiry batches. Returns the alert count."""
+    today = today or timezone.localdate()
+    alerts = [
+        ExpiryAlert(
+            batch=batch, medicine=batch.medicine, batch_number=batch.batch_number,
+            expiry_date=batch.expiry_date, quantity=batch.quantity,
+            level='Expired' if batch.expiry_date < today else 'Expiring',
+        )
+        for batch in near_expiry(days, today).iterator(chunk_size=2000)
+    ]
+    with transaction.atomic():
+        ExpiryAlert.objects.all().delete()
+        ExpiryAlert.objects.bulk_create(alerts, batch_size=1000)
+    return len(alerts)
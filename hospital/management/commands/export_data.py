@@ -0,0 +1,34 @@
+import datetime
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital import exports
+
+
+class Command(BaseCommand):
+    help = 'Streams invoices, appointments, prescriptions, orders or order items as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exports.DATASETS))
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--start-date', type=datetime.date.fromisoformat, help='YYYY-MM-DD, inclusive.')
+        parser.add_argument('--end-date', type=datetime.date.fromisoformat, help='YYYY-MM-DD, inclusive.')
+        parser.add_argument('--output', '-o', help='File to write to (default: stdout).')
+
+    def handle(self, *args, **options):
+        chunks = exports.stream(
+            exports.DATASETS[options['dataset']], options['format'],
+            options['start_date'], options['end_date'],
+        )
+        try:
+            out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        except OSError as e:
+            raise CommandError(f'Cannot open output file: {e}')
+
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,46 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital import price_lists
+
+
+class Command(BaseCommand):
+    help = 'Inserts and updates medicines, lab tests or shop products from a supplier CSV price list, matched by name.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(price_lists.KINDS))
+        parser.add_argument('path', help='CSV file with a header row; see hospital/price_lists.py for the columns.')
+        parser.add_argument('--dry-run', action='store_true', help='Compare only; change nothing.')
+        parser.add_argument('--batch-size', type=int, default=price_lists.BATCH_SIZE)
+        parser.add_argument('--report', help='Write the rejected rows to this CSV file.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        started = time.monotonic()
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                result = price_lists.import_price_list(
+                    options['kind'], f, dry_run=options['dry_run'], batch_size=options['batch_size']
+                )
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+        except (ValueError, csv.Error) as e:
+            raise CommandError(f'Cannot parse {path}: {e}')
+        elapsed = time.monotonic() - started
+
+        for error in result.errors:
+            self.stderr.write(str(error))
+        if options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['row', 'name', 'errors'])
+                for error in result.errors:
+                    writer.writerow([error.row, error.name, '; '.join(error.errors)])
+
+        prefix = 'Dry run: ' if result.dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{result.inserted} inserted, {result.updated} updated, {result.unchanged} unchanged '
+            f'in {elapsed:.1f}s; {result.error_count} rows rejected.'
+        ))
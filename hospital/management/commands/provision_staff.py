@@ -0,0 +1,48 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital import provisioning
+
+
+class Command(BaseCommand):
+    help = 'Creates doctor, lab worker and pharmacist accounts in bulk from a CSV or JSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or JSON file of staff rows.')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Defaults to the file extension.')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; create nothing.')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default: CPU count).')
+        parser.add_argument('--report', help='Write the per-row errors to this CSV file.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('json' if path.lower().endswith('.json') else 'csv')
+        try:
+            with open(path, encoding='utf-8-sig') as f:
+                rows = provisioning.read_rows(f, file_format)
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+        except ValueError as e:
+            raise CommandError(f'Cannot parse {path}: {e}')
+
+        started = time.monotonic()
+        result = provisioning.provision(rows, dry_run=options['dry_run'], workers=options['workers'])
+        elapsed = time.monotonic() - started
+
+        for error in result.errors:
+            self.stderr.write(str(error))
+        if options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['row', 'username', 'errors'])
+                for error in result.errors:
+                    writer.writerow([error.row, error.username, '; '.join(error.errors)])
+
+        counts = ', '.join(f'{count} {role.lower()}' for role, count in result.created.items())
+        verb = 'Would create' if result.dry_run else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.total_created} accounts ({counts}) in {elapsed:.1f}s; '
+            f'{len(result.errors)} rows rejected.'
+        ))
@@ -0,0 +1,37 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from hospital import rollup
+from hospital.models import Appointment, AppointmentDailyStat
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily appointment statistics rollup from the Appointment table, a date range at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-days', type=int, default=30, help='Number of days rebuilt per transaction.')
+
+    def handle(self, *args, **options):
+        chunk = datetime.timedelta(days=options['chunk_days'])
+        bounds = Appointment.objects.aggregate(first=Min('appointment_date'), last=Max('appointment_date'))
+        if bounds['first'] is None:
+            AppointmentDailyStat.objects.all().delete()
+            self.stdout.write('No appointments found; rollup cleared.')
+            return
+
+        # Rows outside the appointment range can only be stale
+        AppointmentDailyStat.objects.exclude(date__range=(bounds['first'], bounds['last'])).delete()
+
+        rows = 0
+        start = bounds['first']
+        while start <= bounds['last']:
+            end = min(start + chunk - datetime.timedelta(days=1), bounds['last'])
+            created = rollup.rebuild(start, end)
+            rows += created
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{start} to {end}: {created} rows')
+            start = end + datetime.timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt appointment stats: {rows} rows.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from hospital import availability
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-doctor, per-day slot occupancy index from the Appointment table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Include past days, not just upcoming ones.')
+
+    def handle(self, *args, **options):
+        start = None if options['all'] else timezone.localdate()
+        count = availability.rebuild(start)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt occupancy for {count} doctor-days.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from hospital import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds and optimizes the full-text search index over prescriptions (SQLite FTS5).'
+
+    def handle(self, *args, **options):
+        if search.rebuild_index():
+            self.stdout.write(self.style.SUCCESS('Prescription search index rebuilt.'))
+        else:
+            self.stdout.write(self.style.WARNING('Full-text search needs SQLite; nothing to rebuild.'))
@@ -0,0 +1,20 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from hospital import inventory
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the expiry alerts shown on the pharmacist dashboard. Meant to run once a day.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=inventory.EXPIRY_WARNING_DAYS,
+            help='Warn about batches expiring within this many days.',
+        )
+        parser.add_argument('--date', type=datetime.date.fromisoformat, help='Pretend today is YYYY-MM-DD.')
+
+    def handle(self, *args, **options):
+        count = inventory.refresh_expiry_alerts(options['days'], options['date'])
+        self.stdout.write(self.style.SUCCESS(f'{count} batches expired or expiring within {options["days"]} days.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from hospital import reorder
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the reorder worklist from medicine and shop stock levels. Meant to run every hour or so.'
+
+    def handle(self, *args, **options):
+        active, cleared = reorder.refresh_alerts()
+        self.stdout.write(self.style.SUCCESS(f'{active} items need reordering; {cleared} alerts cleared.'))
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+from hospital import availability
+
+
+def fill_upcoming_occupancy(apps, schema_editor):
+    # Bookings made before the index existed must still block their slots;
+    # past days are left to `rebuild_occupancy --all`
+    availability.rebuild(
+        timezone.localdate(),
+        apps.get_model('hospital', 'Appointment'),
+        apps.get_model('hospital', 'DayOccupancy'),
+        apps.get_model('hospital', 'WorkingHours'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0009_invoice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bitmap', models.BinaryField()),
+            ],
+            options={
+                'verbose_name_plural': 'Day occupancy',
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30)),
+            ],
+            options={
+                'verbose_name_plural': 'Working hours',
+                'ordering': ['doctor', 'weekday', 'start_time'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='appointment',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'appointment_date'], name='appt_doctor_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'Cancelled'), _negated=True), fields=('doctor', 'appointment_date', 'appointment_time'), name='unique_active_appointment_slot'),
+        ),
+        migrations.AddField(
+            model_name='workinghours',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='hospital.doctor'),
+        ),
+        migrations.AddField(
+            model_name='dayoccupancy',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='hospital.doctor'),
+        ),
+        migrations.AddConstraint(
+            model_name='dayoccupancy',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date'), name='unique_doctor_day_occupancy'),
+        ),
+        migrations.RunPython(fill_upcoming_occupancy, migrations.RunPython.noop),
+    ]
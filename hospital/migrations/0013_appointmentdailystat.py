@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from hospital import rollup
+
+
+def fill_daily_stats(apps, schema_editor):
+    # Count the appointments that already exist; the signals only see new changes
+    Appointment = apps.get_model('hospital', 'Appointment')
+    AppointmentDailyStat = apps.get_model('hospital', 'AppointmentDailyStat')
+    bounds = Appointment.objects.aggregate(first=models.Min('appointment_date'), last=models.Max('appointment_date'))
+    if bounds['first'] is not None:
+        rollup.rebuild(bounds['first'], bounds['last'], Appointment, AppointmentDailyStat)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0012_list_view_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Approved', 'Approved'), ('Cancelled', 'Cancelled')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='hospital.doctor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['doctor', 'date'], name='appt_stat_doctor_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='appointmentdailystat',
+            constraint=models.UniqueConstraint(fields=('date', 'doctor', 'status'), name='unique_appointment_daily_stat'),
+        ),
+        migrations.RunPython(fill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+# FTS5 index over Prescription.prescription_text. It is an external-content
+# table (the text lives only in hospital_prescription) kept in sync by triggers,
+# so inserts, updates and deletes from anywhere - ORM, admin, bulk queries -
+# reach the index. Only created on SQLite; other backends fall back to LIKE.
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS hospital_prescription_fts USING fts5(
+        prescription_text,
+        content='hospital_prescription',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hospital_prescription_fts_ai AFTER INSERT ON hospital_prescription BEGIN
+        INSERT INTO hospital_prescription_fts(rowid, prescription_text) VALUES (new.id, new.prescription_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hospital_prescription_fts_ad AFTER DELETE ON hospital_prescription BEGIN
+        INSERT INTO hospital_prescription_fts(hospital_prescription_fts, rowid, prescription_text)
+        VALUES ('delete', old.id, old.prescription_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hospital_prescription_fts_au AFTER UPDATE OF prescription_text ON hospital_prescription BEGIN
+        INSERT INTO hospital_prescription_fts(hospital_prescription_fts, rowid, prescription_text)
+        VALUES ('delete', old.id, old.prescription_text);
+        INSERT INTO hospital_prescription_fts(rowid, prescription_text) VALUES (new.id, new.prescription_text);
+    END
+    """,
+    # Index the prescriptions that already exist
+    "INSERT INTO hospital_prescription_fts(hospital_prescription_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS hospital_prescription_fts_au',
+    'DROP TRIGGER IF EXISTS hospital_prescription_fts_ad',
+    'DROP TRIGGER IF EXISTS hospital_prescription_fts_ai',
+    'DROP TABLE IF EXISTS hospital_prescription_fts',
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0013_appointmentdailystat'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+import unicodedata
+
+BATCH_SIZE = 1000
+
+
+def _normalise(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def index_existing_patients(apps, schema_editor):
+    # Same terms as hospital.patient_search.terms_for, frozen for this migration
+    Patient = apps.get_model('hospital', 'Patient')
+    PatientSearchTerm = apps.get_model('hospital', 'PatientSearchTerm')
+    batch = []
+    for patient in Patient.objects.select_related('user').order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        user = patient.user
+        phone = re.sub(r'\D', '', patient.phone_number or '')
+        terms = {
+            _normalise(user.username),
+            _normalise(user.first_name),
+            _normalise(user.last_name),
+            _normalise(f'{user.first_name} {user.last_name}'),
+            phone,
+            phone[-10:],
+        }
+        terms.discard('')
+        batch.extend(PatientSearchTerm(patient=patient, term=term) for term in terms)
+        if len(batch) >= BATCH_SIZE:
+            PatientSearchTerm.objects.bulk_create(batch)
+            batch = []
+    PatientSearchTerm.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0014_prescription_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=300)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='hospital.patient')),
+            ],
+        ),
+        migrations.RunPython(index_existing_patients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_batches_for_existing_stock(apps, schema_editor):
+    # Stock from before batches were tracked becomes one batch with no known expiry
+    Medicine = apps.get_model('hospital', 'Medicine')
+    MedicineBatch = apps.get_model('hospital', 'MedicineBatch')
+    MedicineBatch.objects.bulk_create(
+        [
+            MedicineBatch(medicine_id=pk, batch_number='OPENING', quantity=quantity)
+            for pk, quantity in Medicine.objects.filter(stock_quantity__gt=0).values_list('pk', 'stock_quantity')
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0016_prescription_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicineBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_number', models.CharField(max_length=50)),
+                ('expiry_date', models.DateField(blank=True, null=True)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='hospital.medicine')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExpiryAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_number', models.CharField(max_length=50)),
+                ('expiry_date', models.DateField()),
+                ('quantity', models.PositiveIntegerField()),
+                ('level', models.CharField(choices=[('Expired', 'Expired'), ('Expiring', 'Expiring')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('batch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='expiry_alert', to='hospital.medicinebatch')),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expiry_alerts', to='hospital.medicine')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='medicinebatch',
+            index=models.Index(fields=['medicine', 'expiry_date'], name='batch_medicine_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicinebatch',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['expiry_date'], name='batch_in_stock_expiry_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='medicinebatch',
+            constraint=models.UniqueConstraint(fields=('medicine', 'batch_number'), name='unique_medicine_batch'),
+        ),
+        migrations.AddIndex(
+            model_name='expiryalert',
+            index=models.Index(fields=['expiry_date'], name='expiry_alert_date_idx'),
+        ),
+        migrations.RunPython(open_batches_for_existing_stock, migrations.RunPython.noop),
+    ]
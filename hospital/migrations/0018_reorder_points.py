@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital', '0017_medicinebatch_expiryalert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicine',
+            name='reorder_point',
+            field=models.PositiveIntegerField(default=10),
+        ),
+        migrations.AddField(
+            model_name='medicine',
+            name='reorder_quantity',
+            field=models.PositiveIntegerField(default=50),
+        ),
+        migrations.CreateModel(
+            name='ReorderAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_type', models.CharField(choices=[('medicine', 'Medicine'), ('product', 'Shop product')], max_length=10)),
+                ('item_id', models.PositiveIntegerField()),
+                ('name', models.CharField(max_length=200)),
+                ('on_hand', models.IntegerField()),
+                ('reorder_point', models.PositiveIntegerField()),
+                ('suggested_quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('Open', 'Open'), ('Ordered', 'Ordered')], default='Open', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['on_hand'], name='reorder_alert_on_hand_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reorderalert',
+            constraint=models.UniqueConstraint(fields=('item_type', 'item_id'), name='unique_reorder_alert_item'),
+        ),
+    ]
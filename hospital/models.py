@@ -29,6 +29,16 @@ class Patient(models.Model):
     def __str__(self):
         return f"Patient: {self.user.first_name} {self.user.last_name} ({self.user.username})"
     
+class PatientSearchTerm(models.Model):
+    # Normalised (lower-case, accent-free) prefixes to look a patient up by:
+    # username, first name, last name, full name and phone digits.
+    # Maintained by hospital/patient_search.py from the Patient and User signals.
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=300, db_index=True)
+
+    def __str__(self):
+        return f"{self.term} -> {self.patient_id}"
+
 # ... (keep your User, Doctor, and Patient models) ...
 
 # --- ADD THIS NEW MODEL ---
@@ -58,8 +68,82 @@ class Appointment(models.Model):
         return f"Appointment for {self.patient.user.username} with {self.doctor.user.username} on {self.appointment_date}"
 
     class Meta:
-        # This ensures a doctor can't be double-booked at the exact same date and time
-        unique_together = ('doctor', 'appointment_date', 'appointment_time')
+        constraints = [
+            # A doctor can't be double-booked at the exact same date and time.
+            # Cancelled appointments give their slot back, so they are left out.
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=~models.Q(status='Cancelled'),
+                name='unique_active_appointment_slot',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'appointment_date'], name='appt_doctor_date_idx'),
+            # Serves the doctor dashboard queues (per status, upcoming, in date order)
+            models.Index(fields=['doctor', 'status', 'appointment_date', 'appointment_time'], name='appt_doctor_status_date_idx'),
+            models.Index(fields=['patient', 'appointment_date', 'appointment_time'], name='appt_patient_date_idx'),
+        ]
+
+# --- Appointment statistics ---
+class AppointmentDailyStat(models.Model):
+    # Rollup of appointment counts per day, doctor and status.
+    # Maintained from the Appointment signals, rebuilt by `rebuild_appointment_stats`.
+    date = models.DateField()
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='daily_stats')
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.doctor.user.username} {self.status}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'doctor', 'status'], name='unique_appointment_daily_stat'),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'date'], name='appt_stat_doctor_date_idx'),
+        ]
+
+# --- Doctor availability ---
+class WorkingHours(models.Model):
+    WEEKDAY_CHOICES = (
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    )
+
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='working_hours')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+
+    def __str__(self):
+        return f"{self.doctor.user.username}: {self.get_weekday_display()} {self.start_time}-{self.end_time} ({self.slot_minutes} min)"
+
+    class Meta:
+        verbose_name_plural = "Working hours"
+        ordering = ['doctor', 'weekday', 'start_time']
+
+class DayOccupancy(models.Model):
+    # Precomputed index of booked time for one doctor on one day.
+    # One bit per 5-minute cell of the day, see hospital/availability.py.
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='occupancy')
+    date = models.DateField()
+    bitmap = models.BinaryField()
+
+    def __str__(self):
+        return f"Occupancy for {self.doctor.user.username} on {self.date}"
+
+    class Meta:
+        verbose_name_plural = "Day occupancy"
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='unique_doctor_day_occupancy'),
+        ]
 
 # --- ADD THIS NEW MODEL ---
 class Prescription(models.Model):
@@ -74,10 +158,17 @@ class Prescription(models.Model):
     # --- Prescription Details ---
     prescription_text = models.TextField(help_text="e.g., Paracetamol 500mg - 1 tablet 3 times a day for 5 days")
     date_prescribed = models.DateField(auto_now_add=True)
+    # Lets the patient's prescription page answer "not modified" cheaply
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Prescription for {self.patient.user.username} from {self.doctor.user.username} on {self.date_prescribed}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'date_prescribed'], name='prescription_patient_date_idx'),
+        ]
+
 # --- ADD THIS NEW MODEL ---
 class LabWorker(models.Model):
     # Link to the User account
@@ -105,11 +196,99 @@ class Medicine(models.Model):
     description = models.TextField(blank=True)
     manufacturer = models.CharField(max_length=100, blank=True)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, help_text="Price per unit (e.g., tablet, bottle)")
+    # Total of the batch quantities below, kept in sync by hospital/inventory.py
     stock_quantity = models.PositiveIntegerField(default=0)
+    # Reorder when stock falls to reorder_point; order at least reorder_quantity
+    reorder_point = models.PositiveIntegerField(default=10)
+    reorder_quantity = models.PositiveIntegerField(default=50)
 
     def __str__(self):
         return f"{self.name} ({self.manufacturer})"
 
+class MedicineBatch(models.Model):
+    # One delivered lot of a medicine. Stock is handed out first-expiry-first-out
+    # across batches (see hospital/inventory.py); batches without a known expiry
+    # date (e.g. stock that existed before batches were tracked) go last.
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='batches')
+    batch_number = models.CharField(max_length=50)
+    expiry_date = models.DateField(null=True, blank=True)
+    quantity = models.PositiveIntegerField(default=0)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.medicine.name} batch {self.batch_number} (expires {self.expiry_date or 'n/a'})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['medicine', 'batch_number'], name='unique_medicine_batch'),
+        ]
+        indexes = [
+            # FEFO allocation walks one medicine's batches by expiry
+            models.Index(fields=['medicine', 'expiry_date'], name='batch_medicine_expiry_idx'),
+            # Near-expiry report: one range scan over batches that still hold stock
+            models.Index(fields=['expiry_date'], name='batch_in_stock_expiry_idx', condition=models.Q(quantity__gt=0)),
+        ]
+
+class ExpiryAlert(models.Model):
+    # Materialised by the refresh_expiry_alerts command so the pharmacist
+    # dashboard reads a short table instead of scanning every batch.
+    LEVEL_CHOICES = (
+        ('Expired', 'Expired'),
+        ('Expiring', 'Expiring'),
+    )
+
+    batch = models.OneToOneField(MedicineBatch, on_delete=models.CASCADE, related_name='expiry_alert')
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='expiry_alerts')
+    batch_number = models.CharField(max_length=50)
+    expiry_date = models.DateField()
+    quantity = models.PositiveIntegerField()
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.level}: {self.medicine_id} batch {self.batch_number} on {self.expiry_date}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expiry_date'], name='expiry_alert_date_idx'),
+        ]
+
+class ReorderAlert(models.Model):
+    # The pharmacist's reorder worklist: one row per medicine or shop product that
+    # is at or below its reorder point. Written by the refresh_reorder_alerts
+    # command, which updates rows in place and deletes them once stock recovers.
+    ITEM_TYPES = (
+        ('medicine', 'Medicine'),
+        ('product', 'Shop product'),
+    )
+    STATUS_CHOICES = (
+        ('Open', 'Open'),
+        ('Ordered', 'Ordered'),
+    )
+
+    item_type = models.CharField(max_length=10, choices=ITEM_TYPES)
+    item_id = models.PositiveIntegerField()
+    name = models.CharField(max_length=200)
+    on_hand = models.IntegerField()
+    reorder_point = models.PositiveIntegerField()
+    # How many to order: enough to get back above the reorder point, and at least the reorder quantity
+    suggested_quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Reorder {self.name}: {self.on_hand} on hand (point {self.reorder_point})"
+
+    class Meta:
+        constraints = [
+            # One alert per item, however often the job runs
+            models.UniqueConstraint(fields=['item_type', 'item_id'], name='unique_reorder_alert_item'),
+        ]
+        indexes = [
+            models.Index(fields=['on_hand'], name='reorder_alert_on_hand_idx'),
+        ]
+
 # --- ADD LAB TEST MODEL ---
 class LabTest(models.Model):
     name = models.CharField(max_length=200, unique=True)
@@ -143,4 +322,7 @@ class Invoice(models.Model):
         return f"Invoice #{self.id} for {self.patient.user.username} - Amount: ${self.total_amount}"
 
     class Meta:
-        ordering = ['-issue_date'] # Show newest invoices first
\ No newline at end of file
+        ordering = ['-issue_date'] # Show newest invoices first
+        indexes = [
+            models.Index(fields=['issue_date'], name='invoice_issue_date_idx'),
+        ]
\ No newline at end of file
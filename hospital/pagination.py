@@ -0,0 +1,198 @@
+# hospital/pagination.py
+"""
+Keyset (cursor) pagination shared by the list views.
+
+Instead of OFFSET, each page remembers the ordering values of its first and
+last row in an opaque cursor and the next page filters on "rows after these
+values". With an index on the ordering columns, page N costs the same as page 1.
+"""
+import base64
+import bisect
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+DEFAULT_PER_PAGE = 20
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder cuts datetimes to milliseconds; cursors need the exact value
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPage:
+    """One page of results plus the query strings that lead to its neighbours."""
+
+    def __init__(self, items, has_next, has_previous, next_query='', previous_query=''):
+        self.items = items
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_query = next_query
+        self.previous_query = previous_query
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (values, direction), or (None, None) for a missing or tampered cursor."""
+    if not cursor:
+        return None, None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data['d'] not in ('next', 'prev') or not isinstance(data['v'], list):
+            return None, None
+        return data['v'], data['d']
+    except (ValueError, KeyError, TypeError):
+        return None, None
+
+
+def _normalise(ordering):
+    fields = [f for f in ordering if f.lstrip('-') != 'pk']
+    # pk breaks ties so that every row has a unique position
+    last_desc = ordering[-1].startswith('-') if ordering else False
+    fields.append('-pk' if last_desc else 'pk')
+    return [(f.lstrip('-'), f.startswith('-')) for f in fields]
+
+
+def _after(fields, values, reverse=False):
+    """Builds the filter for rows that sort strictly after `values`."""
+    condition = Q()
+    for i, (name, descending) in enumerate(fields):
+        lookup = 'lt' if descending != reverse else 'gt'
+        clause = Q(**{f'{name}__{lookup}': values[i]})
+        for j in range(i):
+            clause &= Q(**{fields[j][0]: values[j]})
+        condition |= clause
+    # The OR chain is only checked row by row; the same bound on the first column
+    # alone is one the index can seek to, so deep pages start at the cursor
+    name, descending = fields[0]
+    lookup = 'lte' if descending != reverse else 'gte'
+    return Q(**{f'{name}__{lookup}': values[0]}) & condition
+
+
+def _row_values(obj, fields):
+    values = []
+    for name, _ in fields:
+        value = obj
+        for part in name.split('__'):
+            value = getattr(value, part)
+        values.append(value)
+    return values
+
+
+def paginate(request, queryset, ordering, param='cursor', per_page=DEFAULT_PER_PAGE):
+    """
+    Returns a KeysetPage of `queryset` ordered by `ordering` (e.g. ('-issue_date',)
+    or ('user__last_name', 'user__first_name')). The cursor travels in the
+    `param` query-string argument; other arguments are kept on the links.
+    """
+    fields = _normalise(ordering)
+    order_by = [f'-{name}' if desc else name for name, desc in fields]
+    reverse_order_by = [name if desc else f'-{name}' for name, desc in fields]
+
+    values, direction = decode_cursor(request.GET.get(param))
+    if values is not None and len(values) != len(fields):
+        values, direction = None, None
+
+    try:
+        if direction is not None:
+            after = queryset.filter(_after(fields, values, reverse=direction == 'prev'))
+    except (ValidationError, ValueError, TypeError):
+        # A cursor whose values don't fit the columns; start from the top
+        direction = None
+
+    if direction == 'prev':
+        rows = list(after.order_by(*reverse_order_by)[:per_page + 1])
+        has_more = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        has_previous, has_next = has_more, True
+    else:
+        if direction == 'next':
+            queryset = after
+        rows = list(queryset.order_by(*order_by)[:per_page + 1])
+        has_more = len(rows) > per_page
+        items = rows[:per_page]
+        has_next, has_previous = has_more, direction == 'next'
+
+    return _build_page(request, param, fields, items, has_next, has_previous)
+
+
+def _build_page(request, param, fields, items, has_next, has_previous):
+    def query_for(cursor):
+        params = request.GET.copy()
+        params[param] = cursor
+        return params.urlencode()
+
+    page = KeysetPage(items, has_next, has_previous)
+    if items and has_next:
+        page.next_query = query_for(encode_cursor(_row_values(items[-1], fields), 'next'))
+    if items and has_previous:
+        page.previous_query = query_for(encode_cursor(_row_values(items[0], fields), 'prev'))
+    return page
+
+
+class _Descending:
+    """Sort-key wrapper that inverts the order of the value it holds."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _sort_key(values, fields):
+    return tuple(_Descending(v) if desc else v for v, (_, desc) in zip(values, fields))
+
+
+def paginate_list(request, items, ordering, param='cursor', per_page=DEFAULT_PER_PAGE):
+    """
+    Same as paginate() for an in-memory list (e.g. one read from the cache) that is
+    already sorted by `ordering`. The ordering values must be plain strings or
+    numbers so that they survive the round trip through the cursor.
+    """
+    fields = _normalise(ordering)
+    values, direction = decode_cursor(request.GET.get(param))
+    if values is not None and len(values) != len(fields):
+        direction = None
+
+    start, end = 0, per_page
+    try:
+        if direction is not None:
+            keys = [_sort_key(_row_values(item, fields), fields) for item in items]
+            cursor_key = _sort_key(values, fields)
+            if direction == 'next':
+                start = bisect.bisect_right(keys, cursor_key)
+                end = start + per_page
+            else:
+                end = bisect.bisect_left(keys, cursor_key)
+                start = max(end - per_page, 0)
+    except TypeError:
+        # A cursor whose values don't compare with the rows; start from the top
+        start, end = 0, per_page
+
+    return _build_page(request, param, fields, items[start:end], end < len(items), start > 0)
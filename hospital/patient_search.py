@@ -0,0 +1,78 @@
+# hospital/patient_search.py
+"""
+Prefix search over patients for autocomplete pickers.
+
+Every patient has a handful of PatientSearchTerm rows (username, first name,
+last name, full name, phone digits), normalised the same way as the query.
+A lookup is a range scan on the indexed `term` column, so its cost depends on
+the number of matches asked for, not on how many patients exist.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+
+from .models import Patient, PatientSearchTerm
+
+MAX_RESULTS = 20
+MIN_QUERY_LENGTH = 2
+LOCAL_PHONE_DIGITS = 10
+
+
+def normalise(text):
+    """Lower-cases, strips accents and collapses whitespace."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def terms_for(user, patient):
+    phone = re.sub(r'\D', '', patient.phone_number or '')
+    terms = {
+        normalise(user.username),
+        normalise(user.first_name),
+        normalise(user.last_name),
+        normalise(f'{user.first_name} {user.last_name}'),
+        phone,
+        # The local number, so it can be found without the country code
+        phone[-LOCAL_PHONE_DIGITS:],
+    }
+    terms.discard('')
+    return terms
+
+
+def index_patient(patient):
+    """Rewrites the search terms of one patient."""
+    with transaction.atomic():
+        PatientSearchTerm.objects.filter(patient=patient).delete()
+        PatientSearchTerm.objects.bulk_create(
+            PatientSearchTerm(patient=patient, term=term) for term in terms_for(patient.user, patient)
+        )
+
+
+def search(text, limit=MAX_RESULTS):
+    """Returns up to `limit` patients (with their user) whose terms start with `text`."""
+    query = normalise(text)
+    digits = re.sub(r'[\s\-+()]', '', query)
+    if digits.isdigit():
+        # Phone numbers are indexed as bare digits
+        query = digits
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+
+    # Range scan on the term index; '￿' sorts after any real character
+    matches = (
+        PatientSearchTerm.objects.filter(term__gte=query, term__lt=query + '￿')
+        .order_by('term')
+        .values_list('patient_id', flat=True)
+    )
+    patient_ids = []
+    # A patient can match on several terms, so read a few extra rows
+    for patient_id in matches[:limit * 5]:
+        if patient_id not in patient_ids:
+            patient_ids.append(patient_id)
+            if len(patient_ids) == limit:
+                break
+
+    patients = Patient.objects.select_related('user').in_bulk(patient_ids)
+    return [patients[pk] for pk in patient_ids if pk in patients]
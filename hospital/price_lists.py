@@ -0,0 +1,200 @@
+# hospital/price_lists.py
+"""
+Bulk import of supplier price lists into Medicine, LabTest and the shop's Product.
+
+The CSV file (one header row) is read a row at a time and handled BATCH_SIZE
+rows at a time, so memory stays the same however long the file is. Each batch
+is matched to the stored rows by their unique name with one `name__in` query:
+
+- names that aren't stored yet are inserted with bulk_create. It upserts on
+  the name, so a row someone adds through the form in the meantime is updated
+  instead of failing the batch;
+- stored rows whose values differ are written back with bulk_update;
+- the rest are only counted as unchanged.
+
+Every batch is its own transaction. Columns missing from the file, and empty
+cells, leave the stored value as it is, and stock levels are never touched.
+If a name appears twice, the later row wins.
+
+Columns: name, plus
+  medicine: unit_price (required for new medicines), description, manufacturer
+  labtest:  cost (required for new lab tests), description
+  product:  price (required for new products), description, category (by name, created if missing)
+"""
+import csv
+import io
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from pharmacy import catalog
+from pharmacy.models import Category, Product
+from .models import LabTest, Medicine
+
+# kind: (model, columns the file may set, columns a new row needs)
+KINDS = {
+    'medicine': (Medicine, ('unit_price', 'description', 'manufacturer'), ('unit_price',)),
+    'labtest': (LabTest, ('cost', 'description'), ('cost',)),
+    'product': (Product, ('price', 'description', 'category'), ('price',)),
+}
+# Stays under SQLite's limit on query parameters in the name__in lookups
+BATCH_SIZE = 500
+# Past this many, bad rows are only counted so a broken file can't fill memory
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError:
+    def __init__(self, row, name, errors):
+        self.row = row
+        self.name = name
+        self.errors = errors
+
+    def __str__(self):
+        return f"Row {self.row} ({self.name or 'no name'}): {'; '.join(self.errors)}"
+
+
+class ImportResult:
+    def __init__(self, kind, dry_run=False):
+        self.kind = kind
+        self.dry_run = dry_run
+        # On a dry run these are the changes that would have been made
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+        self.error_count = 0
+
+    def add_error(self, error):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(error)
+
+
+def open_upload(upload):
+    """A text stream over an uploaded file, read from disk or memory as it goes."""
+    return io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+
+
+def _parse(model, columns, number, row):
+    """Returns (name, {column: value}, RowError or None) for one CSV row."""
+    name = (row.get('name') or '').strip()
+    values, problems = {}, []
+    if not name:
+        problems.append('name is required')
+    elif len(name) > model._meta.get_field('name').max_length:
+        problems.append('name is too long')
+
+    for column in columns:
+        raw = (row.get(column) or '').strip()
+        if not raw:
+            # An empty cell keeps what is stored (a new row needs its required columns, see _apply_batch)
+            continue
+        if column == 'category':
+            values[column] = raw
+            continue
+        field = model._meta.get_field(column)
+        try:
+            value = field.to_python(raw)
+            field.run_validators(value)
+        except ValidationError as e:
+            problems.append(f"{column}: {'; '.join(e.messages)}")
+            continue
+        if isinstance(value, Decimal) and value < 0:
+            problems.append(f'{column} cannot be negative')
+        else:
+            values[column] = value
+
+    return name, values, RowError(number, name, problems) if problems else None
+
+
+def _current(obj, column):
+    if column == 'category':
+        return obj.category.name if obj.category_id else ''
+    return getattr(obj, column)
+
+
+def _category_ids(names):
+    """{name: id} for the given category names, creating the missing ones."""
+    names = {name for name in names if name}
+    Category.objects.bulk_create([Category(name=name) for name in names], ignore_conflicts=True)
+    return dict(Category.objects.filter(name__in=names).values_list('name', 'pk'))
+
+
+def _apply_batch(kind, columns, batch, result):
+    """Diffs one batch of {name: (row number, values)} against the database and writes the differences."""
+    model, _, required = KINDS[kind]
+    stored = model.objects.filter(name__in=batch)
+    if model is Product:
+        stored = stored.select_related('category')
+    stored = {obj.name: obj for obj in stored}
+
+    new, changed, changed_columns = [], [], set()
+    for name, (number, values) in batch.items():
+        obj = stored.get(name)
+        if obj is None:
+            if missing := [column for column in required if column not in values]:
+                result.add_error(RowError(number, name, [f'{column} is required for a new {kind}' for column in missing]))
+                continue
+            obj = model(name=name)
+            new.append(obj)
+        elif differs := {column for column, value in values.items() if _current(obj, column) != value}:
+            changed.append(obj)
+            changed_columns |= differs
+        else:
+            result.unchanged += 1
+            continue
+        for column, value in values.items():
+            if column != 'category':
+                setattr(obj, column, value)
+
+    result.inserted += len(new)
+    result.updated += len(changed)
+    if result.dry_run or not (new or changed):
+        return
+
+    with transaction.atomic():
+        categorised = [obj for obj in new + changed if 'category' in batch[obj.name][1]]
+        if categorised:
+            ids = _category_ids(batch[obj.name][1]['category'] for obj in categorised)
+            for obj in categorised:
+                obj.category_id = ids[batch[obj.name][1]['category']]
+        if new:
+            # A row added meanwhile gets only the columns every new row sets, so nobody's blank
+            # cell overwrites it
+            given = set(columns).intersection(*(batch[obj.name][1] for obj in new))
+            model.objects.bulk_create(new, update_conflicts=True, unique_fields=['name'], update_fields=sorted(given))
+        if changed:
+            # Only the columns that changed somewhere in the batch; a price-only update then
+            # leaves the text columns, and the shop's search index, alone
+            model.objects.bulk_update(changed, sorted(changed_columns))
+
+
+def import_price_list(kind, lines, dry_run=False, batch_size=BATCH_SIZE):
+    """Imports a CSV price list from `lines` (a text file or any iterable of lines). Returns an ImportResult."""
+    model, allowed, _ = KINDS[kind]
+    result = ImportResult(kind, dry_run)
+    reader = csv.DictReader(lines)
+    header = [column.strip().lower() for column in reader.fieldnames or []]
+    if 'name' not in header:
+        raise ValueError('The file needs a header row with a "name" column.')
+    reader.fieldnames = header
+    columns = tuple(column for column in allowed if column in header)
+
+    batch = {}
+    for number, row in enumerate(reader, start=2):
+        name, values, error = _parse(model, columns, number, row)
+        if error:
+            result.add_error(error)
+            continue
+        batch[name] = (number, values)
+        if len(batch) >= batch_size:
+            _apply_batch(kind, columns, batch, result)
+            batch = {}
+    if batch:
+        _apply_batch(kind, columns, batch, result)
+
+    if kind == 'product' and not dry_run and (result.inserted or result.updated):
+        # Bulk writes send no signals; the shop pages show names and prices
+        catalog.bump_version()
+    return result
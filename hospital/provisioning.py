@@ -0,0 +1,263 @@
+# hospital/provisioning.py
+"""
+Bulk creation of staff accounts (doctors, lab workers, pharmacists).
+
+Rows come from a CSV file (one header row) or a JSON list of objects with the
+columns below. All rows are validated together - including duplicates inside
+the file and against the database - passwords are hashed in a process pool,
+and the valid rows are inserted with bulk_create in one transaction. Invalid
+rows are skipped and reported with their row number, as are rows whose
+username, employee id or licence number someone else took while the file was
+being processed.
+
+The pool is started once per process, on the first batch big enough to need
+it, and reused by every later upload.
+
+Columns: role, username, password, first_name, last_name, email,
+  DOCTOR:     specialty (required), phone_number, is_approved (default yes)
+  LABWORKER:  department, employee_id
+  PHARMACIST: license_number, years_experience
+"""
+import atexit
+import csv
+import io
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from accounts.models import User
+from . import directory
+from .models import Doctor, LabWorker, Pharmacist
+
+ROLES = ('DOCTOR', 'LABWORKER', 'PHARMACIST')
+# Below this many passwords a process pool costs more than it saves
+POOL_THRESHOLD = 16
+# Stay under SQLite's limit on query parameters
+LOOKUP_BATCH = 900
+INSERT_BATCH = 500
+RACE_MESSAGE = 'username, employee_id or license_number was taken while the file was being processed'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class RowError:
+    def __init__(self, row, username, errors):
+        self.row = row
+        self.username = username
+        self.errors = errors
+
+    def __str__(self):
+        return f"Row {self.row} ({self.username or 'no username'}): {'; '.join(self.errors)}"
+
+
+class ProvisioningResult:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        # On a dry run these are the accounts that would have been created
+        self.created = {role: 0 for role in ROLES}
+        self.errors = []
+
+    @property
+    def total_created(self):
+        return sum(self.created.values())
+
+
+def read_rows(fileobj, file_format):
+    """Returns a list of dicts from a CSV or JSON file object (text or bytes)."""
+    data = fileobj.read()
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if file_format == 'json':
+        rows = json.loads(data)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('The JSON file must contain a list of objects.')
+        return rows
+    return list(csv.DictReader(io.StringIO(data)))
+
+
+def _clean(row):
+    return {key.strip().lower(): ('' if value is None else str(value).strip()) for key, value in row.items() if key}
+
+
+def _existing(model, field, values):
+    """Which of `values` already exist in model.field, looked up in batches."""
+    values = list(values)
+    found = set()
+    for i in range(0, len(values), LOOKUP_BATCH):
+        found.update(
+            model.objects.filter(**{f'{field}__in': values[i:i + LOOKUP_BATCH]}).values_list(field, flat=True)
+        )
+    return found
+
+
+def validate(rows):
+    """Returns (valid, errors), valid being (row number, row) pairs. Row numbers count the header as row 1."""
+    rows = [_clean(row) for row in rows]
+    valid, errors = [], []
+
+    def duplicates(key, role=None):
+        seen, dupes = set(), set()
+        for row in rows:
+            value = row.get(key, '')
+            if value and (role is None or row.get('role', '').upper() == role):
+                (dupes if value in seen else seen).add(value)
+        return dupes
+
+    dup_usernames = duplicates('username')
+    dup_employee_ids = duplicates('employee_id', 'LABWORKER')
+    dup_licenses = duplicates('license_number', 'PHARMACIST')
+    taken_usernames = _existing(User, 'username', {r['username'] for r in rows if r.get('username')})
+    taken_employee_ids = _existing(LabWorker, 'employee_id', {r['employee_id'] for r in rows if r.get('employee_id')})
+    taken_licenses = _existing(Pharmacist, 'license_number', {r['license_number'] for r in rows if r.get('license_number')})
+
+    for number, row in enumerate(rows, start=2):
+        problems = []
+        role = row.get('role', '').upper()
+        username = row.get('username', '')
+        row['role'] = role
+
+        if role not in ROLES:
+            problems.append(f"role must be one of {', '.join(ROLES)}")
+        if not username:
+            problems.append('username is required')
+        elif username in dup_usernames:
+            problems.append('username appears more than once in the file')
+        elif username in taken_usernames:
+            problems.append('username is already taken')
+        if not row.get('password'):
+            problems.append('password is required')
+        else:
+            try:
+                validate_password(row['password'], User(username=username, email=row.get('email', '')))
+            except ValidationError as e:
+                problems.extend(e.messages)
+
+        if role == 'DOCTOR' and not row.get('specialty'):
+            problems.append('specialty is required for doctors')
+        if role == 'LABWORKER' and row.get('employee_id'):
+            if row['employee_id'] in dup_employee_ids:
+                problems.append('employee_id appears more than once in the file')
+            elif row['employee_id'] in taken_employee_ids:
+                problems.append('employee_id is already in use')
+        if role == 'PHARMACIST':
+            if row.get('license_number') in dup_licenses:
+                problems.append('license_number appears more than once in the file')
+            elif row.get('license_number') in taken_licenses:
+                problems.append('license_number is already in use')
+            if row.get('years_experience') and not row['years_experience'].isdigit():
+                problems.append('years_experience must be a whole number')
+
+        if problems:
+            errors.append(RowError(number, username, problems))
+        else:
+            valid.append((number, row))
+    return valid, errors
+
+
+def hash_passwords(passwords, workers=None):
+    """Hashes passwords with the configured hasher, in parallel for large batches."""
+    if len(passwords) < POOL_THRESHOLD or workers == 1:
+        return [make_password(p) for p in passwords]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(passwords) // (workers * 4))
+    return list(_shared_pool(workers).map(make_password, passwords, chunksize=chunksize))
+
+
+def _shared_pool(workers):
+    """The process's hashing pool; `workers` only matters for the call that starts it."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def _init_worker():
+    # Needed when the pool spawns fresh interpreters instead of forking
+    import django
+    from django.conf import settings
+    if not settings.configured:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+        django.setup()
+
+
+def _profile(row, user):
+    if row['role'] == 'DOCTOR':
+        return Doctor(
+            user=user, specialty=row['specialty'], phone_number=row.get('phone_number', ''),
+            is_approved=row.get('is_approved', 'yes').lower() not in ('0', 'no', 'false'),
+        )
+    if row['role'] == 'LABWORKER':
+        return LabWorker(user=user, department=row.get('department', ''), employee_id=row.get('employee_id') or None)
+    years = row.get('years_experience')
+    return Pharmacist(user=user, license_number=row.get('license_number') or None,
+                      years_experience=int(years) if years else None)
+
+
+def _taken(valid):
+    """The (row number, row) pairs in `valid` whose unique values are now in the database."""
+    rows = [row for _, row in valid]
+    usernames = _existing(User, 'username', {row['username'] for row in rows})
+    employee_ids = _existing(LabWorker, 'employee_id', {row['employee_id'] for row in rows if row.get('employee_id')})
+    licenses = _existing(Pharmacist, 'license_number', {row['license_number'] for row in rows if row.get('license_number')})
+    return [
+        (number, row) for number, row in valid
+        if row['username'] in usernames
+        or (row['role'] == 'LABWORKER' and row.get('employee_id') in employee_ids)
+        or (row['role'] == 'PHARMACIST' and row.get('license_number') in licenses)
+    ]
+
+
+def _insert(valid, hashes):
+    with transaction.atomic():
+        users = [
+            User(
+                username=row['username'], password=hashes[number], role=row['role'],
+                first_name=row.get('first_name', ''), last_name=row.get('last_name', ''), email=row.get('email', ''),
+            )
+            for number, row in valid
+        ]
+        User.objects.bulk_create(users, batch_size=INSERT_BATCH)
+        profiles = {Doctor: [], LabWorker: [], Pharmacist: []}
+        for (_, row), user in zip(valid, users):
+            profile = _profile(row, user)
+            profiles[type(profile)].append(profile)
+        for model, objs in profiles.items():
+            model.objects.bulk_create(objs, batch_size=INSERT_BATCH)
+
+
+def provision(rows, dry_run=False, workers=None):
+    """Validates `rows` and creates the accounts for the valid ones. Returns a ProvisioningResult."""
+    result = ProvisioningResult(dry_run)
+    valid, result.errors = validate(rows)
+    if not dry_run and valid:
+        passwords = hash_passwords([row['password'] for _, row in valid], workers)
+        hashes = {number: password for (number, _), password in zip(valid, passwords)}
+        while valid:
+            try:
+                _insert(valid, hashes)
+                break
+            except IntegrityError:
+                # Someone took a username (or id) after validate() checked; drop those rows and retry
+                taken = _taken(valid)
+                if not taken:
+                    raise
+                for number, row in taken:
+                    result.errors.append(RowError(number, row['username'], [RACE_MESSAGE]))
+                taken_numbers = {number for number, _ in taken}
+                valid = [(number, row) for number, row in valid if number not in taken_numbers]
+        result.errors.sort(key=lambda error: error.row)
+        # bulk_create skips the save signals that normally keep the directory fresh
+        directory.bump_version()
+
+    for _, row in valid:
+        result.created[row['role']] += 1
+    return result
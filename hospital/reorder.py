@@ -0,0 +1,57 @@
+# hospital/reorder.py
+"""
+Low-stock detection for pharmacy medicines and shop products.
+
+refresh_alerts() runs one set-based query per table for the items at or
+below their reorder point, upserts them into ReorderAlert (unique per item,
+so repeated runs never duplicate an alert and keep its status), and deletes
+the alerts of items that have recovered. The pharmacist dashboard reads the
+ReorderAlert table, never the inventory itself.
+
+Products are ordered in the quantity their demand forecast suggests (see
+pharmacy.forecasting), falling back to reorder_quantity like medicines.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from pharmacy.models import Product
+from .models import Medicine, ReorderAlert
+
+# (item_type, model, expression for the units on hand, expression for the quantity to order)
+SOURCES = [
+    ('medicine', Medicine, F('stock_quantity'), F('reorder_quantity')),
+    # Units held by carts are as good as sold; order what the demand forecast says, if there is one
+    ('product', Product, F('stock') - F('reserved'), Coalesce('forecast__suggested_quantity', 'reorder_quantity')),
+]
+
+
+def _short_items(model, on_hand, order_quantity):
+    return model.objects.annotate(on_hand=on_hand, order_quantity=order_quantity).filter(on_hand__lte=F('reorder_point'))
+
+
+def refresh_alerts():
+    """Brings ReorderAlert up to date. Returns (active alerts, alerts cleared)."""
+    active = cleared = 0
+    for item_type, model, on_hand, order_quantity in SOURCES:
+        short = _short_items(model, on_hand, order_quantity)
+        alerts = [
+            ReorderAlert(
+                item_type=item_type, item_id=pk, name=name, on_hand=units, reorder_point=point,
+                suggested_quantity=max(quantity, point - units + 1),
+            )
+            for pk, name, units, point, quantity in short.values_list(
+                'pk', 'name', 'on_hand', 'reorder_point', 'order_quantity'
+            ).iterator(chunk_size=2000)
+        ]
+        with transaction.atomic():
+            ReorderAlert.objects.bulk_create(
+                alerts, batch_size=500, update_conflicts=True,
+                unique_fields=['item_type', 'item_id'],
+                update_fields=['name', 'on_hand', 'reorder_point', 'suggested_quantity', 'updated_at'],
+            )
+            cleared += ReorderAlert.objects.filter(item_type=item_type).exclude(
+                item_id__in=short.values('pk')
+            ).delete()[0]
+        active += len(alerts)
+    return active, cleared
@@ -0,0 +1,118 @@
+# hospital/rollup.py
+"""
+Daily appointment statistics.
+
+AppointmentDailyStat holds one counter per (appointment date, doctor, status).
+The Appointment signals move appointments between counters as they are
+created, change status or get deleted, so reports read a table whose size
+depends on days x doctors rather than on the number of appointments.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import Appointment, AppointmentDailyStat
+
+
+def add(day, doctor_id, status, delta):
+    """Adds `delta` to the counter for one (day, doctor, status)."""
+    if not delta:
+        return
+    stats = AppointmentDailyStat.objects.filter(date=day, doctor_id=doctor_id, status=status)
+    if stats.update(count=F('count') + delta) or delta < 0:
+        # Nothing to take away from a counter that doesn't exist (e.g. a
+        # cascading delete already removed it)
+        return
+    try:
+        with transaction.atomic():
+            AppointmentDailyStat.objects.create(date=day, doctor_id=doctor_id, status=status, count=delta)
+    except IntegrityError:
+        # Someone created the row between our update and insert
+        stats.update(count=F('count') + delta)
+
+
+def move(previous, current):
+    """
+    Moves one appointment from the `previous` (day, doctor_id, status) counter to
+    the `current` one. Either side may be None for inserts and deletes.
+    """
+    if previous == current:
+        return
+    if previous:
+        add(*previous, -1)
+    if current:
+        add(*current, 1)
+
+
+def rebuild(start, end, appointments=Appointment, stats=AppointmentDailyStat):
+    """
+    Recounts the rollup for appointments dated `start` to `end` and returns the
+    number of counters written. The migration that creates the table passes its
+    historical models; everything else uses the defaults.
+    """
+    counts = (
+        appointments.objects.filter(appointment_date__range=(start, end))
+        .values('appointment_date', 'doctor_id', 'status')
+        .annotate(total=Count('pk'))
+        .order_by()
+    )
+    with transaction.atomic():
+        stats.objects.filter(date__range=(start, end)).delete()
+        created = stats.objects.bulk_create([
+            stats(date=row['appointment_date'], doctor_id=row['doctor_id'], status=row['status'], count=row['total'])
+            for row in counts
+        ])
+    return len(created)
+
+
+def _pivot(rows, key):
+    """Turns [{key..., 'status', 'total'}] rows into {key: {status: n, ..., 'total': n}}."""
+    table = {}
+    for row in rows:
+        entry = table.setdefault(row[key], {status: 0 for status, _ in Appointment.STATUS_CHOICES})
+        entry[row['status']] = row['total']
+    for entry in table.values():
+        entry['total'] = sum(entry[status] for status, _ in Appointment.STATUS_CHOICES)
+    return table
+
+
+def appointment_report(start_date=None, end_date=None, doctor_id=None, specialty=None):
+    """Returns status totals plus per-doctor and per-specialty breakdowns, read from the rollup."""
+    stats = AppointmentDailyStat.objects.all()
+    if start_date:
+        stats = stats.filter(date__gte=start_date)
+    if end_date:
+        stats = stats.filter(date__lte=end_date)
+    if doctor_id:
+        stats = stats.filter(doctor_id=doctor_id)
+    if specialty:
+        stats = stats.filter(doctor__specialty=specialty)
+
+    by_status = {
+        row['status']: row['total']
+        for row in stats.values('status').annotate(total=Sum('count')).order_by()
+    }
+
+    doctor_rows = stats.values(
+        'doctor_id', 'doctor__user__first_name', 'doctor__user__last_name', 'status'
+    ).annotate(total=Sum('count')).order_by()
+    names = {}
+    for row in doctor_rows:
+        names[row['doctor_id']] = f"Dr. {row['doctor__user__first_name']} {row['doctor__user__last_name']}"
+    by_doctor = [
+        {'doctor_id': doctor_id, 'name': names[doctor_id], **counts}
+        for doctor_id, counts in _pivot(doctor_rows, 'doctor_id').items()
+    ]
+    by_doctor.sort(key=lambda row: (-row['total'], row['name']))
+
+    specialty_rows = stats.values('doctor__specialty', 'status').annotate(total=Sum('count')).order_by()
+    by_specialty = [
+        {'specialty': name, **counts}
+        for name, counts in sorted(_pivot(specialty_rows, 'doctor__specialty').items())
+    ]
+
+    return {
+        'by_status': by_status,
+        'total': sum(by_status.values()),
+        'by_doctor': by_doctor,
+        'by_specialty': by_specialty,
+    }
@@ -0,0 +1,116 @@
+# hospital/search.py
+"""
+Full-text search over prescriptions.
+
+On SQLite this uses the FTS5 table created in migration 0014 (kept in sync by
+triggers, which are put back after every migrate), ranked with bm25() and highlighted with snippet(). Other database
+backends fall back to a plain case-insensitive LIKE.
+"""
+import importlib
+import re
+
+from django.db import connection, connections
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Prescription
+
+FTS_TABLE = 'hospital_prescription_fts'
+FTS_TRIGGERS = (f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au')
+MAX_RESULTS = 50
+
+# Control characters mark the highlighted terms, so the text can be
+# HTML-escaped before the markers become <mark> tags
+_START, _END = '\x02', '\x03'
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def restore_triggers(using='default'):
+    """
+    SQLite alters a table by rebuilding it, which drops its triggers. Puts back
+    any the index is missing and re-indexes the rows written without them.
+    Returns True if anything had to be restored.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return False
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)", (FTS_TABLE, *FTS_TRIGGERS)
+        )
+        found = {name for name, in cursor.fetchall()}
+        # No index yet (or migrated back past 0014): nothing to restore
+        if FTS_TABLE not in found or found.issuperset(FTS_TRIGGERS):
+            return False
+        for sql in importlib.import_module('hospital.migrations.0014_prescription_fts').CREATE_SQL:
+            cursor.execute(sql)
+    return True
+
+
+def build_match_query(text):
+    """
+    Turns what the user typed into a safe FTS5 query: every word becomes a quoted
+    prefix term and all of them must match, e.g. 'amox 500' -> '"amox"* "500"*'.
+    """
+    words = re.findall(r'\w+', text)
+    return ' '.join('"%s"*' % word for word in words)
+
+
+def _highlight(snippet):
+    html = escape(snippet).replace(_START, '<mark>').replace(_END, '</mark>')
+    return mark_safe(html)
+
+
+def search_prescriptions(doctor_id, text, start_date=None, end_date=None, limit=MAX_RESULTS):
+    """
+    Returns up to `limit` (prescription, snippet_html) pairs written by the doctor
+    that match `text`, best match first.
+    """
+    match = build_match_query(text)
+    if not match:
+        return []
+
+    if not fts_available():
+        prescriptions = Prescription.objects.filter(doctor_id=doctor_id, prescription_text__icontains=text)
+        if start_date:
+            prescriptions = prescriptions.filter(date_prescribed__gte=start_date)
+        if end_date:
+            prescriptions = prescriptions.filter(date_prescribed__lte=end_date)
+        prescriptions = prescriptions.select_related('patient__user').order_by('-date_prescribed')[:limit]
+        return [(p, escape(p.prescription_text)) for p in prescriptions]
+
+    sql = f"""
+        SELECT p.id, snippet({FTS_TABLE}, 0, %s, %s, '…', 24)
+        FROM {FTS_TABLE}
+        JOIN hospital_prescription p ON p.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s AND p.doctor_id = %s
+    """
+    params = [_START, _END, match, doctor_id]
+    if start_date:
+        sql += ' AND p.date_prescribed >= %s'
+        params.append(start_date)
+    if end_date:
+        sql += ' AND p.date_prescribed <= %s'
+        params.append(end_date)
+    sql += f' ORDER BY bm25({FTS_TABLE}) LIMIT %s'
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        hits = cursor.fetchall()
+
+    prescriptions = Prescription.objects.select_related('patient__user').in_bulk([pk for pk, _ in hits])
+    return [(prescriptions[pk], _highlight(snippet)) for pk, snippet in hits if pk in prescriptions]
+
+
+def rebuild_index():
+    """Rebuilds the FTS index from the prescription table."""
+    if not fts_available():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return True
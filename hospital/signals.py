@@ -0,0 +1,107 @@
+# hospital/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from . import availability, counters, directory, inventory, patient_search, rollup, search
+from .models import Appointment, Doctor, MedicineBatch, Patient, WorkingHours
+
+# --- Keep the slot occupancy index, cached counters and daily stats in sync with appointments ---
+
+def _appointment_date(instance):
+    # appointment_date may still be the raw string it was assigned from a form
+    return Appointment._meta.get_field('appointment_date').to_python(instance.appointment_date)
+
+@receiver(pre_save, sender=Appointment)
+def remember_appointment_state(sender, instance, **kwargs):
+    # Remember where the appointment used to be so a moved booking frees its old day
+    # and a status change moves it between stat counters
+    instance._previous_state = None
+    if instance.pk:
+        instance._previous_state = (
+            Appointment.objects.filter(pk=instance.pk)
+            .values_list('appointment_date', 'doctor_id', 'status')
+            .first()
+        )
+
+@receiver(post_save, sender=Appointment)
+def update_appointment_indexes_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    day = _appointment_date(instance)
+    current = (day, instance.doctor_id, instance.status)
+    previous = getattr(instance, '_previous_state', None)
+
+    availability.refresh_day(instance.doctor_id, day)
+    counters.invalidate_doctor_counts(instance.doctor_id)
+    if previous and previous[:2] != current[:2]:
+        availability.refresh_day(previous[1], previous[0])
+        counters.invalidate_doctor_counts(previous[1])
+
+    rollup.move(previous, current)
+
+@receiver(post_delete, sender=Appointment)
+def update_appointment_indexes_on_delete(sender, instance, **kwargs):
+    day = _appointment_date(instance)
+    availability.refresh_day(instance.doctor_id, day)
+    counters.invalidate_doctor_counts(instance.doctor_id)
+    rollup.move((day, instance.doctor_id, instance.status), None)
+
+@receiver(post_save, sender=WorkingHours)
+@receiver(post_delete, sender=WorkingHours)
+def update_occupancy_on_hours_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    availability.refresh_upcoming(instance.doctor_id)
+
+# --- Keep the patient search terms up to date ---
+
+@receiver(post_save, sender=Patient)
+def index_patient_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    patient_search.index_patient(instance)
+
+@receiver(post_save, sender=User)
+def index_patient_user_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.role != 'PATIENT':
+        return
+    # Logins only touch last_login; skip the profile lookup for those
+    if update_fields and not {'username', 'first_name', 'last_name'} & set(update_fields):
+        return
+    try:
+        patient = instance.patient
+    except Patient.DoesNotExist:
+        return
+    patient_search.index_patient(patient)
+
+# --- Invalidate the cached doctor directory ---
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def bump_directory_on_doctor_change(sender, instance, **kwargs):
+    directory.bump_version()
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_directory_on_doctor_user_change(sender, instance, update_fields=None, **kwargs):
+    if instance.role != 'DOCTOR':
+        return
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    directory.bump_version()
+
+# --- Keep Medicine.stock_quantity equal to its batches (e.g. after edits in the admin) ---
+
+@receiver(post_save, sender=MedicineBatch)
+@receiver(post_delete, sender=MedicineBatch)
+def sync_medicine_stock(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    inventory.sync_stock([instance.medicine_id])
+
+# --- Put back the full-text search triggers after migrations rebuild the table ---
+# Connected in apps.py, as post_migrate needs the app config as its sender
+
+def restore_search_triggers(sender, using='default', **kwargs):
+    search.restore_triggers(using)
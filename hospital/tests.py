@@ -1,3 +1,359 @@
-from django.test import TestCase
+import datetime
+import importlib
+import tracemalloc
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.formats import date_format
+
+from accounts.models import User
+from pharmacy.models import Order, OrderItem
+from . import exports, inventory, pagination, provisioning, search
+from .models import (
+    Appointment, AppointmentDailyStat, DayOccupancy, Doctor, Invoice, Medicine, MedicineBatch, Patient, Prescription,
+)
+from .price_lists import import_price_list
+from .search import search_prescriptions
+
+
+def make_doctor(username='doc', **kwargs):
+    user = User.objects.create_user(username, f'{username}@example.com', 'pw', role='DOCTOR',
+                                    first_name='Greg', last_name=username.title())
+    return Doctor.objects.create(user=user, specialty=kwargs.pop('specialty', 'General'), is_approved=True, **kwargs)
+
+
+def make_patient(username='pat', **kwargs):
+    user = User.objects.create_user(username, f'{username}@example.com', 'pw', role='PATIENT',
+                                    first_name='Pat', last_name=username.title())
+    return Patient.objects.create(user=user, **kwargs)
+
+
+class AppointmentRollupTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.day = datetime.date(2026, 3, 2)
+        for hour in range(3):
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor, appointment_date=self.day, appointment_time=datetime.time(9 + hour)
+            )
+
+    def counters(self):
+        return set(AppointmentDailyStat.objects.values_list('date', 'doctor_id', 'status', 'count'))
+
+    def test_status_changes_move_counters(self):
+        appointment = Appointment.objects.first()
+        appointment.status = 'Approved'
+        appointment.save()
+        Appointment.objects.last().delete()
+        self.assertEqual(self.counters(), {
+            (self.day, self.doctor.pk, 'Pending', 1),
+            (self.day, self.doctor.pk, 'Approved', 1),
+        })
+
+    def test_migration_backfills_existing_appointments(self):
+        expected = self.counters()
+        AppointmentDailyStat.objects.all().delete()
+        migration = importlib.import_module('hospital.migrations.0013_appointmentdailystat')
+        migration.fill_daily_stats(apps, None)
+        self.assertEqual(self.counters(), expected)
+        self.assertEqual(expected, {(self.day, self.doctor.pk, 'Pending', 3)})
+
+
+class FreeSlotsTests(TestCase):
+    def test_defaults_to_the_local_date(self):
+        doctor = make_doctor()
+        make_patient()
+        self.client.login(username='pat', password='pw')
+        # 20:00 UTC on Monday is already 01:30 on Tuesday in Kolkata
+        evening = datetime.datetime(2026, 3, 2, 20, 0, tzinfo=datetime.timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=evening):
+            response = self.client.get(reverse('doctor_free_slots', args=[doctor.user_id]))
+        slots = response.json()['slots']
+        self.assertEqual(list(slots), ['2026-03-03'])
+        self.assertEqual(slots['2026-03-03'][0], '09:00')
+
+    def test_migration_fills_upcoming_days(self):
+        doctor, patient = make_doctor(), make_patient()
+        today = timezone.localdate()
+        for offset in (-3, 1, 1, 4):
+            Appointment.objects.create(
+                patient=patient, doctor=doctor, appointment_date=today + datetime.timedelta(days=offset),
+                appointment_time=datetime.time(9 + Appointment.objects.count()),
+            )
+        expected = set(DayOccupancy.objects.filter(date__gte=today).values_list('doctor_id', 'date', 'bitmap'))
+        DayOccupancy.objects.all().delete()
+        migration = importlib.import_module('hospital.migrations.0010_availability')
+        migration.fill_upcoming_occupancy(apps, None)
+        self.assertEqual(set(DayOccupancy.objects.values_list('doctor_id', 'date', 'bitmap')), expected)
+        self.assertEqual(len(expected), 2)
+
+
+class PatientPageCachingTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        patient = make_patient()
+        Appointment.objects.create(
+            patient=patient, doctor=self.doctor, status='Approved',
+            appointment_date=timezone.localdate() + datetime.timedelta(days=1), appointment_time=datetime.time(9),
+        )
+        self.client.login(username='pat', password='pw')
+
+    def test_unchanged_pages_are_not_sent_again(self):
+        for name in ('patient_dashboard', 'my_appointments', 'my_prescriptions'):
+            with self.subTest(page=name):
+                etag = self.client.get(reverse(name))['ETag']
+                self.assertEqual(self.client.get(reverse(name), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_renaming_the_doctor_changes_the_pages(self):
+        etags = {name: self.client.get(reverse(name))['ETag'] for name in ('patient_dashboard', 'my_appointments')}
+        User.objects.filter(pk=self.doctor.user_id).update(last_name='House')
+        for name, etag in etags.items():
+            with self.subTest(page=name):
+                response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, 'House')
+
+    def test_moving_the_appointment_changes_the_prescriptions(self):
+        appointment = Appointment.objects.get()
+        Prescription.objects.create(
+            patient=appointment.patient, doctor=self.doctor, appointment=appointment, prescription_text='Rest'
+        )
+        etag = self.client.get(reverse('my_prescriptions'))['ETag']
+        appointment.appointment_date += datetime.timedelta(days=1)
+        appointment.save()
+        response = self.client.get(reverse('my_prescriptions'), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, date_format(appointment.appointment_date))
+
+
+class PrescriptionSearchTests(TestCase):
+    # The index is kept in step by triggers, which SQLite drops whenever a
+    # migration rebuilds the prescription table; a post_migrate receiver puts them back
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+
+    def found(self, text):
+        return [prescription.pk for prescription, _ in search_prescriptions(self.doctor.pk, text)]
+
+    def test_new_prescriptions_are_searchable(self):
+        prescription = Prescription.objects.create(
+            patient=self.patient, doctor=self.doctor, prescription_text='Amoxicillin 500mg three times a day'
+        )
+        self.assertEqual(self.found('amox'), [prescription.pk])
+
+    def test_edits_and_deletes_reach_the_index(self):
+        prescription = Prescription.objects.create(
+            patient=self.patient, doctor=self.doctor, prescription_text='Paracetamol 500mg'
+        )
+        prescription.prescription_text = 'Ibuprofen 200mg'
+        prescription.save()
+        self.assertEqual(self.found('paracetamol'), [])
+        self.assertEqual(self.found('ibuprofen'), [prescription.pk])
+
+        prescription.delete()
+        self.assertEqual(self.found('ibuprofen'), [])
+
+    def test_dropped_triggers_are_restored_after_migrate(self):
+        with connection.cursor() as cursor:
+            for trigger in search.FTS_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {trigger}')
+        prescription = Prescription.objects.create(
+            patient=self.patient, doctor=self.doctor, prescription_text='Amoxicillin 500mg three times a day'
+        )
+        self.assertEqual(self.found('amox'), [])
+
+        emit_post_migrate_signal(0, False, 'default')
+        self.assertEqual(self.found('amox'), [prescription.pk])
+        self.assertFalse(search.restore_triggers())
+
+
+class PatientSearchAccessTests(TestCase):
+    def setUp(self):
+        make_patient('alice')
+        self.url = reverse('patient_search') + '?q=ali'
+
+    def test_admins_can_search(self):
+        User.objects.create_user('boss', 'boss@example.com', 'pw', role='ADMIN')
+        self.client.login(username='boss', password='pw')
+        response = self.client.get(self.url)
+        self.assertEqual([row['username'] for row in response.json()['results']], ['alice'])
+
+    def test_other_roles_are_turned_away(self):
+        make_doctor()
+        for username in ('doc', 'alice'):
+            with self.subTest(username=username):
+                self.client.login(username=username, password='pw')
+                self.assertRedirects(self.client.get(self.url), reverse('home'), fetch_redirect_response=False)
+
+
+class ProvisioningTests(TestCase):
+    rows = [
+        {'role': 'DOCTOR', 'username': 'house', 'password': 'Vicodin-2004', 'specialty': 'Diagnostics'},
+        {'role': 'PHARMACIST', 'username': 'chase', 'password': 'Vicodin-2004', 'license_number': 'PH-1'},
+    ]
+
+    def test_creates_accounts_and_profiles(self):
+        result = provisioning.provision(self.rows)
+        self.assertEqual((result.total_created, result.errors), (2, []))
+        self.assertTrue(Doctor.objects.filter(user__username='house', specialty='Diagnostics').exists())
+
+    def test_username_taken_after_validation_is_reported(self):
+        hash_passwords = provisioning.hash_passwords
+
+        def hash_and_race(passwords, workers=None):
+            # Another admin creates the same username while the passwords are hashed
+            User.objects.create_user('chase', 'chase@example.com', 'pw', role='PHARMACIST')
+            return hash_passwords(passwords, workers)
+
+        with mock.patch.object(provisioning, 'hash_passwords', hash_and_race):
+            result = provisioning.provision(self.rows)
+        self.assertEqual(result.created, {'DOCTOR': 1, 'LABWORKER': 0, 'PHARMACIST': 0})
+        self.assertEqual([(error.row, error.username) for error in result.errors], [(3, 'chase')])
+        self.assertTrue(User.objects.filter(username='house').exists())
+
+
+class DispenseTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('pharm', 'pharm@example.com', 'pw', role='PHARMACIST')
+        self.client.login(username='pharm', password='pw')
+        self.medicine = Medicine.objects.create(name='Aspirin', unit_price=Decimal('1.00'))
+        today = timezone.localdate()
+        inventory.receive_batch(self.medicine, 'LATE', 10, today + datetime.timedelta(days=300))
+        inventory.receive_batch(self.medicine, 'SOON', 4, today + datetime.timedelta(days=10))
+        inventory.receive_batch(self.medicine, 'GONE', 50, today - datetime.timedelta(days=1))
+
+    def dispense(self, quantity):
+        return self.client.post(reverse('dispense_medicine', args=[self.medicine.pk]), {'quantity': quantity})
+
+    def left(self):
+        self.medicine.refresh_from_db()
+        batches = dict(MedicineBatch.objects.values_list('batch_number', 'quantity'))
+        return self.medicine.stock_quantity, batches
+
+    def test_takes_the_earliest_expiry_first(self):
+        self.assertRedirects(self.dispense(6), reverse('pharmacist_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(self.left(), (58, {'SOON': 0, 'LATE': 8, 'GONE': 50}))
+
+    def test_expired_stock_is_not_dispensed(self):
+        self.dispense(15)
+        self.assertEqual(self.left(), (64, {'SOON': 4, 'LATE': 10, 'GONE': 50}))
+
+
+class PriceListImportTests(TestCase):
+    def setUp(self):
+        self.medicine = Medicine.objects.create(
+            name='Aspirin', description='Pain relief', manufacturer='Acme', unit_price=Decimal('1.00')
+        )
+
+    def run_import(self, *lines):
+        return import_price_list('medicine', ['name,unit_price,description,manufacturer', *lines])
+
+    def test_updates_changed_prices(self):
+        result = self.run_import('Aspirin,1.25,Pain relief,Acme', 'Ibuprofen,2.00,,')
+        self.assertEqual((result.inserted, result.updated, result.error_count), (1, 1, 0))
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.unit_price, Decimal('1.25'))
+
+    def test_empty_cells_keep_the_stored_values(self):
+        result = self.run_import('Aspirin,1.50,,')
+        self.assertEqual(result.updated, 1)
+        self.medicine.refresh_from_db()
+        self.assertEqual(
+            (self.medicine.unit_price, self.medicine.description, self.medicine.manufacturer),
+            (Decimal('1.50'), 'Pain relief', 'Acme'),
+        )
+
+    def test_new_rows_need_a_price(self):
+        result = self.run_import('Ibuprofen,,Anti-inflammatory,Acme')
+        self.assertEqual((result.inserted, result.error_count), (0, 1))
+        self.assertFalse(Medicine.objects.filter(name='Ibuprofen').exists())
+
+
+class ExportMemoryTests(TestCase):
+    def add_invoices(self, count):
+        Invoice.objects.bulk_create(
+            [Invoice(patient=self.patient, total_amount=Decimal('12.50'), notes='Consultation ' * 5) for _ in range(count)],
+            batch_size=2000,
+        )
+
+    def peak_memory(self, export_format):
+        """Peak traced memory, in bytes, while streaming the whole invoice export."""
+        tracemalloc.start()
+        try:
+            rows = sum(1 for _ in exports.stream(exports.DATASETS['invoices'], export_format))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return rows, peak
+
+    def test_memory_stays_flat_as_the_export_grows(self):
+        self.patient = make_patient()
+        small = 2 * exports.CHUNK_SIZE
+        for export_format in exports.FORMATS:
+            with self.subTest(export_format=export_format):
+                Invoice.objects.all().delete()
+                self.add_invoices(small)
+                rows, small_peak = self.peak_memory(export_format)
+                self.assertEqual(rows, small + (export_format == 'csv'))
+
+                self.add_invoices(9 * small)
+                rows, large_peak = self.peak_memory(export_format)
+                self.assertEqual(rows, 10 * small + (export_format == 'csv'))
+                # Ten times the rows; a buffered export would need about ten times the memory
+                self.assertLess(large_peak, small_peak * 1.5)
+
+
+class KeysetSeekTests(TestCase):
+    def test_deep_pages_seek_to_the_cursor(self):
+        doctor, patient = make_doctor(), make_patient()
+        start = datetime.date(2026, 3, 2)
+        Appointment.objects.bulk_create([
+            Appointment(patient=patient, doctor=doctor, appointment_date=start + datetime.timedelta(days=i // 8),
+                        appointment_time=datetime.time(9 + i % 8))
+            for i in range(80)
+        ])
+        pending = Appointment.objects.filter(doctor=doctor, status='Pending')
+        last = pending.order_by('appointment_date', 'appointment_time', 'pk')[49]
+        cursor = pagination.encode_cursor([last.appointment_date, last.appointment_time, last.pk], 'next')
+        request = RequestFactory().get('/', {'pending': cursor})
+
+        with CaptureQueriesContext(connection) as queries:
+            page = pagination.paginate(request, pending, ('appointment_date', 'appointment_time'), param='pending')
+        self.assertEqual(page.items, list(pending.order_by('appointment_date', 'appointment_time', 'pk')[50:70]))
+        with connection.cursor() as db:
+            db.execute('EXPLAIN QUERY PLAN ' + queries[0]['sql'])
+            plan = ' '.join(row[-1] for row in db.fetchall())
+        # The index range starts at the cursor's date instead of the doctor's first appointment
+        self.assertIn('USING INDEX appt_doctor_status_date_idx (doctor_id=? AND status=? AND appointment_date>?)', plan)
+
+
+class ExportDateTests(TestCase):
+    # 20:00 UTC on Monday is already 01:30 on Tuesday in Kolkata
+    evening = datetime.datetime(2026, 3, 2, 20, 0, tzinfo=datetime.timezone.utc)
+
+    def test_order_dates_are_local_days(self):
+        user = User.objects.create_user('shopper', role='PATIENT')
+        order = Order.objects.create(user=user, total_price=0, shipping_address='Somewhere 1')
+        Order.objects.filter(pk=order.pk).update(created_at=self.evening)
+        OrderItem.objects.create(order=order, quantity=1, price=1)
+        for name in ('orders', 'order_items'):
+            with self.subTest(dataset=name):
+                dataset = exports.DATASETS[name]
+                tuesday = datetime.date(2026, 3, 3)
+                self.assertEqual(len(list(dataset.rows(tuesday, tuesday))), 1)
+                self.assertEqual(list(dataset.rows(None, tuesday - datetime.timedelta(days=1))), [])
+
+    def test_file_is_named_for_the_local_date(self):
+        User.objects.create_user('admin', password='pw', role='ADMIN')
+        self.client.login(username='admin', password='pw')
+        with mock.patch('django.utils.timezone.now', return_value=self.evening):
+            response = self.client.get(reverse('export', args=['orders']))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders-20260303.csv"')
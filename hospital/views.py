@@ -1,11 +1,18 @@
+import csv
 import datetime
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from accounts.models import User  # Import the User model 
-from .models import Doctor, Patient, Appointment, Prescription, LabWorker, Medicine, LabTest, Invoice, Pharmacist  # Import models
+from .models import Doctor, Patient, Appointment, Prescription, LabWorker, Medicine, LabTest, Invoice, Pharmacist, ReorderAlert  # Import models
 from django.contrib.auth.decorators import login_required
 from .decorators import admin_required
-from django.db.models import Count
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from . import availability, directory, exports, inventory, patient_search, price_lists, provisioning, rollup, search
+from .conditional import conditional_page, doctor_details
+from .pagination import paginate, paginate_list
 
 
 @login_required(login_url='login')
@@ -54,12 +61,17 @@ def add_doctor_view(request):
 
 @login_required(login_url='login') # <-- SECURITY FIX
 def doctor_list_view(request):
-    # Fetch all objects from the Doctor model
-    doctors = Doctor.objects.all()
+    # Fetch one page of approved doctors from the cached directory, alphabetically
+    specialty = request.GET.get('specialty', '')
+    doctors = paginate_list(
+        request, directory.get_doctors(specialty), ('user__last_name', 'user__first_name')
+    )
     
     # Pass the list of doctors to the template
     context = {
-        'doctors': doctors
+        'doctors': doctors,
+        'specialties': directory.get_specialties(),
+        'selected_specialty': specialty,
     }
     return render(request, 'doctor_list.html', context)
 
@@ -157,46 +169,78 @@ def book_appointment_view(request):
         doctor = None # Initialize doctor variable
 
         try:
-            # Get the Doctor object from the ID
-            doctor_user = User.objects.get(pk=doctor_id)
-            doctor = doctor_user.doctor
-            
+            # Get the (approved) Doctor object from the ID
+            doctor = directory.get_doctor(doctor_id)
+            if doctor is None:
+                raise Doctor.DoesNotExist
+            appointment_date = datetime.date.fromisoformat(app_date)
+            appointment_time = datetime.time.fromisoformat(app_time)
+
+            # Check the slot against the occupancy index before writing anything
+            availability.validate_slot(doctor.pk, appointment_date, appointment_time)
+
             # Create the appointment
-            Appointment.objects.create(
-                patient=patient,
-                doctor=doctor,
-                appointment_date=app_date,
-                appointment_time=app_time,
-                reason=reason,
-                status='Pending' # Default status
-            )
+            with transaction.atomic():
+                Appointment.objects.create(
+                    patient=patient,
+                    doctor=doctor,
+                    appointment_date=appointment_date,
+                    appointment_time=appointment_time,
+                    reason=reason,
+                    status='Pending' # Default status
+                )
             
             messages.success(request, 'Your appointment has been booked and is pending approval.')
             return redirect('home') # Or redirect to an 'my_appointments' page later
             
-        except User.DoesNotExist:
-            messages.error(request, 'Selected doctor does not exist.')
         except Doctor.DoesNotExist:
-            messages.error(request, 'Selected user is not a doctor.')
+            messages.error(request, 'Selected doctor does not exist.')
+        except (TypeError, ValueError):
+            messages.error(request, 'Please choose a valid date and time.')
+        except availability.SlotUnavailable as e:
+            messages.error(request, f'Dr. {doctor.user.username}: {e}')
+        except IntegrityError:
+            # Another patient took the slot between the check and the insert
+            messages.error(request, f'This time slot with Dr. {doctor.user.username} is already taken.')
         except Exception as e:
-            # This will catch the 'unique_together' error if the slot is taken
-            if 'UNIQUE constraint' in str(e):
-                doc_name = "the selected doctor"
-                if doctor: # Check if doctor object was successfully fetched
-                    doc_name = f"Dr. {doctor.user.username}"
-                messages.error(request, f'This time slot with {doc_name} is already taken.')
-            else:
-                messages.error(request, f'An error occurred: {e}')
+            messages.error(request, f'An error occurred: {e}')
 
     # --- This is for the GET request (or if POST fails) ---
-    # Fetch all doctors to show in the dropdown
-    doctors = Doctor.objects.all()
+    # Approved doctors for the dropdown, from the cached directory
+    specialty = request.GET.get('specialty', '')
     
     context = {
-        'doctors': doctors
+        'doctors': directory.get_doctors(specialty),
+        'specialties': directory.get_specialties(),
+        'selected_specialty': specialty,
     }
     return render(request, 'booking.html', context)
 
+@login_required(login_url='login')
+def doctor_free_slots_view(request, pk):
+    """Returns the free appointment slots of a doctor as JSON, e.g. ?start=2025-11-03&end=2025-11-07"""
+    doctor = get_object_or_404(Doctor, user__pk=pk)
+
+    try:
+        start_date = datetime.date.fromisoformat(request.GET['start']) if request.GET.get('start') else timezone.localdate()
+        end_date = datetime.date.fromisoformat(request.GET['end']) if request.GET.get('end') else start_date
+    except ValueError:
+        return JsonResponse({'error': 'Dates must use the YYYY-MM-DD format.'}, status=400)
+
+    if end_date < start_date:
+        return JsonResponse({'error': 'The end date must not be before the start date.'}, status=400)
+    if (end_date - start_date).days >= availability.MAX_RANGE_DAYS:
+        return JsonResponse({'error': f'Ask for at most {availability.MAX_RANGE_DAYS} days at a time.'}, status=400)
+
+    slots = availability.free_slots(doctor.pk, start_date, end_date)
+    return JsonResponse({
+        'doctor': doctor.pk,
+        'slots': {
+            day.isoformat(): [t.strftime('%H:%M') for t in times]
+            for day, times in slots.items()
+        },
+    })
+
 @login_required(login_url='login')
 def approve_appointment_view(request, pk):
     try:
@@ -242,7 +286,14 @@ def reject_appointment_view(request, pk):
     return redirect('doctor_dashboard')
 
 # --- ADD THIS NEW VIEW FOR PATIENTS ---
+def _patient_appointments_state(request):
+    # Any booking, status change or cancellation moves the max updated_at; the count catches deletes
+    appointments = Appointment.objects.filter(patient__user=request.user)
+    stats = appointments.aggregate(changed=Max('updated_at'), total=Count('pk'))
+    return (stats['changed'], stats['total'], doctor_details(appointments))
+
 @login_required(login_url='login')
+@conditional_page(_patient_appointments_state)
 def patient_appointments_view(request):
     try:
         # Get the Patient object for the logged-in user
@@ -251,8 +302,12 @@ def patient_appointments_view(request):
         messages.error(request, 'You are not authorized to view this page.')
         return redirect('home')
 
-    # Get all appointments for this patient, ordered by date
-    appointments = Appointment.objects.filter(patient=patient).order_by('appointment_date', 'appointment_time')
+    # Get one page of appointments for this patient, ordered by date
+    appointments = paginate(
+        request,
+        Appointment.objects.filter(patient=patient).select_related('doctor__user'),
+        ('appointment_date', 'appointment_time'),
+    )
 
     context = {
         'appointments': appointments,
@@ -301,7 +356,20 @@ def create_prescription_view(request, appt_pk):
     return render(request, 'create_prescription.html', context)
 
 # --- ADD THIS NEW VIEW FOR PATIENTS ---
+def _patient_prescriptions_state(request):
+    prescriptions = Prescription.objects.filter(patient__user=request.user)
+    # Each prescription also shows its appointment's date, which moves with the appointment
+    stats = prescriptions.aggregate(
+        changed=Max('updated_at'), total=Count('pk'),
+        appointments_changed=Max('appointment__updated_at'), appointments=Count('appointment'),
+    )
+    return (
+        stats['changed'], stats['total'], stats['appointments_changed'], stats['appointments'],
+        doctor_details(prescriptions),
+    )
+
 @login_required(login_url='login')
+@conditional_page(_patient_prescriptions_state)
 def my_prescriptions_view(request):
     try:
         # Get the Patient object for the logged-in user
@@ -310,14 +378,51 @@ def my_prescriptions_view(request):
         messages.error(request, 'You are not authorized to view this page.')
         return redirect('home')
 
-    # Get all prescriptions for this patient, ordered by date
-    prescriptions = Prescription.objects.filter(patient=patient).order_by('-date_prescribed')
+    # Get one page of prescriptions for this patient, newest first
+    prescriptions = paginate(
+        request,
+        Prescription.objects.filter(patient=patient).select_related('doctor__user', 'appointment'),
+        ('-date_prescribed',),
+    )
 
     context = {
         'prescriptions': prescriptions,
     }
     return render(request, 'my_prescriptions.html', context)
 
+@login_required(login_url='login')
+def search_prescriptions_view(request):
+    """Lets a doctor search the prescriptions they have written, e.g. for a drug name."""
+    try:
+        doctor = request.user.doctor
+    except (Doctor.DoesNotExist, AttributeError):
+        messages.error(request, 'You are not authorized to view this page.')
+        return redirect('home')
+
+    query = request.GET.get('q', '').strip()
+    start_str = request.GET.get('start_date', '')
+    end_str = request.GET.get('end_date', '')
+    results = []
+
+    try:
+        start_date = datetime.date.fromisoformat(start_str) if start_str else None
+        end_date = datetime.date.fromisoformat(end_str) if end_str else None
+    except ValueError:
+        messages.error(request, 'Invalid date format. Please use YYYY-MM-DD.')
+        start_date = end_date = None
+
+    if query:
+        results = search.search_prescriptions(doctor.pk, query, start_date, end_date)
+
+    context = {
+        'query': query,
+        'start_date': start_date,
+        'end_date': end_date,
+        'results': results,
+        'max_results': search.MAX_RESULTS,
+    }
+    return render(request, 'search_prescriptions.html', context)
+
 @login_required(login_url='login')
 def pending_doctors_view(request):
     # Security Check: Only allow ADMINs to view this page
@@ -464,6 +569,64 @@ def add_pharmacist_view(request):
     # If it's a GET request, just show the blank form
     return render(request, 'add_pharmacist.html')
 
+@login_required(login_url='login')
+@admin_required
+def provision_staff_view(request):
+    """Creates many staff accounts at once from an uploaded CSV or JSON file."""
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('staff_file')
+        if not upload:
+            messages.error(request, 'Please choose a CSV or JSON file to upload.')
+            return redirect('provision_staff')
+
+        file_format = 'json' if upload.name.lower().endswith('.json') else 'csv'
+        try:
+            rows = provisioning.read_rows(upload, file_format)
+        except (ValueError, UnicodeDecodeError) as e:
+            messages.error(request, f'Could not read the file: {e}')
+            return redirect('provision_staff')
+
+        result = provisioning.provision(rows, dry_run=bool(request.POST.get('dry_run')))
+        if result.dry_run:
+            messages.info(request, f'Dry run: {result.total_created} accounts would be created.')
+        elif result.total_created:
+            messages.success(request, f'Created {result.total_created} staff accounts.')
+        if result.errors:
+            messages.warning(request, f'{len(result.errors)} rows were rejected. See the report below.')
+
+    return render(request, 'provision_staff.html', {'result': result})
+
+@login_required(login_url='login')
+@admin_required
+def import_price_list_view(request):
+    """Inserts and updates medicines, lab tests or shop products from an uploaded CSV price list."""
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('price_list')
+        kind = request.POST.get('kind')
+        if not upload or kind not in price_lists.KINDS:
+            messages.error(request, 'Please choose what the price list is for and a CSV file to upload.')
+            return redirect('import_price_list')
+
+        try:
+            result = price_lists.import_price_list(
+                kind, price_lists.open_upload(upload), dry_run=bool(request.POST.get('dry_run'))
+            )
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            messages.error(request, f'Could not read the file: {e}')
+            return redirect('import_price_list')
+
+        summary = f'{result.inserted} inserted, {result.updated} updated, {result.unchanged} unchanged.'
+        if result.dry_run:
+            messages.info(request, f'Dry run: {summary}')
+        else:
+            messages.success(request, f'Price list imported: {summary}')
+        if result.error_count:
+            messages.warning(request, f'{result.error_count} rows were rejected. See the report below.')
+
+    return render(request, 'import_price_list.html', {'result': result})
+
 @login_required(login_url='login')
 @admin_required
 def add_medicine_view(request):
@@ -473,12 +636,19 @@ def add_medicine_view(request):
         manufacturer = request.POST.get('manufacturer')
         unit_price = request.POST.get('unit_price')
         stock_quantity = request.POST.get('stock_quantity')
+        batch_number = request.POST.get('batch_number', '').strip() or 'OPENING'
+        expiry_str = request.POST.get('expiry_date')
 
         try:
-            Medicine.objects.create(
-                name=name, description=description, manufacturer=manufacturer,
-                unit_price=unit_price, stock_quantity=stock_quantity
-            )
+            expiry_date = datetime.date.fromisoformat(expiry_str) if expiry_str else None
+            # The opening stock goes in as the medicine's first batch
+            with transaction.atomic():
+                medicine = Medicine.objects.create(
+                    name=name, description=description, manufacturer=manufacturer,
+                    unit_price=unit_price, stock_quantity=0
+                )
+                if int(stock_quantity or 0) > 0:
+                    inventory.receive_batch(medicine, batch_number, int(stock_quantity), expiry_date)
             messages.success(request, f'Medicine "{name}" added successfully.')
             return redirect('medicine_list') # Redirect to the list view
         except Exception as e:
@@ -491,10 +661,46 @@ def add_medicine_view(request):
 @login_required(login_url='login')
 @admin_required
 def medicine_list_view(request):
-    medicines = Medicine.objects.all().order_by('name')
+    medicines = paginate(request, Medicine.objects.all(), ('name',))
     context = {'medicines': medicines}
     return render(request, 'medicine_list.html', context)
 
+@login_required(login_url='login')
+def dispense_medicine_view(request, pk):
+    """Hands out units of a medicine, taken from its batches earliest expiry first."""
+    if request.user.role not in ('PHARMACIST', 'ADMIN'):
+        messages.error(request, 'Access denied.')
+        return redirect('home')
+
+    if request.method == 'POST':
+        medicine = get_object_or_404(Medicine, pk=pk)
+        try:
+            quantity = int(request.POST.get('quantity', ''))
+            if quantity < 1:
+                raise ValueError
+            taken = inventory.allocate(medicine, quantity)
+            batches = ', '.join(f'{units} from {batch.batch_number}' for batch, units in taken)
+            messages.success(request, f'Dispensed {quantity} x {medicine.name} ({batches}).')
+        except ValueError:
+            messages.error(request, 'Please enter a whole number of units to dispense.')
+        except inventory.InsufficientStock as e:
+            messages.error(request, str(e))
+    return redirect('medicine_list' if request.user.role == 'ADMIN' else 'pharmacist_dashboard')
+
+@login_required(login_url='login')
+def mark_reorder_ordered_view(request, pk):
+    """Marks a reorder worklist entry as ordered; it disappears once stock is back up."""
+    if request.user.role not in ('PHARMACIST', 'ADMIN'):
+        messages.error(request, 'Access denied.')
+        return redirect('home')
+
+    if request.method == 'POST':
+        alert = get_object_or_404(ReorderAlert, pk=pk)
+        alert.status = 'Ordered'
+        alert.save(update_fields=['status', 'updated_at'])
+        messages.success(request, f'Marked {alert.name} as ordered.')
+    return redirect('pharmacist_dashboard')
+
 # --- LAB TEST VIEWS ---
 
 @login_required(login_url='login')
@@ -520,24 +726,26 @@ def add_lab_test_view(request):
 @login_required(login_url='login')
 @admin_required
 def lab_test_list_view(request):
-    lab_tests = LabTest.objects.all().order_by('name')
+    lab_tests = paginate(request, LabTest.objects.all(), ('name',))
     context = {'lab_tests': lab_tests}
     return render(request, 'lab_test_list.html', context)
 
 @login_required(login_url='login')
 @admin_required
 def create_invoice_view(request):
-    # Get all patients to populate the dropdown
-    patients = Patient.objects.all()
-
+    # Patients are picked through the patient_search autocomplete, not a full dropdown
     if request.method == 'POST':
         patient_id = request.POST.get('patient')
         due_date_str = request.POST.get('due_date')
         total_amount = request.POST.get('total_amount')
         notes = request.POST.get('notes')
 
+        if not (patient_id or '').isdigit():
+            messages.error(request, 'Please choose a patient from the search results.')
+            return render(request, 'create_invoice.html')
+
         try:
-            patient = Patient.objects.get(user_id=patient_id) # Find patient by user ID
+            patient = Patient.objects.select_related('user').get(user_id=patient_id) # Find patient by user ID
             
             # Convert due date string to date object (optional)
             due_date = datetime.datetime.strptime(due_date_str, '%Y-%m-%d').date() if due_date_str else None
@@ -558,44 +766,104 @@ def create_invoice_view(request):
             messages.error(request, 'Invalid date format for due date. Please use YYYY-MM-DD.')
         except Exception as e:
             messages.error(request, f'Error creating invoice: {e}')
-            # Stay on the form page if error, passing patients back
-            return render(request, 'create_invoice.html', {'patients': patients})
 
-    # If GET request, just show the blank form with patients
-    context = {'patients': patients}
-    return render(request, 'create_invoice.html', context)
+    return render(request, 'create_invoice.html')
+
+@login_required(login_url='login')
+@admin_required
+def patient_search_view(request):
+    """Prefix search over patients for autocomplete pickers: ?q=<name, username or phone>"""
+    patients = patient_search.search(request.GET.get('q', ''))
+    return JsonResponse({
+        'results': [
+            {
+                'id': p.user.pk,
+                'username': p.user.username,
+                'name': f'{p.user.first_name} {p.user.last_name}'.strip(),
+                'phone': p.phone_number,
+                'label': f'{p.user.first_name} {p.user.last_name} ({p.user.username})'.strip(),
+            }
+            for p in patients
+        ]
+    })
 
 @login_required(login_url='login')
 @admin_required
 def invoice_list_view(request):
-    invoices = Invoice.objects.all().select_related('patient__user').order_by('-issue_date') # Optimize
+    invoices = paginate(request, Invoice.objects.select_related('patient__user'), ('-issue_date',))
     context = {'invoices': invoices}
     return render(request, 'invoice_list.html', context)
 
 @login_required(login_url='login')
 @admin_required
 def patient_list_view(request):
-    patients = Patient.objects.all().select_related('user').order_by('user__last_name', 'user__first_name') # Optimize
+    patients = paginate(
+        request, Patient.objects.select_related('user'), ('user__last_name', 'user__first_name')
+    )
     context = {'patients': patients}
     return render(request, 'patient_list.html', context)
 
 @login_required(login_url='login')
 @admin_required
 def appointment_report_view(request):
-    # --- Basic Report Logic: Count appointments by status ---
-    
-    # Use annotation to count appointments grouped by status
-    status_counts = Appointment.objects.values('status').annotate(count=Count('status')).order_by('status')
-    
-    # Convert the queryset result into a more usable dictionary
-    report_data = {item['status']: item['count'] for item in status_counts}
-    
-    # Get total count as well
-    total_appointments = Appointment.objects.count()
+    # --- Report Logic: served from the daily rollup, never from raw appointments ---
+    start_str = request.GET.get('start_date', '')
+    end_str = request.GET.get('end_date', '')
+    doctor_id = request.GET.get('doctor', '')
+    specialty = request.GET.get('specialty', '')
+
+    try:
+        start_date = datetime.date.fromisoformat(start_str) if start_str else None
+        end_date = datetime.date.fromisoformat(end_str) if end_str else None
+    except ValueError:
+        messages.error(request, 'Invalid date format. Please use YYYY-MM-DD.')
+        start_date = end_date = None
+    if not doctor_id.isdigit():
+        doctor_id = ''
+
+    report = rollup.appointment_report(
+        start_date=start_date,
+        end_date=end_date,
+        doctor_id=int(doctor_id) if doctor_id else None,
+        specialty=specialty or None,
+    )
 
     context = {
-        'report_data': report_data,
-        'total_appointments': total_appointments,
-        # We can add date filters later
+        'report_data': report['by_status'],
+        'total_appointments': report['total'],
+        'by_doctor': report['by_doctor'],
+        'by_specialty': report['by_specialty'],
+        # Filter form
+        'doctors': Doctor.objects.select_related('user').order_by('user__last_name', 'user__first_name'),
+        'specialties': Doctor.objects.order_by('specialty').values_list('specialty', flat=True).distinct(),
+        'start_date': start_date,
+        'end_date': end_date,
+        'selected_doctor': doctor_id,
+        'selected_specialty': specialty,
     }
-    return render(request, 'report_appointment_summary.html', context)
\ No newline at end of file
+    return render(request, 'report_appointment_summary.html', context)
+
+
+@login_required(login_url='login')
+@admin_required
+def export_view(request, dataset):
+    """Streams a dataset as CSV or NDJSON, e.g. ?format=ndjson&start_date=2025-01-01&end_date=2025-03-31"""
+    if dataset not in exports.DATASETS:
+        raise Http404('Unknown export.')
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in exports.FORMATS:
+        export_format = 'csv'
+    try:
+        start_date = datetime.date.fromisoformat(request.GET['start_date']) if request.GET.get('start_date') else None
+        end_date = datetime.date.fromisoformat(request.GET['end_date']) if request.GET.get('end_date') else None
+    except ValueError:
+        messages.error(request, 'Invalid date format. Please use YYYY-MM-DD.')
+        return redirect('admin_dashboard')
+
+    response = StreamingHttpResponse(
+        exports.stream(exports.DATASETS[dataset], export_format, start_date, end_date),
+        content_type=exports.FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{dataset}-{timezone.localdate():%Y%m%d}.{export_format}"'
+    return response
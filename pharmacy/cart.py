@@ -0,0 +1,100 @@
+# pharmacy/cart.py
+"""
+Cart helpers: a race-free add-to-cart and database-side totals.
+
+Adding a product bumps the existing line with quantity = quantity + 1 in a
+single UPDATE and only inserts when there is no line yet. The unique
+(cart, product) constraint turns a lost race between two inserts into an
+IntegrityError, which is retried as an update, so double clicks never lose
+an increment or create a second line. The units are held for the cart at
+the same time (see reservations.py); if they can't be, nothing is added.
+
+The navbar summary (number of items and total) is cached per user and
+dropped whenever the cart changes.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+
+from . import reservations
+from .models import Cart, CartItem
+
+SUMMARY_TIMEOUT = 60 * 60
+CENT = Decimal('0.01')
+
+
+class NotAvailable(Exception):
+    def __init__(self, product):
+        self.product = product
+        super().__init__(f"Sorry, there isn't enough '{product.name}' in stock.")
+
+
+def line_total():
+    """quantity * product price as a database expression, for CartItem querysets."""
+    return ExpressionWrapper(
+        F('quantity') * F('product__price'), output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def items_with_totals(cart):
+    """The cart's lines with their products and a `line_total` attribute, in one query."""
+    return cart.items.select_related('product').annotate(line_total=line_total()).order_by('pk')
+
+
+def cart_totals(cart_id):
+    """Returns {'lines', 'item_count', 'total'} for a cart from one aggregate query."""
+    totals = CartItem.objects.filter(cart_id=cart_id).aggregate(
+        lines=Count('pk'), item_count=Sum('quantity'), total=Sum(line_total()),
+    )
+    return {
+        'lines': totals['lines'],
+        'item_count': totals['item_count'] or 0,
+        # SQLite hands back sums with float-like precision; round to cents
+        'total': (totals['total'] or Decimal(0)).quantize(CENT),
+    }
+
+
+def _summary_key(user_id):
+    return f'pharmacy:cart:{user_id}:summary'
+
+
+def get_summary(user):
+    """Cached cart summary for the navbar: {'lines', 'item_count', 'total'}."""
+    key = _summary_key(user.pk)
+    summary = cache.get(key)
+    if summary is None:
+        cart_id = Cart.objects.filter(user=user).values_list('pk', flat=True).first()
+        summary = cart_totals(cart_id) if cart_id else {'lines': 0, 'item_count': 0, 'total': Decimal('0.00')}
+        cache.set(key, summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_summary(user_id):
+    key = _summary_key(user_id)
+    # Drop it again after commit so a read in between can't cache stale numbers
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def add_item(cart, product, quantity=1):
+    """
+    Adds `quantity` of `product` to `cart` and holds the units for it. Returns True
+    when a new line was created; raises NotAvailable if the units can't be held.
+    """
+    lines = CartItem.objects.filter(cart=cart, product=product)
+    created = False
+    with transaction.atomic():
+        if not reservations.hold(cart, product, quantity):
+            raise NotAvailable(product)
+        if not lines.update(quantity=F('quantity') + quantity):
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+                created = True
+            except IntegrityError:
+                # Another request added the line between our update and insert
+                lines.update(quantity=F('quantity') + quantity)
+    invalidate_summary(cart.user_id)
+    return created
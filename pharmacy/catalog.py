@@ -0,0 +1,126 @@
+# pharmacy/catalog.py
+"""
+The shop catalog: filtering, full-text search, category facets and caching.
+
+Product search uses the FTS5 table from migration 0007 on SQLite (kept in
+sync by triggers, which are put back after every migrate) and falls back to
+icontains elsewhere. Category counts and
+whole anonymous catalog pages are cached under a catalog version that is
+bumped whenever a Product or Category is written, or a checkout sells a
+product out, so stale copies are simply never asked for again.
+
+"In stock" means available to sell (stock - reserved). Cart holds come and go
+with every click, so they don't bump the version, and a sale only bumps it
+when a product sells out; cached availability can lag by up to
+CATALOG_TIMEOUT, and add-to-cart always checks the live numbers.
+"""
+import hashlib
+import importlib
+import re
+import time
+
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Count, F, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Category, Product
+
+CATALOG_TIMEOUT = 60 * 15
+PAGE_SIZE = 24
+FTS_TABLE = 'pharmacy_product_fts'
+FTS_TRIGGERS = (f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au')
+_VERSION_KEY = 'pharmacy:catalog:version'
+
+
+def _version():
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        # Start from the clock so a lost version key never reuses an old number
+        cache.add(_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(_VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Marks every cached count and page of the catalog as stale."""
+    def bump():
+        try:
+            cache.incr(_VERSION_KEY)
+        except ValueError:
+            cache.set(_VERSION_KEY, time.time_ns(), None)
+    bump()
+    # Bump again after commit so a read in between can't cache stale rows
+    transaction.on_commit(bump)
+
+
+def restore_triggers(using='default'):
+    """
+    Puts back search triggers dropped when SQLite rebuilt the product table
+    and re-indexes the products. Returns True if anything had to be restored.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return False
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)", (FTS_TABLE, *FTS_TRIGGERS)
+        )
+        found = {name for name, in cursor.fetchall()}
+        # No index yet (or migrated back past 0007): nothing to restore
+        if FTS_TABLE not in found or found.issuperset(FTS_TRIGGERS):
+            return False
+        for sql in importlib.import_module('pharmacy.migrations.0007_product_fts').CREATE_SQL:
+            cursor.execute(sql)
+    return True
+
+
+def build_match_query(text):
+    """Every word becomes a quoted prefix term, e.g. 'vit c' -> '"vit"* "c"*'."""
+    return ' '.join('"%s"*' % word for word in re.findall(r'\w+', text))
+
+
+def products(category_id=None, in_stock=False, query=''):
+    """Products matching the shop filters, unordered (the caller paginates)."""
+    queryset = Product.objects.select_related('category')
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    if in_stock:
+        queryset = queryset.filter(stock__gt=F('reserved'))
+    match = build_match_query(query)
+    if match:
+        if connection.vendor == 'sqlite':
+            queryset = queryset.filter(
+                pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+            )
+        else:
+            queryset = queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+    return queryset
+
+
+def category_facets():
+    """
+    [{'id', 'name', 'count', 'in_stock'}] for every category, plus the totals as
+    {'count', 'in_stock'}. Read in one grouped query and cached per catalog version.
+    """
+    key = f'pharmacy:catalog:{_version()}:facets'
+    facets = cache.get(key)
+    if facets is None:
+        categories = list(
+            Category.objects.annotate(
+                count=Count('products'),
+                in_stock=Count('products', filter=Q(products__stock__gt=F('products__reserved'))),
+            ).order_by('name').values('id', 'name', 'count', 'in_stock')
+        )
+        totals = Product.objects.aggregate(count=Count('pk'), in_stock=Count('pk', filter=Q(stock__gt=F('reserved'))))
+        facets = (categories, totals)
+        cache.set(key, facets, CATALOG_TIMEOUT)
+    return facets
+
+
+def page_cache_key(request):
+    """Cache key for a whole anonymous catalog page: catalog version + sorted query string."""
+    params = sorted((k, v) for k in request.GET for v in request.GET.getlist(k))
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()
+    return f'pharmacy:catalog:{_version()}:page:{digest}'
+
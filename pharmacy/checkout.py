@@ -0,0 +1,113 @@
+# pharmacy/checkout.py
+"""
+Turns a cart into an order in one transaction.
+
+Stock is taken with a single conditional UPDATE for the whole cart. Units the
+cart already holds (see reservations.py) only need to move from `reserved`
+to sold; the rest must still be free:
+
+    UPDATE product SET stock = stock - qty, reserved = reserved - held
+    WHERE id IN (..) AND stock >= reserved + (qty - held)
+
+(qty and held are CASE expressions over the product ids.) If fewer rows
+change than there are products in the cart, somebody else got there first
+and everything is rolled back, so stock can never be oversold.
+
+The transaction starts with a write (touching the cart) so that, on SQLite,
+the write lock is taken up front: concurrent checkouts queue behind it
+instead of failing half way, and the cart and its holds can't change under
+us while we read them.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import catalog, forecasting
+from .cart import invalidate_summary
+from .models import Cart, CartItem, Order, OrderItem, Product
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCart(CheckoutError):
+    pass
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(product.name for product in products) or 'some items in your cart'
+        super().__init__(f"Not enough stock for: {names}")
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def place_order(cart, user, shipping_address):
+    """Creates an Order from `cart`, takes the stock and empties the cart. Raises CheckoutError."""
+    with transaction.atomic():
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+        lines = list(cart.items.values_list('pk', 'product_id', 'quantity'))
+        if not lines:
+            raise EmptyCart("Your cart is empty.")
+
+        # The same product could in theory sit in the cart twice; take it once
+        quantities = {}
+        for _, product_id, quantity in lines:
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        # Units this cart still holds (expired holds may already have been swept)
+        held = dict(cart.reservations.values_list('product_id', 'quantity'))
+        held = {pk: min(held.get(pk, 0), qty) for pk, qty in quantities.items()}
+        needed = {pk: qty - held[pk] for pk, qty in quantities.items()}
+
+        taken = Product.objects.filter(
+            pk__in=quantities, stock__gte=F('reserved') + _quantity_case(needed)
+        ).update(
+            stock=F('stock') - _quantity_case(quantities),
+            reserved=Greatest(F('reserved') - _quantity_case(held), 0),
+        )
+        if taken != len(quantities):
+            raise OutOfStock([
+                product for product in Product.objects.filter(pk__in=quantities)
+                if product.available < needed[product.pk]
+            ])
+        cart.reservations.all().delete()
+
+        order = Order.objects.create(
+            user=user, total_price=0, shipping_address=shipping_address, status='Processing'
+        )
+        # Lock in the price at the time of purchase
+        prices, sold_out = {}, False
+        for pk, price, stock, reserved in Product.objects.filter(pk__in=quantities).values_list(
+            'pk', 'price', 'stock', 'reserved'
+        ):
+            prices[pk] = price
+            # Units that were free before this sale and none are now: it just went out of stock
+            sold_out = sold_out or (needed[pk] > 0 and stock <= reserved)
+        if sold_out:
+            # A bulk update sends no signals, so the cached "in stock" pages are dropped here;
+            # smaller stock changes show up when the pages expire (catalog.CATALOG_TIMEOUT)
+            catalog.bump_version()
+        # bulk_create skips save(), so the line totals are filled in here
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=pk, quantity=qty, price=prices[pk], line_total=prices[pk] * qty)
+            for pk, qty in quantities.items()
+        ])
+        totals = order.items.aggregate(total=Sum('line_total'), units=Sum('quantity'))
+        order.total_price = totals['total']
+        order.item_count = totals['units']
+        order.save(update_fields=['total_price', 'item_count'])
+        # The items were bulk created, so the sales rollup is updated here rather than by a signal
+        forecasting.record_order(order)
+
+        CartItem.objects.filter(pk__in=[pk for pk, _, _ in lines]).delete()
+        invalidate_summary(user.pk)
+    return order
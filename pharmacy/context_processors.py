@@ -0,0 +1,12 @@
+# pharmacy/context_processors.py
+from django.utils.functional import SimpleLazyObject
+
+from .cart import get_summary
+
+
+def cart_summary(request):
+    """Adds `cart_summary` for patients; only looked up when a template actually uses it."""
+    user = getattr(request, 'user', None)
+    if not user or not user.is_authenticated or user.role != 'PATIENT':
+        return {}
+    return {'cart_summary': SimpleLazyObject(lambda: get_summary(user))}
@@ -0,0 +1,166 @@
+# pharmacy/forecasting.py
+"""
+Demand forecasts for shop products from their order history.
+
+Sales are rolled up into ProductDailySales, one row per product and day:
+checkout adds each order to it, and the Order signals take cancelled or
+deleted orders back out. forecast_demand() makes two passes over the rollup,
+both index-only scans streamed with values_list iterators, so memory grows
+with the number of products and never with the length of their history:
+
+1. Over the whole history (HISTORY_DAYS): units sold per product and the
+   date of its first sale, giving the long-run daily average.
+2. Over the last WINDOW_DAYS: units sold per product per day, in product
+   order. Each product's days are folded into its moving average and its
+   exponentially smoothed level as they arrive.
+
+The smoothing is done in closed form. Started from a level s0, the level
+after n days is (1 - ALPHA)**n * s0 + sum(ALPHA * (1 - ALPHA)**age * units),
+so days without sales cost nothing and each day with sales is one
+multiply-add with a precomputed weight. The long-run average stands in for
+sales older than the window, which together weigh (1 - ALPHA)**WINDOW_DAYS.
+
+Today is left out of every series because it is not over yet.
+"""
+import datetime
+import itertools
+import math
+from operator import itemgetter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Min, Sum
+from django.utils import timezone
+
+from .models import DemandForecast, ProductDailySales
+
+HISTORY_DAYS = 3 * 365
+WINDOW_DAYS = 90
+MOVING_AVERAGE_DAYS = 28
+ALPHA = 0.1
+# Suggested orders cover this many days of forecast demand
+COVER_DAYS = 30
+WRITE_BATCH_SIZE = 1000
+
+
+# ALPHA * (1 - ALPHA)**age for every age in the window
+_WEIGHTS = [ALPHA * (1 - ALPHA) ** age for age in range(WINDOW_DAYS)]
+
+
+# --- The daily sales rollup ---
+
+def add_sales(day, product_id, delta):
+    """Adds `delta` units to the sales of one product on one day."""
+    if not delta:
+        return
+    sales = ProductDailySales.objects.filter(product_id=product_id, day=day)
+    if sales.update(units=F('units') + delta) or delta < 0:
+        # Nothing to take away from a day that has no row (e.g. the product was deleted)
+        return
+    try:
+        with transaction.atomic():
+            ProductDailySales.objects.create(product_id=product_id, day=day, units=delta)
+    except IntegrityError:
+        # Someone created the row between our update and insert
+        sales.update(units=F('units') + delta)
+
+
+def record_order(order, sign=1):
+    """Adds the order's items to the rollup, or takes them back out with sign=-1."""
+    day = timezone.localdate(order.created_at)
+    for product_id, quantity in order.items.filter(product__isnull=False).values_list('product_id', 'quantity'):
+        add_sales(day, product_id, sign * quantity)
+
+
+# --- Forecasting ---
+
+def _sales(since, until):
+    # Days in [since, until) on which something was sold
+    return ProductDailySales.objects.filter(day__gte=since, day__lt=until, units__gt=0)
+
+
+def _history(today):
+    """{product_id: (units sold, first sale date)} over the last HISTORY_DAYS."""
+    rows = (
+        _sales(today - datetime.timedelta(days=HISTORY_DAYS), today)
+        .values('product')
+        .annotate(total=Sum('units'), first_sale=Min('day'))
+        .values_list('product', 'total', 'first_sale')
+        .order_by()
+    )
+    return {product_id: (units, first_sale) for product_id, units, first_sale in rows.iterator(chunk_size=5000)}
+
+
+def _recent_days(today):
+    """(product_id, day, units) for the last WINDOW_DAYS, in product order."""
+    return (
+        _sales(today - datetime.timedelta(days=WINDOW_DAYS), today)
+        .values_list('product', 'day', 'units')
+        .order_by('product', 'day')
+        .iterator(chunk_size=5000)
+    )
+
+
+def _forecast(product_id, units, first_sale, days, today, now):
+    """Builds the forecast for one product from its history totals and its recent (day, units)."""
+    yesterday = today - datetime.timedelta(days=1)
+    sold_for = (yesterday - first_sale).days + 1
+    daily_average = units / sold_for
+
+    # Start from the long-run average, weighted for the days of the window before these sales
+    observed = min(sold_for, WINDOW_DAYS)
+    level = (1 - ALPHA) ** observed * daily_average
+    recent_units = 0
+    for day, day_units in days:
+        age = (yesterday - day).days
+        level += _WEIGHTS[age] * day_units
+        if age < MOVING_AVERAGE_DAYS:
+            recent_units += day_units
+
+    forecast_units = level * COVER_DAYS
+    return DemandForecast(
+        product_id=product_id,
+        daily_average=daily_average,
+        moving_average=recent_units / min(sold_for, MOVING_AVERAGE_DAYS),
+        smoothed=level,
+        forecast_units=forecast_units,
+        # Rounded first so float noise never turns 30.0 into 31
+        suggested_quantity=math.ceil(round(forecast_units, 6)),
+        computed_at=now,
+    )
+
+
+def _write(forecasts):
+    DemandForecast.objects.bulk_create(
+        forecasts, update_conflicts=True, unique_fields=['product'],
+        update_fields=['daily_average', 'moving_average', 'smoothed', 'forecast_units', 'suggested_quantity', 'computed_at'],
+    )
+
+
+def forecast_demand(today=None):
+    """Recomputes DemandForecast for every product sold in the last HISTORY_DAYS. Returns (written, cleared)."""
+    today = today or timezone.localdate()
+    now = timezone.now()
+    history = _history(today)
+
+    def forecasts():
+        # Products with recent sales, as the stream reaches them...
+        for product_id, rows in itertools.groupby(_recent_days(today), key=itemgetter(0)):
+            if product_id not in history:
+                continue  # its orders changed between the two passes; it is picked up next run
+            units, first_sale = history.pop(product_id)
+            days = ((day, day_units) for _, day, day_units in rows)
+            yield _forecast(product_id, units, first_sale, days, today, now)
+        # ...then the ones that have not sold within the window
+        for product_id, (units, first_sale) in history.items():
+            yield _forecast(product_id, units, first_sale, (), today, now)
+
+    # Each batch is its own short write, so shoppers are never locked out for the whole run
+    written = 0
+    stream = forecasts()
+    while batch := list(itertools.islice(stream, WRITE_BATCH_SIZE)):
+        _write(batch)
+        written += len(batch)
+
+    # Products that have not sold at all in the history have no forecast
+    cleared, _ = DemandForecast.objects.filter(computed_at__lt=now).delete()
+    return written, cleared
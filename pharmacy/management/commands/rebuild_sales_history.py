@@ -0,0 +1,56 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from pharmacy.models import Order, OrderItem, ProductDailySales
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily product sales rollup used by forecast_demand from the orders, a date range at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-days', type=int, default=30, help='Number of days rebuilt per transaction.')
+
+    def handle(self, *args, **options):
+        chunk = datetime.timedelta(days=options['chunk_days'])
+        bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        if bounds['first'] is None:
+            ProductDailySales.objects.all().delete()
+            self.stdout.write('No orders found; sales history cleared.')
+            return
+        first, last = timezone.localdate(bounds['first']), timezone.localdate(bounds['last'])
+
+        # Rows outside the order range can only be stale
+        ProductDailySales.objects.exclude(day__range=(first, last)).delete()
+
+        rows = 0
+        start = first
+        while start <= last:
+            end = min(start + chunk, last + datetime.timedelta(days=1))
+            since = timezone.make_aware(datetime.datetime.combine(start, datetime.time.min))
+            until = timezone.make_aware(datetime.datetime.combine(end, datetime.time.min))
+            sales = (
+                OrderItem.objects.filter(product__isnull=False, order__created_at__gte=since, order__created_at__lt=until)
+                .exclude(order__status='Cancelled')
+                .annotate(day=TruncDate('order__created_at'))
+                .values('product', 'day')
+                .annotate(units=Sum('quantity'))
+                .values_list('product', 'day', 'units')
+                .order_by()
+            )
+            with transaction.atomic():
+                ProductDailySales.objects.filter(day__gte=start, day__lt=end).delete()
+                created = ProductDailySales.objects.bulk_create(
+                    [ProductDailySales(product_id=product_id, day=day, units=units) for product_id, day, units in sales],
+                    batch_size=1000,
+                )
+            rows += len(created)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{start} to {end - datetime.timedelta(days=1)}: {len(created)} rows')
+            start = end
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales history: {rows} rows.'))
@@ -0,0 +1,28 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from pharmacy import reservations
+
+
+class Command(BaseCommand):
+    help = (
+        'Releases expired cart holds and purges abandoned carts, in small chunks. '
+        'Meant to run every few minutes from cron or a scheduler.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=reservations.SWEEP_CHUNK_SIZE)
+        parser.add_argument(
+            '--abandoned-days', type=int, default=reservations.ABANDONED_AFTER.days,
+            help='Delete carts nobody has added to for this many days (0 to skip).',
+        )
+
+    def handle(self, *args, **options):
+        released = reservations.sweep_expired(options['chunk_size'])
+        purged = 0
+        if options['abandoned_days']:
+            purged = reservations.purge_abandoned_carts(
+                datetime.timedelta(days=options['abandoned_days']), options['chunk_size']
+            )
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired holds; purged {purged} abandoned carts.'))
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:31
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    # Fold duplicate (cart, product) lines into the oldest one so the constraint can be added
+    CartItem = apps.get_model('pharmacy', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(lines=Count('pk'), total=Sum('quantity'))
+        .filter(lines__gt=1)
+        .order_by()
+    )
+    for dup in duplicates:
+        lines = CartItem.objects.filter(cart_id=dup['cart_id'], product_id=dup['product_id']).order_by('pk')
+        keep = lines.first()
+        lines.exclude(pk=keep.pk).delete()
+        lines.filter(pk=keep.pk).update(quantity=dup['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0004_order_user_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+# FTS5 index over Product.name and Product.description for the shop search.
+# Like the prescription index in hospital 0014 it is an external-content table
+# kept in sync by triggers, and only created on SQLite; other backends fall
+# back to icontains.
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS pharmacy_product_fts USING fts5(
+        name,
+        description,
+        content='pharmacy_product',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pharmacy_product_fts_ai AFTER INSERT ON pharmacy_product BEGIN
+        INSERT INTO pharmacy_product_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pharmacy_product_fts_ad AFTER DELETE ON pharmacy_product BEGIN
+        INSERT INTO pharmacy_product_fts(pharmacy_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pharmacy_product_fts_au AFTER UPDATE OF name, description ON pharmacy_product BEGIN
+        INSERT INTO pharmacy_product_fts(pharmacy_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO pharmacy_product_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    # Index the products that already exist
+    "INSERT INTO pharmacy_product_fts(pharmacy_product_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS pharmacy_product_fts_au',
+    'DROP TRIGGER IF EXISTS pharmacy_product_fts_ad',
+    'DROP TRIGGER IF EXISTS pharmacy_product_fts_ai',
+    'DROP TABLE IF EXISTS pharmacy_product_fts',
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0006_product_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
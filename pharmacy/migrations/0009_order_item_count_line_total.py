@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:35
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_existing_orders(apps, schema_editor):
+    Order = apps.get_model('pharmacy', 'Order')
+    OrderItem = apps.get_model('pharmacy', 'OrderItem')
+    OrderItem.objects.update(line_total=F('price') * F('quantity'))
+    units = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(units=Sum('quantity'))
+        .values('units')
+    )
+    Order.objects.update(item_count=Coalesce(Subquery(units), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0008_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(fill_existing_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_daily_sales(apps, schema_editor):
+    OrderItem = apps.get_model('pharmacy', 'OrderItem')
+    ProductDailySales = apps.get_model('pharmacy', 'ProductDailySales')
+    rows = (
+        OrderItem.objects.filter(product__isnull=False)
+        .exclude(order__status='Cancelled')
+        .annotate(day=TruncDate('order__created_at'))
+        .values('product', 'day')
+        .annotate(units=Sum('quantity'))
+        .values_list('product', 'day', 'units')
+        .order_by()
+    )
+    ProductDailySales.objects.bulk_create(
+        (ProductDailySales(product_id=product_id, day=day, units=units) for product_id, day, units in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0011_reorder_points'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('daily_average', models.FloatField()),
+                ('moving_average', models.FloatField()),
+                ('smoothed', models.FloatField()),
+                ('forecast_units', models.FloatField()),
+                ('suggested_quantity', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='pharmacy.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='pharmacy.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'day', 'units'], name='product_sales_covering_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productdailysales',
+            constraint=models.UniqueConstraint(fields=('product', 'day'), name='unique_product_sales_day'),
+        ),
+        migrations.RunPython(fill_daily_sales, migrations.RunPython.noop),
+    ]
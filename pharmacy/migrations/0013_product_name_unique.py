@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:21
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicate_products(apps, schema_editor):
+    # Keep the oldest product under each name; the others get their id appended
+    Product = apps.get_model('pharmacy', 'Product')
+    duplicated = Product.objects.values('name').annotate(n=Count('pk')).filter(n__gt=1).values_list('name', flat=True)
+    for name in list(duplicated):
+        for product in Product.objects.filter(name=name).order_by('pk')[1:]:
+            product.name = f'{name[:180]} #{product.pk}'
+            product.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0012_demand_forecasts'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_products, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_name_idx',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='name',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django.db import models
 from accounts.models import User
 
@@ -16,10 +18,19 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     
     # Product Details
-    name = models.CharField(max_length=200)
+    # Unique so price lists can be matched to products by name (see hospital/price_lists.py)
+    name = models.CharField(max_length=200, unique=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # Units held by shoppers' carts (the sum of their StockReservations), kept up to date
+    # with F() updates so "available to sell" never needs to add up the reservations
+    reserved = models.PositiveIntegerField(default=0)
+    # Reorder when available stock falls to reorder_point; order at least reorder_quantity
+    reorder_point = models.PositiveIntegerField(default=10)
+    reorder_quantity = models.PositiveIntegerField(default=50)
+    # Bulk stock updates skip it; it tracks edits such as renames (see my_orders_view)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     # We can add an image later
     # image = models.ImageField(upload_to='product_images/', blank=True, null=True)
@@ -27,11 +38,23 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def available(self):
+        return max(self.stock - self.reserved, 0)
+
+    class Meta:
+        indexes = [
+            # The shop lists products by name, across the catalog (the unique index) or within a category
+            models.Index(fields=['category', 'name'], name='product_category_name_idx'),
+        ]
+
 # --- ADD THIS MODEL ---
 class Cart(models.Model):
     # Link to the user who owns this cart
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last time something was added; carts idle for long enough are purged by sweep_reservations
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Cart for {self.user.username}"
@@ -52,6 +75,29 @@ class CartItem(models.Model):
     def get_total_price(self):
         return self.product.price * self.quantity
 
+    class Meta:
+        constraints = [
+            # One line per product; adding it again bumps the quantity instead
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
+class StockReservation(models.Model):
+    # Units of a product held for one cart until `expires_at`. Adding to the cart
+    # creates or extends the hold; checkout turns it into a sale, and the
+    # sweep_reservations command gives expired holds back to the shop.
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for cart {self.cart_id} until {self.expires_at}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product_reservation'),
+        ]
+
 # --- ADD THIS MODEL ---
 class Order(models.Model):
     STATUS_CHOICES = (
@@ -66,13 +112,22 @@ class Order(models.Model):
     
     # Store the details at the time of order
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Total number of units across the order's lines, kept so order lists needn't count them
+    item_count = models.PositiveIntegerField(default=0)
     shipping_address = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Processing')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Changes with the status, so the order pages can answer "not modified" cheaply
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Order {self.id} for {self.user.username}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ]
+
 # --- ADD THIS MODEL ---
 class OrderItem(models.Model):
     # Link to the specific order
@@ -83,6 +138,49 @@ class OrderItem(models.Model):
     # Store the price and quantity at the time of order
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2) # Price at time of purchase
+    # price * quantity, stored so order pages and totals never multiply in Python or templates
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def save(self, *args, **kwargs):
+        self.line_total = Decimal(self.price) * self.quantity
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} for Order {self.order.id}"
+
+class ProductDailySales(models.Model):
+    # Units of a product sold per (local) day, not counting cancelled orders. Checkout and
+    # the Order signals keep it current, and `rebuild_sales_history` rebuilds it, so demand
+    # forecasts read one small row per product and day instead of joining orders and items.
+    # No index of its own: the unique (product, day) index serves lookups by product
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales', db_index=False)
+    day = models.DateField()
+    units = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.units} x product {self.product_id} on {self.day}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='unique_product_sales_day'),
+        ]
+        indexes = [
+            # Covers the forecast's scans, which then never touch the table itself
+            models.Index(fields=['product', 'day', 'units'], name='product_sales_covering_idx'),
+        ]
+
+class DemandForecast(models.Model):
+    # Daily demand for a product worked out from its order history by the forecast_demand
+    # command, and the quantity to order to cover the next COVER_DAYS at that rate
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='forecast')
+    # Units per day: over the whole history, over the last few weeks, and exponentially smoothed
+    daily_average = models.FloatField()
+    moving_average = models.FloatField()
+    smoothed = models.FloatField()
+    # Expected units sold over the cover period, and the order that covers it
+    forecast_units = models.FloatField()
+    suggested_quantity = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.name} for Order {self.order.id}"
\ No newline at end of file
+        return f"{self.smoothed:.2f}/day for product {self.product_id}"
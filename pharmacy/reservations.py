@@ -0,0 +1,110 @@
+# pharmacy/reservations.py
+"""
+Stock holds for items sitting in carts.
+
+Adding a product to a cart reserves the units: Product.reserved goes up with
+a conditional F() update that only succeeds while stock - reserved covers
+the request, and a StockReservation row records the hold with an expiry.
+Available-to-sell is then just stock - reserved, with no sum over the
+reservations. Any activity on the cart pushes all of its holds forward.
+
+Expired holds and long-abandoned carts are released by the sweep_reservations
+command in small chunks. Each chunk is one short transaction whose first
+statement is the write to Product, so on SQLite the write lock is taken up
+front and shoppers are never blocked for long. A cart deleted any other way
+(the admin, or the cascade from deleting its user) has its holds released by
+a pre_delete signal, so Product.reserved never keeps stock nobody holds.
+"""
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Cart, Product, StockReservation
+
+HOLD_TTL = datetime.timedelta(minutes=15)
+ABANDONED_AFTER = datetime.timedelta(days=30)
+SWEEP_CHUNK_SIZE = 1000
+
+
+def hold(cart, product, quantity):
+    """Reserves `quantity` more of `product` for `cart`. Returns False if not enough is available."""
+    taken = Product.objects.filter(pk=product.pk, stock__gte=F('reserved') + quantity).update(
+        reserved=F('reserved') + quantity
+    )
+    if not taken:
+        return False
+
+    now = timezone.now()
+    expires_at = now + HOLD_TTL
+    holds = StockReservation.objects.filter(cart=cart, product=product)
+    if not holds.update(quantity=F('quantity') + quantity, expires_at=expires_at):
+        try:
+            with transaction.atomic():
+                StockReservation.objects.create(cart=cart, product=product, quantity=quantity, expires_at=expires_at)
+        except IntegrityError:
+            # Another request created the hold between our update and insert
+            holds.update(quantity=F('quantity') + quantity, expires_at=expires_at)
+
+    # Any activity keeps the rest of the cart held too
+    StockReservation.objects.filter(cart=cart).update(expires_at=expires_at)
+    Cart.objects.filter(pk=cart.pk).update(updated_at=now)
+    return True
+
+
+def release(holds):
+    """Gives the units held by the `holds` queryset back to the shop and deletes the holds."""
+    held = (
+        holds.filter(product=OuterRef('pk'))
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    with transaction.atomic():
+        Product.objects.filter(pk__in=holds.values('product')).update(
+            reserved=Greatest(F('reserved') - Coalesce(Subquery(held), 0), 0)
+        )
+        released, _ = holds.delete()
+    return released
+
+
+def release_cart(cart, product=None):
+    """Releases the cart's holds, or just its hold on `product`."""
+    holds = StockReservation.objects.filter(cart=cart)
+    if product is not None:
+        holds = holds.filter(product=product)
+    return release(holds)
+
+
+def sweep_expired(chunk_size=SWEEP_CHUNK_SIZE):
+    """Releases every expired hold, `chunk_size` at a time. Returns the number of holds released."""
+    now = timezone.now()
+    total = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(expires_at__lt=now)
+            .order_by('expires_at')
+            .values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return total
+        # Re-check the expiry: the cart may have been touched since we read the ids
+        total += release(StockReservation.objects.filter(pk__in=ids, expires_at__lt=now))
+
+
+def purge_abandoned_carts(older_than=ABANDONED_AFTER, chunk_size=SWEEP_CHUNK_SIZE):
+    """Deletes carts untouched for `older_than`, releasing their holds. Returns the number of carts."""
+    cutoff = timezone.now() - older_than
+    total = 0
+    while True:
+        ids = list(
+            Cart.objects.filter(updated_at__lt=cutoff).order_by('updated_at').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return total
+        with transaction.atomic():
+            release(StockReservation.objects.filter(cart_id__in=ids))
+            Cart.objects.filter(pk__in=ids, updated_at__lt=cutoff).delete()
+        total += len(ids)
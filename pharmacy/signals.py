@@ -0,0 +1,56 @@
+# pharmacy/signals.py
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import catalog, forecasting, reservations
+from .models import Cart, Category, Order, Product, StockReservation
+
+# --- Invalidate the cached catalog pages and category counts ---
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalog_on_change(sender, instance, **kwargs):
+    catalog.bump_version()
+
+# --- Keep the daily sales rollup in step with cancelled and deleted orders ---
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, update_fields=None, **kwargs):
+    instance._previous_status = None
+    # Checkout's save of the totals can't change the status; skip the lookup for it
+    if instance.pk and (update_fields is None or 'status' in update_fields):
+        instance._previous_status = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+@receiver(post_save, sender=Order)
+def update_sales_on_status_change(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_status', None)
+    if raw or previous is None:
+        # New orders have no items yet; checkout records them once it has added them
+        return
+    if previous != 'Cancelled' and instance.status == 'Cancelled':
+        forecasting.record_order(instance, -1)
+    elif previous == 'Cancelled' and instance.status != 'Cancelled':
+        forecasting.record_order(instance)
+
+@receiver(pre_delete, sender=Order)
+def remove_sales_on_delete(sender, instance, **kwargs):
+    # pre_delete, while the order still has its items
+    if instance.status != 'Cancelled':
+        forecasting.record_order(instance, -1)
+
+# --- Give a cart's held stock back when the cart goes (e.g. its user is deleted) ---
+
+@receiver(pre_delete, sender=Cart)
+def release_holds_on_cart_delete(sender, instance, **kwargs):
+    holds = StockReservation.objects.filter(cart=instance)
+    # The cascade would delete the holds without lowering Product.reserved
+    if holds.exists():
+        reservations.release(holds)
+
+# --- Put back the full-text search triggers after migrations rebuild the table ---
+# Connected in apps.py, as post_migrate needs the app config as its sender
+
+def restore_search_triggers(sender, using='default', **kwargs):
+    catalog.restore_triggers(using)
@@ -1,3 +1,216 @@
-from django.test import TestCase
+import datetime
+import math
+import threading
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from . import catalog, forecasting
+from .cart import NotAvailable, add_item
+from .catalog import products
+from .checkout import OutOfStock, place_order
+from .models import Cart, CartItem, DemandForecast, Order, OrderItem, Product, ProductDailySales, StockReservation
+
+
+def make_product(name='Vitamin C', stock=10, **kwargs):
+    return Product.objects.create(name=name, description='', price=kwargs.pop('price', '2.50'), stock=stock, **kwargs)
+
+
+def make_shopper(username='shopper'):
+    user = User.objects.create_user(username, f'{username}@example.com', 'pw', role='PATIENT')
+    return user, Cart.objects.create(user=user)
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.product = make_product(stock=5)
+        self.user, self.cart = make_shopper()
+
+    def reserved(self):
+        self.product.refresh_from_db()
+        return self.product.reserved
+
+    def test_adding_to_cart_holds_stock(self):
+        add_item(self.cart, self.product, 3)
+        self.assertEqual(self.reserved(), 3)
+        _, other_cart = make_shopper('other')
+        with self.assertRaises(NotAvailable):
+            add_item(other_cart, self.product, 3)
+
+    def test_sweep_releases_expired_holds(self):
+        add_item(self.cart, self.product, 3)
+        StockReservation.objects.update(expires_at=timezone.now() - datetime.timedelta(minutes=1))
+        call_command('sweep_reservations', stdout=StringIO())
+        self.assertEqual(self.reserved(), 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_deleting_the_user_releases_the_cart_holds(self):
+        add_item(self.cart, self.product, 3)
+        self.user.delete()
+        self.assertEqual(self.reserved(), 0)
+
+    def test_deleting_the_cart_releases_only_its_holds(self):
+        _, other_cart = make_shopper('other')
+        add_item(self.cart, self.product, 3)
+        add_item(other_cart, self.product, 1)
+        self.cart.delete()
+        self.assertEqual(self.reserved(), 1)
+
+
+class ForecastTests(TestCase):
+    today = datetime.date(2026, 6, 1)
+
+    def sell(self, product, units):
+        """Records `units` as the daily sales of the days up to yesterday, oldest first."""
+        first = self.today - datetime.timedelta(days=len(units))
+        ProductDailySales.objects.bulk_create([
+            ProductDailySales(product=product, day=first + datetime.timedelta(days=i), units=n)
+            for i, n in enumerate(units)
+        ])
+
+    def smoothed(self, units):
+        """The textbook recurrence, started from the long-run average, over the last WINDOW_DAYS."""
+        level = sum(units) / len(units)
+        for n in units[-forecasting.WINDOW_DAYS:]:
+            level = forecasting.ALPHA * n + (1 - forecasting.ALPHA) * level
+        return level
+
+    def check(self, units):
+        product = make_product()
+        self.sell(product, units)
+        forecasting.forecast_demand(self.today)
+        forecast = DemandForecast.objects.get(product=product)
+        recent = units[-forecasting.MOVING_AVERAGE_DAYS:]
+        self.assertAlmostEqual(forecast.daily_average, sum(units) / len(units))
+        self.assertAlmostEqual(forecast.moving_average, sum(recent) / len(recent))
+        self.assertAlmostEqual(forecast.smoothed, self.smoothed(units))
+        self.assertEqual(forecast.suggested_quantity, math.ceil(round(self.smoothed(units) * forecasting.COVER_DAYS, 6)))
+
+    def test_short_history(self):
+        self.check([3, 0, 5, 1, 0, 0, 4, 2, 0, 6])
+
+    def test_history_longer_than_the_window(self):
+        # A slow year, then a busy quarter the smoothed level should follow
+        self.check([0 if day % 3 == 2 else 1 for day in range(365)] + [4 + day % 5 for day in range(100)])
+
+    def test_products_without_sales_lose_their_forecast(self):
+        product = make_product()
+        self.sell(product, [2, 2, 2])
+        forecasting.forecast_demand(self.today)
+        ProductDailySales.objects.all().delete()
+        self.assertEqual(forecasting.forecast_demand(self.today), (0, 1))
+        self.assertFalse(DemandForecast.objects.exists())
+
+
+class CatalogSearchTests(TestCase):
+    # Several migrations rebuild the product table on SQLite, dropping the
+    # full-text triggers; a post_migrate receiver puts them back
+
+    def test_new_and_renamed_products_are_searchable(self):
+        product = make_product('Cough Syrup')
+        self.assertEqual(list(products(query='cough')), [product])
+        product.name = 'Throat Lozenges'
+        product.save()
+        self.assertEqual(list(products(query='cough')), [])
+        self.assertEqual(list(products(query='lozenge')), [product])
+
+    def test_dropped_triggers_are_restored_after_migrate(self):
+        with connection.cursor() as cursor:
+            for trigger in catalog.FTS_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {trigger}')
+        product = make_product('Cough Syrup')
+        self.assertEqual(list(products(query='cough')), [])
+
+        emit_post_migrate_signal(0, False, 'default')
+        self.assertEqual(list(products(query='cough')), [product])
+        # Nothing missing now, so nothing is rebuilt
+        self.assertFalse(catalog.restore_triggers())
+
+
+class CheckoutCatalogTests(TestCase):
+    def buy(self, product, quantity):
+        user, cart = make_shopper(f'shopper{Cart.objects.count()}')
+        CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        version = catalog._version()
+        place_order(cart, user, 'Somewhere 1')
+        return catalog._version() != version
+
+    def test_only_selling_out_drops_the_cached_pages(self):
+        product = make_product(stock=3)
+        self.assertFalse(self.buy(product, 2))
+        self.assertTrue(self.buy(product, 1))
+
+
+class MyOrdersCachingTests(TestCase):
+    def test_renaming_a_product_changes_the_page(self):
+        product = make_product('Cough Syrup')
+        user, cart = make_shopper()
+        CartItem.objects.create(cart=cart, product=product, quantity=1)
+        place_order(cart, user, 'Somewhere 1')
+        self.client.login(username='shopper', password='pw')
+        etag = self.client.get(reverse('my_orders'))['ETag']
+        self.assertEqual(self.client.get(reverse('my_orders'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        product.name = 'Throat Lozenges'
+        product.save()
+        self.assertContains(self.client.get(reverse('my_orders'), HTTP_IF_NONE_MATCH=etag), 'Throat Lozenges')
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    SHOPPERS = 20
+    STOCK = 25
+
+    def test_concurrent_checkouts_never_oversell(self):
+        scarce = make_product('Scarce', stock=self.STOCK, price='2.50')
+        plenty = make_product('Plenty', stock=1000, price='1.10')
+        carts = []
+        for i in range(self.SHOPPERS):
+            user, cart = make_shopper(f'shopper{i}')
+            CartItem.objects.create(cart=cart, product=scarce, quantity=2)
+            CartItem.objects.create(cart=cart, product=plenty, quantity=3)
+            carts.append(cart)
+
+        placed, refused, errors = [], [], []
+        start = threading.Barrier(len(carts))
+
+        def checkout(cart):
+            try:
+                start.wait()
+                placed.append(place_order(cart, cart.user, 'Somewhere 1'))
+            except OutOfStock:
+                refused.append(cart)
+            except Exception as e:  # noqa: BLE001 -- reported by the assertion below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        scarce.refresh_from_db()
+        plenty.refresh_from_db()
+        # 25 units at 2 per order: 12 orders, one unit left, nothing oversold
+        self.assertEqual(len(placed), self.STOCK // 2)
+        self.assertEqual(len(refused), self.SHOPPERS - self.STOCK // 2)
+        self.assertEqual(scarce.stock, self.STOCK % 2)
+        self.assertEqual(plenty.stock, 1000 - 3 * len(placed))
+        self.assertEqual(Order.objects.count(), len(placed))
+        for order in Order.objects.all():
+            self.assertEqual(order.total_price, Decimal('8.30'))
+            self.assertEqual(order.item_count, 5)
+        self.assertEqual(
+            OrderItem.objects.aggregate(total=Sum('line_total'))['total'],
+            Order.objects.aggregate(total=Sum('total_price'))['total'],
+        )
@@ -2,15 +2,55 @@ from django.shortcuts import render, redirect, get_object_or_404
 from .models import Product, Cart, CartItem, Order, OrderItem
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.db.models import Count, Max, Prefetch, prefetch_related_objects
+from hospital.conditional import conditional_page
+from hospital.pagination import paginate
+from . import cart as cart_helpers, catalog, reservations
+from .checkout import EmptyCart, OutOfStock, place_order
+
+# How many product names each row of the order history shows
+ORDER_PREVIEW_PRODUCTS = 3
+
+# The add-to-cart script needs the CSRF cookie, and this page has no form to set it
+@ensure_csrf_cookie
 def shop_view(request):
-    # Fetch all products from the database
-    products = Product.objects.all()
+    # Anonymous visitors all see the same page for the same filters, so serve it from the cache.
+    # Pages with pending messages (e.g. "logged out") are personal and never cached.
+    cache_key = None
+    if not request.user.is_authenticated and not len(messages.get_messages(request)):
+        cache_key = catalog.page_cache_key(request)
+        content = cache.get(cache_key)
+        if content is not None:
+            return HttpResponse(content)
+
+    # Read the filters: ?category=<id>&in_stock=1&q=<search text>
+    category_id = request.GET.get('category', '')
+    if not category_id.isdigit():
+        category_id = ''
+    in_stock = request.GET.get('in_stock') == '1'
+    query = request.GET.get('q', '').strip()
+
+    # One page of matching products, by name
+    products = paginate(
+        request, catalog.products(category_id, in_stock, query), ('name',), per_page=catalog.PAGE_SIZE
+    )
+    categories, totals = catalog.category_facets()
 
     context = {
-        'products': products
+        'products': products,
+        'categories': categories,
+        'totals': totals,
+        'selected_category': int(category_id) if category_id else None,
+        'in_stock': in_stock,
+        'query': query,
     }
-    return render(request, 'shop.html', context)
+    response = render(request, 'shop.html', context)
+    if cache_key:
+        cache.set(cache_key, response.content, catalog.CATALOG_TIMEOUT)
+    return response
 
 # --- ADD THIS NEW VIEW ---
 @login_required(login_url='login')
@@ -22,19 +62,31 @@ def add_to_cart_view(request, product_pk):
     # We use request.user (from @login_required) to find their cart
     cart, created = Cart.objects.get_or_create(user=request.user)
     
-    # 3. Check if the item is already in the cart
+    # 3. Add it, or bump the quantity if it's already in the cart (one UPDATE, safe against double clicks).
+    #    The units are held for this cart, so it fails here rather than at checkout when stock runs out.
+    is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
     try:
-        cart_item = CartItem.objects.get(cart=cart, product=product)
-        # If it is, just increase the quantity
-        cart_item.quantity += 1
-        cart_item.save()
-        messages.success(request, f"Added another '{product.name}' to your cart.")
-    except CartItem.DoesNotExist:
-        # If it's not, create a new cart item
-        CartItem.objects.create(cart=cart, product=product, quantity=1)
-        messages.success(request, f"Added '{product.name}' to your cart.")
-    
-    # 4. Send the user back to the shop page
+        if cart_helpers.add_item(cart, product):
+            message = f"Added '{product.name}' to your cart."
+        else:
+            message = f"Added another '{product.name}' to your cart."
+    except cart_helpers.NotAvailable as e:
+        if is_ajax:
+            return JsonResponse({'error': str(e)}, status=409)
+        messages.error(request, str(e))
+        return redirect('shop')
+
+    # 4. The shop page's script just wants the new cart summary, not a redirect
+    if is_ajax:
+        summary = cart_helpers.cart_totals(cart.pk)
+        return JsonResponse({
+            'message': message,
+            'item_count': summary['item_count'],
+            'total': str(summary['total']),
+        })
+
+    messages.success(request, message)
+    # 5. Send the user back to the shop page
     return redirect('shop')
 
 @login_required(login_url='login')
@@ -42,17 +94,12 @@ def cart_view(request):
     # Get the user's cart
     cart, created = Cart.objects.get_or_create(user=request.user)
 
-    # Get all items in that cart
-    cart_items = cart.items.all()
-
-    # Calculate the total price
-    total_price = 0
-    for item in cart_items:
-        total_price += item.get_total_price()
+    # Get all items in that cart, each with its line total worked out by the database
+    cart_items = cart_helpers.items_with_totals(cart)
 
     context = {
         'cart_items': cart_items,
-        'total_price': total_price
+        'total_price': cart_helpers.cart_totals(cart.pk)['total']
     }
     return render(request, 'cart.html', context)
 
@@ -64,6 +111,9 @@ def remove_from_cart_view(request, item_pk):
     # Security check: Ensure the item belongs to the logged-in user's cart
     if cart_item.cart.user == request.user:
         cart_item.delete()
+        # Give the held units back to the shop
+        reservations.release_cart(cart_item.cart, cart_item.product)
+        cart_helpers.invalidate_summary(request.user.pk)
         messages.success(request, f"Removed '{cart_item.product.name}' from your cart.")
     else:
         messages.error(request, "You are not authorized to remove this item.")
@@ -73,85 +123,64 @@ def remove_from_cart_view(request, item_pk):
 
 @login_required(login_url='login')
 def checkout_view(request):
-    # Get the user's cart
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.all()
-    
-    if not cart_items:
-        # Don't let them checkout an empty cart
-        messages.error(request, "Your cart is empty.")
-        return redirect('cart')
 
-    # Calculate the total price
-    total_price = 0
-    for item in cart_items:
-        total_price += item.get_total_price()
-    
-    context = {
-        'cart_items': cart_items,
-        'total_price': total_price
-    }
-    return render(request, 'checkout.html', context)
-
-@login_required(login_url='login')
-def checkout_view(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.all()
-    
-    if not cart_items:
-        messages.error(request, "Your cart is empty.")
-        return redirect('cart')
-
-    # Calculate total price
-    total_price = sum(item.get_total_price() for item in cart_items)
-    
     # This is the "Place Order" logic
     if request.method == 'POST':
+        # 1. Get the address from the patient's profile
+        patient = getattr(request.user, 'patient', None)
+        shipping_address = patient.address if patient else ''
+        if not shipping_address:
+            messages.error(request, "Please add an address to your profile before placing an order.")
+            return redirect('profile')
+
+        # 2. Take the stock, create the order and its items, and clear the cart - all or nothing
         try:
-            # 1. Get the address from the patient's profile
-            shipping_address = request.user.patient.address
-            if not shipping_address:
-                messages.error(request, "Please add an address to your profile before placing an order.")
-                return redirect('profile')
-
-            # 2. Create the Order
-            order = Order.objects.create(
-                user=request.user,
-                total_price=total_price,
-                shipping_address=shipping_address,
-                status='Processing'
-            )
-
-            # 3. Create OrderItems from CartItems
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                    price=item.product.price  # Lock in the price
-                )
-
-            # 4. Clear the cart
-            cart_items.delete()
-            
-            messages.success(request, "Your order has been placed successfully!")
-            return redirect('shop') # Or a "My Orders" page, which we'll make next
-            
-        except Exception as e:
-            messages.error(request, f"An error occurred: {e}")
-            return redirect('checkout')
+            place_order(cart, request.user, shipping_address)
+        except EmptyCart as e:
+            messages.error(request, str(e))
+            return redirect('cart')
+        except OutOfStock as e:
+            messages.error(request, f"{e}. Please update your cart and try again.")
+            return redirect('cart')
+
+        messages.success(request, "Your order has been placed successfully!")
+        return redirect('my_orders')
 
     # This is the GET request logic (show the summary)
+    cart_items = cart_helpers.items_with_totals(cart)
+    if not cart_items:
+        messages.error(request, "Your cart is empty.")
+        return redirect('cart')
+
     context = {
         'cart_items': cart_items,
-        'total_price': total_price
+        'total_price': cart_helpers.cart_totals(cart.pk)['total']
     }
     return render(request, 'checkout.html', context)
 
+def _my_orders_state(request):
+    # Each order also shows its product names, which change with the products
+    stats = Order.objects.filter(user=request.user).aggregate(
+        changed=Max('updated_at'), total=Count('pk', distinct=True),
+        products_changed=Max('items__product__updated_at'), products=Count('items__product', distinct=True),
+    )
+    return (stats['changed'], stats['total'], stats['products_changed'], stats['products'])
+
 @login_required(login_url='login')
+@conditional_page(_my_orders_state)
 def my_orders_view(request):
-    # Get all orders for the current user, with the newest one first
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    # Get one page of the current user's orders, with the newest one first
+    orders = paginate(request, Order.objects.filter(user=request.user), ('-created_at',))
+
+    # One more query fetches the product names for every order on the page
+    prefetch_related_objects(orders.items, Prefetch(
+        'items', queryset=OrderItem.objects.select_related('product').only('order_id', 'product__name').order_by('pk'),
+    ))
+    for order in orders:
+        names = [item.product.name for item in order.items.all() if item.product]
+        order.product_preview = ', '.join(names[:ORDER_PREVIEW_PRODUCTS])
+        order.more_products = max(len(names) - ORDER_PREVIEW_PRODUCTS, 0)
     
     context = {
         'orders': orders
@@ -161,15 +190,15 @@ def my_orders_view(request):
 @login_required(login_url='login')
 def order_details_view(request, order_pk):
     # Get the specific order or show 404
-    order = get_object_or_404(Order, pk=order_pk)
+    order = get_object_or_404(Order.objects.select_related('user'), pk=order_pk)
     
     # Security Check: Ensure the logged-in user owns this order
-    if order.user != request.user:
+    if order.user_id != request.user.pk:
         messages.error(request, 'You are not authorized to view this order.')
         return redirect('my_orders')
 
-    # Get all items related to this order
-    order_items = OrderItem.objects.filter(order=order)
+    # Get all items related to this order, with their products, in one query
+    order_items = OrderItem.objects.filter(order=order).select_related('product').order_by('pk')
     
     context = {
         'order': order,
@@ -0,0 +1,45 @@
+// "Add to Cart" on the shop page without leaving it.
+// Posts to the add-to-cart URL, then updates the navbar cart badge and shows
+// the message from the JSON reply. Without JavaScript the link still works.
+(function () {
+    const status = document.getElementById('cart-status');
+    const badge = document.getElementById('cart-count');
+
+    function csrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    function showMessage(text, kind) {
+        status.innerHTML = '';
+        const alert = document.createElement('div');
+        alert.className = 'alert alert-' + kind;
+        alert.textContent = text;
+        status.appendChild(alert);
+    }
+
+    document.querySelectorAll('[data-add-to-cart]').forEach(function (link) {
+        link.addEventListener('click', function (event) {
+            event.preventDefault();
+            link.classList.add('disabled');
+            fetch(link.href, {
+                method: 'POST',
+                headers: {'X-Requested-With': 'XMLHttpRequest', 'X-CSRFToken': csrfToken()},
+                credentials: 'same-origin',
+            })
+                .then(function (response) {
+                    // Logged-out users get redirected to the login page; follow it
+                    if (response.redirected) { window.location = response.url; return null; }
+                    return response.json();
+                })
+                .then(function (data) {
+                    if (!data) { return; }
+                    if (data.error) { showMessage(data.error, 'danger'); return; }
+                    showMessage(data.message, 'success');
+                    if (badge) { badge.textContent = data.item_count; }
+                })
+                .catch(function () { showMessage('Could not add the item. Please try again.', 'danger'); })
+                .finally(function () { link.classList.remove('disabled'); });
+        });
+    });
+})();
@@ -0,0 +1,147 @@
+// Live updates on the chat page.
+// Opens the chat websocket, sends new messages over it and appends every
+// message the server pushes, so nobody has to reload to see replies. While
+// the socket is down the page polls the messages endpoint for anything newer
+// than the last message shown, and the form posts and reloads as before.
+// "Load older messages" fetches the previous page without leaving the page.
+(function () {
+    const box = document.getElementById('chat-messages');
+    const form = document.getElementById('chat-form');
+    const status = document.getElementById('chat-status');
+    const input = form.querySelector('[name="body"]');
+    const userId = Number(box.dataset.userId);
+    const messagesUrl = box.dataset.messagesUrl;
+    // Close code the server uses when it won't let us in; retrying can't help
+    const REFUSED = 4403;
+    const POLL_INTERVAL = 5000;
+    let socket = null;
+    let retryDelay = 1000;
+    let catchingUp = false;
+
+    function paragraph(className, text) {
+        const p = document.createElement('p');
+        p.className = className;
+        p.textContent = text;
+        return p;
+    }
+
+    // Same markup as the messages rendered by chat_page.html
+    function messageRow(message) {
+        const mine = message.sender_id === userId;
+        const row = document.createElement('div');
+        row.className = 'd-flex flex-row mb-4 ' + (mine ? 'justify-content-end' : 'justify-content-start');
+        row.dataset.messageId = message.id;
+        const wrapper = document.createElement('div');
+        if (mine) {
+            wrapper.appendChild(paragraph('small p-2 me-3 mb-1 text-white rounded-3 bg-primary', message.body));
+            wrapper.appendChild(paragraph('small me-3 mb-3 rounded-3 text-muted d-flex justify-content-end', message.time));
+        } else {
+            const body = paragraph('small p-2 ms-3 mb-1 rounded-3', message.body);
+            body.style.backgroundColor = '#f5f6f7';
+            wrapper.appendChild(body);
+            wrapper.appendChild(paragraph('small ms-3 mb-3 rounded-3 text-muted', message.time));
+        }
+        row.appendChild(wrapper);
+        return row;
+    }
+
+    function shown(message) {
+        return box.querySelector('[data-message-id="' + message.id + '"]') !== null;
+    }
+
+    function append(message) {
+        if (shown(message)) { return; }
+        const empty = document.getElementById('chat-empty');
+        if (empty) { empty.remove(); }
+        box.appendChild(messageRow(message));
+        box.scrollTop = box.scrollHeight;
+    }
+
+    function lastId() {
+        const rows = box.querySelectorAll('[data-message-id]');
+        return rows.length ? Number(rows[rows.length - 1].dataset.messageId) : 0;
+    }
+
+    function fetchMessages(query) {
+        return fetch(messagesUrl + '?' + query, {credentials: 'same-origin'}).then(function (response) {
+            if (!response.ok) { throw new Error('HTTP ' + response.status); }
+            return response.json();
+        });
+    }
+
+    // Everything sent since the last message on the page, a page at a time
+    function catchUp() {
+        if (catchingUp) { return; }
+        catchingUp = true;
+        fetchMessages('after=' + lastId())
+            .then(function (data) {
+                catchingUp = false;
+                data.messages.forEach(append);
+                if (data.has_more) { catchUp(); }
+            })
+            .catch(function () { catchingUp = false; });
+    }
+
+    function connect() {
+        const scheme = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+        socket = new WebSocket(scheme + window.location.host + box.dataset.socketPath);
+        socket.onopen = function () {
+            retryDelay = 1000;
+            status.textContent = '';
+            // Pick up whatever was sent while we were away
+            catchUp();
+        };
+        socket.onmessage = function (event) {
+            const data = JSON.parse(event.data);
+            if (data.error) { status.textContent = data.error; return; }
+            append(data);
+        };
+        socket.onclose = function (event) {
+            socket = null;
+            if (event.code === REFUSED) { return; }
+            // Reconnect, backing off while the server is away
+            setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 30000);
+        };
+    }
+
+    const older = document.querySelector('#chat-older [data-before]');
+    if (older) {
+        older.addEventListener('click', function (event) {
+            event.preventDefault();
+            fetchMessages('before=' + older.dataset.before).then(function (data) {
+                // Keep the messages in view where they are while older ones go in above
+                const fromBottom = box.scrollHeight - box.scrollTop;
+                const first = older.parentNode.nextSibling;
+                data.messages.forEach(function (message) {
+                    if (!shown(message)) { box.insertBefore(messageRow(message), first); }
+                });
+                if (data.has_more && data.messages.length) {
+                    older.dataset.before = data.messages[0].id;
+                    older.href = '?before=' + data.messages[0].id;
+                } else {
+                    older.parentNode.remove();
+                }
+                box.scrollTop = box.scrollHeight - fromBottom;
+            });
+        });
+    }
+
+    // Pages of older messages are read-only snapshots
+    if (box.dataset.live !== '1') { return; }
+
+    form.addEventListener('submit', function (event) {
+        if (!socket || socket.readyState !== WebSocket.OPEN) { return; }
+        event.preventDefault();
+        const body = input.value.trim();
+        if (!body) { return; }
+        socket.send(JSON.stringify({body: body}));
+        input.value = '';
+        status.textContent = '';
+    });
+
+    if ('WebSocket' in window) { connect(); }
+    setInterval(function () {
+        if (!socket || socket.readyState !== WebSocket.OPEN) { catchUp(); }
+    }, POLL_INTERVAL);
+})();
@@ -0,0 +1,49 @@
+// Patient autocomplete used by templates/_patient_picker.html.
+// Types into a search box, asks the patient search endpoint for matches and
+// stores the chosen patient's id in the hidden input that the form submits.
+document.querySelectorAll('[data-patient-picker]').forEach(function (picker) {
+    const input = picker.querySelector('input[type="search"]');
+    const hidden = picker.querySelector('input[type="hidden"]');
+    const list = picker.querySelector('.list-group');
+    const url = picker.dataset.patientPicker;
+    let timer = null;
+    let lastQuery = '';
+
+    function clearResults() {
+        list.innerHTML = '';
+    }
+
+    function choose(patient) {
+        hidden.value = patient.id;
+        input.value = patient.label;
+        clearResults();
+    }
+
+    function showResults(patients) {
+        clearResults();
+        patients.forEach(function (patient) {
+            const item = document.createElement('button');
+            item.type = 'button';
+            item.className = 'list-group-item list-group-item-action';
+            item.textContent = patient.label;
+            item.addEventListener('click', function () { choose(patient); });
+            list.appendChild(item);
+        });
+    }
+
+    input.addEventListener('input', function () {
+        hidden.value = '';
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (query.length < 2) { clearResults(); return; }
+        // Wait for a pause in typing before asking the server
+        timer = setTimeout(function () {
+            lastQuery = query;
+            fetch(url + '?q=' + encodeURIComponent(query))
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (query === lastQuery) { showResults(data.results || []); }
+                });
+        }, 200);
+    });
+});